@@ -1 +1,6 @@
+import django
+
 __version__ = "2.2.3"
+
+if django.VERSION < (3, 2):
+    default_app_config = "drf_sideloading.apps.SideloadingConfig"
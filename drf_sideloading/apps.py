@@ -0,0 +1,23 @@
+from django.apps import AppConfig
+from django.core.signals import setting_changed
+
+from drf_sideloading.cache import RELATED_IDS_CACHE_SETTING, connect_related_ids_receivers
+from drf_sideloading.snapshots import SNAPSHOT_CACHE_SETTING, SNAPSHOTS_SETTING, connect_snapshot_receivers
+
+
+def setting_changed_receiver(setting, **kwargs) -> None:
+    if setting == RELATED_IDS_CACHE_SETTING:
+        connect_related_ids_receivers()
+    elif setting in (SNAPSHOT_CACHE_SETTING, SNAPSHOTS_SETTING):
+        connect_snapshot_receivers()
+
+
+class SideloadingConfig(AppConfig):
+    name = "drf_sideloading"
+    verbose_name = "Django rest framework sideloading"
+
+    def ready(self):
+        # the invalidation receivers are only connected if the features using them are configured
+        connect_related_ids_receivers()
+        connect_snapshot_receivers()
+        setting_changed.connect(setting_changed_receiver, dispatch_uid="drf_sideloading_setting_changed")
@@ -0,0 +1,143 @@
+from typing import Dict, List, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+# name of the Django cache the related ids of the relations with the "cache_ids" field option are stored in
+RELATED_IDS_CACHE_SETTING = "SIDELOADING_RELATED_IDS_CACHE"
+RELATED_IDS_CACHE_PREFIX = "drf_sideloading:related_ids"
+
+_through_fields: Dict = {}
+# through models the invalidation receivers are connected to
+_connected_throughs: List = []
+
+
+def get_related_ids_cache():
+    """
+    Returns the cache set with the SIDELOADING_RELATED_IDS_CACHE setting, None if the setting is not defined.
+    """
+    alias = getattr(settings, RELATED_IDS_CACHE_SETTING, None)
+    return caches[alias] if alias else None
+
+
+def get_related_ids_cache_key(field, reverse: bool, pk) -> str:
+    """
+    Returns the cache key of the related ids of the many to many field for the object with the pk.
+    reverse is True for the ids read from the related model side.
+    """
+    direction = "reverse" if reverse else "forward"
+    return f"{RELATED_IDS_CACHE_PREFIX}:{field.model._meta.label_lower}.{field.name}:{direction}:{pk}"
+
+
+def get_through_fields(through) -> List:
+    """
+    Returns the many to many fields using the through model.
+    """
+    if through not in _through_fields:
+        _through_fields[through] = [
+            field
+            for model in apps.get_models()
+            for field in model._meta.local_many_to_many
+            if field.remote_field.through is through
+        ]
+    return _through_fields[through]
+
+
+def get_through_attnames(field, reverse: bool):
+    """
+    Returns the through model (source, target) column names, the source is the side the ids are read for.
+    """
+    through = field.remote_field.through
+    if reverse:
+        source_name, target_name = field.m2m_reverse_field_name(), field.m2m_field_name()
+    else:
+        source_name, target_name = field.m2m_field_name(), field.m2m_reverse_field_name()
+    return through._meta.get_field(source_name).attname, through._meta.get_field(target_name).attname
+
+
+def invalidate_related_ids(field, reverse: bool, pks, cache=None) -> None:
+    cache = cache or get_related_ids_cache()
+    if cache is not None and pks:
+        cache.delete_many([get_related_ids_cache_key(field, reverse, pk) for pk in pks])
+
+
+def m2m_changed_receiver(sender, instance, action, reverse, pk_set, **kwargs) -> None:
+    cache = get_related_ids_cache()
+    if cache is None or action not in ("pre_clear", "post_add", "post_remove", "post_clear"):
+        return
+    for field in get_through_fields(sender):
+        invalidate_related_ids(field, reverse, [instance.pk], cache=cache)
+        if action == "pre_clear":
+            # the related objects are not known after the clear
+            source_attname, target_attname = get_through_attnames(field, reverse)
+            pk_set = sender._default_manager.filter(**{source_attname: instance.pk}).values_list(
+                target_attname, flat=True
+            )
+        invalidate_related_ids(field, not reverse, list(pk_set or []), cache=cache)
+
+
+def through_changed_receiver(sender, instance, **kwargs) -> None:
+    """
+    Invalidates the related ids of both sides of custom through model objects saved or deleted directly.
+    Django does not send these signals for auto created through models, m2m_changed covers those.
+    """
+    cache = get_related_ids_cache()
+    if cache is None:
+        return
+    for field in get_through_fields(sender):
+        source_attname, target_attname = get_through_attnames(field, reverse=False)
+        invalidate_related_ids(field, False, [getattr(instance, source_attname)], cache=cache)
+        invalidate_related_ids(field, True, [getattr(instance, target_attname)], cache=cache)
+
+
+def get_cached_related_ids(field, reverse: bool, pks: List) -> Optional[Dict]:
+    """
+    Returns the cached related ids by pk, the pks missing from the cache are left out.
+    """
+    cache = get_related_ids_cache()
+    if cache is None:
+        return None
+    keys = {get_related_ids_cache_key(field, reverse, pk): pk for pk in pks}
+    return {keys[key]: related_ids for key, related_ids in cache.get_many(list(keys)).items()}
+
+
+def set_cached_related_ids(field, reverse: bool, related_ids: Dict, timeout) -> None:
+    cache = get_related_ids_cache()
+    if cache is not None and related_ids:
+        cache.set_many(
+            {get_related_ids_cache_key(field, reverse, pk): ids for pk, ids in related_ids.items()}, timeout=timeout
+        )
+
+
+def connect_related_ids_receivers() -> None:
+    """
+    Connects the invalidation receivers to the many to many through models if the SIDELOADING_RELATED_IDS_CACHE
+    setting is defined. post_save and post_delete are only connected to the custom through models, Django does not
+    send them for the auto created ones and delete receivers turn off the fast deletes of the model.
+    """
+    disconnect_related_ids_receivers()
+    if get_related_ids_cache() is None:
+        return
+    throughs = {field.remote_field.through for model in apps.get_models() for field in model._meta.local_many_to_many}
+    for through in throughs:
+        m2m_changed.connect(
+            m2m_changed_receiver, sender=through, dispatch_uid="drf_sideloading_related_ids_m2m_changed"
+        )
+        if not through._meta.auto_created:
+            post_save.connect(
+                through_changed_receiver, sender=through, dispatch_uid="drf_sideloading_related_ids_post_save"
+            )
+            post_delete.connect(
+                through_changed_receiver, sender=through, dispatch_uid="drf_sideloading_related_ids_post_delete"
+            )
+        _connected_throughs.append(through)
+
+
+def disconnect_related_ids_receivers() -> None:
+    while _connected_throughs:
+        through = _connected_throughs.pop()
+        m2m_changed.disconnect(sender=through, dispatch_uid="drf_sideloading_related_ids_m2m_changed")
+        post_save.disconnect(sender=through, dispatch_uid="drf_sideloading_related_ids_post_save")
+        post_delete.disconnect(sender=through, dispatch_uid="drf_sideloading_related_ids_post_delete")
@@ -0,0 +1,29 @@
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+
+from drf_sideloading.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = "Precomputes the sideloading snapshots configured in the SIDELOADING_SNAPSHOTS setting."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dirty", action="store_true", help="Only refresh the missing and stale snapshots.")
+        parser.add_argument("--host", default="localhost", help="Host of the urls in the snapshots (pagination).")
+        parser.add_argument("--secure", action="store_true", help="Use https in the urls of the snapshots.")
+
+    def handle(self, *args, **options):
+        try:
+            results = refresh_snapshots(dirty_only=options["dirty"], host=options["host"], secure=options["secure"])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        for path, query, status_code in results:
+            url = f"{path}?{urlencode(query, doseq=True)}" if query else path
+            if status_code is None:
+                self.stdout.write(f"{url}: fresh")
+            elif status_code == 200:
+                self.stdout.write(self.style.SUCCESS(f"{url}: refreshed"))
+            else:
+                self.stdout.write(self.style.ERROR(f"{url}: failed with status {status_code}"))
@@ -1,29 +1,83 @@
+import cProfile
 import copy
+import hashlib
 import importlib
+import io
+import json
+import os
+import pstats
+import random
 import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from functools import reduce
 from itertools import chain
-from typing import Dict, Optional, Union, Set, List
+from operator import or_
+from typing import Dict, Optional, Union, Set, List, Tuple
 
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core import signing
 from django.core.exceptions import ValidationError as DjangoValidationError
-from django.db import models
-from django.db.models import Prefetch
+from django.db import connections, models
+from django.db.models import BooleanField, ExpressionWrapper, Prefetch, Q, QuerySet
+from django.db.models import ForeignObjectRel
 from django.db.models.fields.related_descriptors import (
     ForwardManyToOneDescriptor,
     ForwardOneToOneDescriptor,
+    ManyToManyDescriptor,
     ReverseOneToOneDescriptor,
     ReverseManyToOneDescriptor,
 )
 from django.db.models.sql.where import WhereNode, AND
 from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.translation import gettext_lazy as _
-from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.mixins import RetrieveModelMixin, ListModelMixin
 from rest_framework.response import Response
 from rest_framework.serializers import ListSerializer
 
-from drf_sideloading.serializers import SideLoadableSerializer
+try:
+    from django.utils.http import parse_header_parameters
+except ImportError:  # Django < 4.2
+    from django.http.multipartparser import parse_header
 
+    def parse_header_parameters(line: str) -> Tuple[str, Dict[str, str]]:
+        main_value, params = parse_header(line.encode("latin-1"))
+        return main_value, {key: value.decode("latin-1") for key, value in params.items()}
+
+
+from drf_sideloading.cache import (
+    RELATED_IDS_CACHE_SETTING,
+    get_cached_related_ids,
+    get_through_attnames,
+    set_cached_related_ids,
+)
+from drf_sideloading.reference import ReferenceTable, get_reference_table, set_reference_table
+from drf_sideloading.snapshots import (
+    get_model_versions,
+    get_serializer_models,
+    get_snapshot,
+    get_snapshot_cache,
+    get_snapshot_key,
+    get_snapshot_refresh,
+    set_snapshot,
+)
+from drf_sideloading.serializers import (
+    SIDELOADING_FORMAT_COLUMNAR,
+    SIDELOADING_FORMAT_OBJECTS,
+    JSONFragment,
+    SerializedObject,
+    SideLoadableSerializer,
+    get_serializer_columns,
+)
 
 RELATION_DESCRIPTORS = [
     ForwardManyToOneDescriptor,
@@ -32,6 +86,13 @@ RELATION_DESCRIPTORS = [
     ReverseManyToOneDescriptor,
 ]
 
+# relations that resolve to a single object and can therefore be fetched with a JOIN
+SINGLE_VALUED_RELATION_DESCRIPTORS = (
+    ForwardManyToOneDescriptor,
+    ForwardOneToOneDescriptor,
+    ReverseOneToOneDescriptor,
+)
+
 
 def contains_where_node(existing_node: WhereNode, new_node: WhereNode) -> bool:
     """
@@ -52,6 +113,99 @@ def contains_where_node(existing_node: WhereNode, new_node: WhereNode) -> bool:
     return False
 
 
+def where_node_fingerprint(node) -> frozenset:
+    """
+    Returns the conditions of the where node as a set. Nested AND nodes are flattened,
+    so a filter is contained in a queryset if its fingerprint is a subset of the queryset fingerprint.
+    """
+    if not isinstance(node, WhereNode):
+        return frozenset([node])
+    if node.connector != AND or node.negated:
+        return frozenset([node])
+    return frozenset().union(*(where_node_fingerprint(child) for child in node.children))
+
+
+def is_select_related(queryset, lookup: str) -> bool:
+    """
+    Checks if the lookup is fetched with select_related by the queryset.
+    """
+    select_related = queryset.query.select_related
+    if select_related is True:
+        return False  # select_related() without fields only follows non-null foreign keys
+    for part in lookup.split("__"):
+        if not isinstance(select_related, dict) or part not in select_related:
+            return False
+        select_related = select_related[part]
+    return True
+
+
+def get_prefetch_cache_name(manager) -> str:
+    """
+    Returns the name the related manager prefetch cache is stored under in instance._prefetched_objects_cache.
+    """
+    if hasattr(manager, "prefetch_cache_name"):
+        return manager.prefetch_cache_name  # many to many
+    remote_field = manager.field.remote_field
+    return getattr(remote_field, "cache_name", None) or remote_field.get_cache_name()
+
+
+class MergedPrefetch(Prefetch):
+    """
+    Prefetch serving several consumers of the same lookup with different filters with a single query.
+    The rows are fetched to an intermediate attribute and partitioned by
+    SideloadableRelationsMixin.apply_merged_prefetches().
+
+    consumers - list of (to_attr or None for the related manager cache, annotated flag or None for all rows)
+    """
+
+    def __init__(self, lookup: str, queryset, consumers: List, sideloading_prefetch: Union[str, Prefetch]):
+        super().__init__(lookup, queryset=queryset, to_attr=f"_sideloading_merged_{lookup}")
+        self.consumers = consumers
+        self.sideloading_prefetch = sideloading_prefetch
+
+
+class CollapsedSource:
+    """
+    Multi hop source whose related objects are fetched with a single joined query filtered by the primary objects,
+    skipping the intermediate levels.
+
+    primary_lookup - lookup from the related model back to the primary model
+    """
+
+    def __init__(self, source: str, primary_lookup: str):
+        self.source = source
+        self.primary_lookup = primary_lookup
+
+    def get_filter(self, primaries) -> Q:
+        primary_pks = primaries.values("pk") if isinstance(primaries, QuerySet) else [obj.pk for obj in primaries]
+        return Q(**{f"{self.primary_lookup}__in": primary_pks})
+
+
+class SingleFlight:
+    """
+    Sideloading response computed by the first of the concurrent identical requests, shared with the others.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[Response] = None
+        # copy of the response data made before the leader finalizes and renders its response
+        self.data = None
+        self.headers: Dict = {}
+
+
+def get_sideload_next_action():
+    """
+    Returns the extra action routing to SideloadableRelationsMixin.sideload_next(). The method is not decorated,
+    so that the route is only added by the get_extra_actions() of the mixin.
+    """
+
+    def sideload_next(self, request, *args, **kwargs):
+        return self.sideload_next(request, *args, **kwargs)
+
+    return action(detail=False, methods=["get"], url_path="sideload_next", url_name="sideload-next")(sideload_next)
+
+
 class SideloadableRelationsMixin(object):
     sideloading_query_param_name = "sideload"
     sideloading_serializer_class = None
@@ -60,6 +214,63 @@ class SideloadableRelationsMixin(object):
     user_defined_prefetches: Dict = {}
     primary_field = None
     sideloadable_field_sources: Dict = {}
+    sideloading_field_options: Dict = {}
+    # single valued lookups up to this depth are fetched with select_related instead of prefetch_related.
+    # 0 disables the heuristic, Meta.field_options "join" hints are applied regardless.
+    sideloading_join_max_depth: int = 0
+    # read related ids from foreign key values and many to many through tables instead of prefetching the related
+    # objects for every primary object. Can be overwritten with the "harvest" field option.
+    sideloading_harvest_ids: bool = False
+    # multi hop sources whose intermediate levels are not sideloaded are fetched with a single joined query (opt-in).
+    # Can be overwritten with the "collapse" field option.
+    sideloading_collapse_sources: bool = False
+    sideloading_meta_key: str = None
+    # requests with an estimated cost above the budget are rejected or downgraded by dropping the most expensive
+    # relations. See get_sideloading_costs() for the cost calculation.
+    sideloading_max_cost: Optional[float] = None
+    sideloading_budget_action: str = "reject"  # "reject" or "downgrade"
+    sideloading_cost_weights: Dict = {"queries": 1, "join_depth": 1, "fan_out": 2}
+    sideloading_dropped_relations: List = []
+    # view and sideloading prefetches of the same relation that are fetched with one query
+    sideloading_merged_prefetches: Dict = {}
+    # filtered prefetch querysets cached per view class by (source, model, get_sideloading_filter_scope())
+    sideloading_filter_cache_size: int = 256
+    _sideloading_filter_cache_lock = threading.Lock()
+    # staff users can replace the payload with the sideloading plan, "explain" adds the database EXPLAIN output
+    sideloading_explain_query_param_name = "sideload_explain"
+    # "columnar" renders the sideloaded relations as column arrays, can also be set as a media type parameter
+    sideloading_format_query_param_name = "sideload_format"
+    # "sideload_known[<relation>]=1,2,3" lists objects the client already holds, these are left out of the response
+    sideloading_known_query_param_name = "sideload_known"
+    sideloading_known_ids: Dict = {}
+    # relations with the "page_size" field option return the first objects and a cursor, the next objects are fetched
+    # from the "sideload_next" endpoint with "sideload_cursor=<token>" and the query parameters of the original request.
+    # The name differs from the "cursor" parameter of the DRF CursorPagination.
+    sideloading_cursor_query_param_name = "sideload_cursor"
+    sideloading_relation_cursors: Dict = {}
+    sideloading_cursor: Optional[Dict] = None
+    # "sideload_since=<timestamp>" limits the sideloaded relations with a "modified_field" field option
+    # to objects modified after the timestamp
+    sideloading_since_query_param_name = "sideload_since"
+    sideloading_since: Optional[datetime] = None
+    # timeout of the related ids cached for the relations with the "cache_ids" field option
+    sideloading_related_ids_cache_timeout = DEFAULT_TIMEOUT
+    # database aliases of the relations read from another database than the primary objects (replicas etc.)
+    sideloading_db_aliases: Dict = {}
+    # a sample of the sideloading requests is profiled, the profiles of requests slower than the threshold (seconds)
+    # are passed to save_sideloading_profile(). None disables the profiling.
+    sideloading_profile_threshold: Optional[float] = None
+    sideloading_profile_sample_rate: float = 0.01
+    sideloading_profile_dir: Optional[str] = None  # required unless save_sideloading_profile() is overwritten
+    # lifetime (seconds) of the in memory tables of the relations with the "reference" field option,
+    # None keeps the tables until the models change
+    sideloading_reference_ttl: Optional[float] = 300
+    # concurrent identical sideloading requests in the same process wait for the first one and share its response.
+    # See get_sideloading_single_flight_scope() for keeping the responses of different users apart.
+    sideloading_single_flight: bool = False
+    sideloading_single_flight_timeout: float = 30
+    _sideloading_flights: Dict = {}
+    _sideloading_flights_lock = threading.Lock()
     if importlib.util.find_spec("drf_spectacular") is not None:
         from drf_sideloading.schema import SideloadingAutoSchema
 
@@ -82,8 +293,13 @@ class SideloadableRelationsMixin(object):
 
         # fetch sideloading sources and prefetches
         self.user_defined_prefetches = getattr(sideloading_serializer_class.Meta, "prefetches", {})
+        self.sideloading_field_options = getattr(sideloading_serializer_class.Meta, "field_options", {})
+        self.sideloading_meta_key = sideloading_serializer_class.meta_key
         self.sideloadable_field_sources = self.get_sideloading_field_sources()
 
+    def get_sideloading_field_option(self, relation: str, option: str, default=None):
+        return self.sideloading_field_options.get(relation, {}).get(option, default)
+
     def get_source_from_prefetch(self, prefetches: Union[str, List, Dict]):
         if isinstance(prefetches, str):
             return prefetches
@@ -193,6 +409,185 @@ class SideloadableRelationsMixin(object):
             # everything checks out.
             relations_to_sideload[fieldname] = relations
 
+        self.sideloading_known_ids = self.get_sideloading_known_ids(request=request)
+        self.sideloading_since = self.get_sideloading_since(request=request)
+        return self.check_sideloading_budget(relations_to_sideload=relations_to_sideload)
+
+    def get_sideloading_known_ids(self, request) -> Dict[str, Set]:
+        """
+        Parses the "sideload_known[<relation>]" query params to sets of primary keys by relation.
+        """
+        known_ids = {}
+        prefix = f"{self.sideloading_known_query_param_name}["
+        for param in request.query_params:
+            if not param.startswith(prefix) or not param.endswith("]"):
+                continue
+            relation = param[:-1].replace(prefix, "", 1)
+            if relation not in self.sideloadable_fields:
+                msg = _(f"'{relation}' is not one of the available choices.")
+                raise ValidationError({param: [msg]})
+
+            pk_field = self.sideloadable_fields[relation].child.Meta.model._meta.pk
+            values = chain.from_iterable(value.split(",") for value in request.query_params.getlist(param))
+            try:
+                known_ids[relation] = {pk_field.to_python(value.strip()) for value in values if value.strip()}
+            except DjangoValidationError:
+                msg = _(f"'{relation}' known ids must be valid primary keys.")
+                raise ValidationError({param: [msg]})
+        return known_ids
+
+    def get_sideloading_since(self, request) -> Optional[datetime]:
+        """
+        Parses the "sideload_since" query param, an ISO 8601 date or datetime or a unix timestamp.
+        Naive datetimes are in the current time zone.
+        """
+        value = request.query_params.get(self.sideloading_since_query_param_name)
+        if not value:
+            return None
+
+        try:
+            since = datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+        except (ValueError, OverflowError):
+            try:
+                since = parse_datetime(value)
+                if since is None:
+                    date = parse_date(value)
+                    since = datetime.combine(date, dt_time.min) if date else None
+            except ValueError:
+                since = None
+        if since is None:
+            msg = _(f"'{value}' is not a valid timestamp.")
+            raise ValidationError({self.sideloading_since_query_param_name: [msg]})
+
+        if settings.USE_TZ and timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        elif not settings.USE_TZ and timezone.is_aware(since):
+            since = timezone.make_naive(since)
+        return since
+
+    def filter_sideloaded_objects(self, relation: str, objects):
+        """
+        Applies the request filters (known ids and modification time) to the sideloaded relation objects.
+        """
+        objects = self.exclude_known_objects(relation=relation, objects=objects)
+        return self.filter_modified_objects(relation=relation, objects=objects)
+
+    def filter_modified_objects(self, relation: str, objects):
+        """
+        Leaves out the sideloaded relation objects not modified after "sideload_since". Querysets are filtered in SQL,
+        objects already prefetched for the primary objects are filtered in python.
+        """
+        modified_field = self.get_sideloading_field_option(relation, "modified_field")
+        if self.sideloading_since is None or not modified_field:
+            return objects
+        if isinstance(objects, QuerySet):
+            return objects.filter(**{f"{modified_field}__gt": self.sideloading_since})
+        # objects without a modification time are left out like in SQL
+        return {
+            obj
+            for obj in objects
+            if getattr(obj, modified_field) is not None and getattr(obj, modified_field) > self.sideloading_since
+        }
+
+    def exclude_known_objects(self, relation: str, objects):
+        """
+        Leaves out the sideloaded relation objects the client listed as known. Querysets are filtered in SQL.
+        """
+        known_ids = self.sideloading_known_ids.get(relation)
+        if not known_ids:
+            return objects
+        if isinstance(objects, QuerySet):
+            return objects.exclude(pk__in=known_ids)
+        return {obj for obj in objects if obj.pk not in known_ids}
+
+    def get_sideloading_costs(self, relations_to_sideload: Dict) -> Dict[str, Dict]:
+        """
+        Estimates the cost of sideloading each relation (and its requested sources) on its own.
+
+        queries - amount of queries required for the prefetched levels and harvested relations
+        join_depth - amount of relations in the deepest lookup
+        fan_out - amount of multi valued (reverse or many to many) relations on the lookups
+        cost - sum of the above multiplied with sideloading_cost_weights
+        """
+        requested_prefetches = self._get_requested_prefetches(relations_to_sideload=relations_to_sideload)
+        harvested_sources = self.get_sideloading_harvested_sources(
+            relations_to_sideload=relations_to_sideload, requested_prefetches=requested_prefetches
+        )
+
+        costs = {}
+        for relation, relation_prefetches in requested_prefetches.items():
+            join_lookups = self.get_sideloading_join_lookups(
+                requested_prefetches={relation: relation_prefetches},
+                prefetches={self.get_source_from_prefetch(p): p for p in relation_prefetches},
+                view_prefetch_keys=set(),
+            )
+            relation_harvested_sources = harvested_sources.get(relation, {})
+
+            # every prefetched level is fetched with a separate query
+            levels = {}
+            for prefetch in relation_prefetches:
+                if isinstance(prefetch, Prefetch):
+                    to_parts, through_parts = prefetch.prefetch_to.split("__"), prefetch.prefetch_through.split("__")
+                else:
+                    to_parts = through_parts = prefetch.split("__")
+                for i in range(1, len(through_parts) + 1):
+                    levels["__".join(to_parts[:i])] = "__".join(through_parts[:i])
+
+            queries = join_depth = fan_out = 0
+            for level, lookup in levels.items():
+                hops = self.get_lookup_hops(lookup)
+                descriptor = hops[-1][1]
+                join_depth = max(join_depth, len(hops))
+                if not isinstance(descriptor, SINGLE_VALUED_RELATION_DESCRIPTORS):
+                    fan_out += 1
+                if any(j == lookup or j.startswith(f"{lookup}__") for j in join_lookups):
+                    continue
+                if any(
+                    isinstance(descriptor, CollapsedSource) and source.startswith(f"{lookup}__")
+                    for source, (descriptor, _) in relation_harvested_sources.items()
+                ):
+                    continue  # intermediate level of a collapsed source
+                if lookup in relation_harvested_sources and isinstance(descriptor, ManyToManyDescriptor):
+                    queries += 2  # through table and related objects
+                else:
+                    queries += 1
+
+            cost = {"queries": queries, "join_depth": join_depth, "fan_out": fan_out}
+            cost["cost"] = sum(self.sideloading_cost_weights.get(k, 0) * v for k, v in cost.items())
+            costs[relation] = cost
+
+        return costs
+
+    def check_sideloading_budget(self, relations_to_sideload: Dict) -> Dict:
+        """
+        Enforces sideloading_max_cost on the requested relations.
+        Rejects the request or drops the most expensive relations depending on sideloading_budget_action.
+        """
+        self.sideloading_dropped_relations = []
+        if self.sideloading_max_cost is None or not relations_to_sideload:
+            return relations_to_sideload
+
+        costs = self.get_sideloading_costs(relations_to_sideload=relations_to_sideload)
+        total_cost = sum(cost["cost"] for cost in costs.values())
+        if total_cost <= self.sideloading_max_cost:
+            return relations_to_sideload
+
+        msg = _(f"Sideloading cost {total_cost} exceeds the allowed cost of {self.sideloading_max_cost}.")
+        if self.sideloading_budget_action == "reject":
+            raise ValidationError({self.sideloading_query_param_name: [msg]})
+        elif self.sideloading_budget_action != "downgrade":
+            raise ValueError(f"Unknown sideloading_budget_action '{self.sideloading_budget_action}'")
+
+        relations_to_sideload = dict(relations_to_sideload)
+        for relation in sorted(costs, key=lambda r: costs[r]["cost"], reverse=True):
+            if total_cost <= self.sideloading_max_cost:
+                break
+            relations_to_sideload.pop(relation)
+            self.sideloading_dropped_relations.append(relation)
+            total_cost -= costs[relation]["cost"]
+        if not relations_to_sideload:
+            # a response without any of the requested relations can't be told apart from a plain list
+            raise ValidationError({self.sideloading_query_param_name: [msg]})
         return relations_to_sideload
 
     def check_sideloading_serializer_class(self, sideloading_serializer_class):
@@ -210,8 +605,26 @@ class SideloadableRelationsMixin(object):
         """
         sideloading_serializer_class = self.get_sideloading_serializer_class()
         kwargs["context"] = self.get_sideloading_serializer_context()
+        kwargs["context"].setdefault("sideloading_format", self.get_sideloading_format(request=self.request))
         return sideloading_serializer_class(*args, **kwargs)
 
+    def get_sideloading_format(self, request) -> str:
+        """
+        Returns the output format of the sideloaded relations, "objects" (default) or "columnar".
+        The format is read from the query parameter or the accepted media type parameter
+        (Accept: application/json; sideload_format=columnar).
+        """
+        value = request.query_params.get(self.sideloading_format_query_param_name)
+        if not value and getattr(request, "accepted_media_type", None):
+            params = parse_header_parameters(request.accepted_media_type)[1]
+            value = params.get(self.sideloading_format_query_param_name)
+        if not value:
+            return SIDELOADING_FORMAT_OBJECTS
+        if value not in (SIDELOADING_FORMAT_OBJECTS, SIDELOADING_FORMAT_COLUMNAR):
+            msg = _(f"'{value}' is not one of the available formats.")
+            raise ValidationError({self.sideloading_format_query_param_name: [msg]})
+        return value
+
     def get_sideloading_serializer_class(self, request=None):
         """
         Return the class to use for the sideloading_serializer.
@@ -235,54 +648,1172 @@ class SideloadableRelationsMixin(object):
         """
         return {"request": self.request, "format": self.format_kwarg, "view": self}
 
+    def get_lookup_hops(self, lookup: str) -> List:
+        """
+        Resolves the lookup starting from the primary model.
+        Returns a list of (name, descriptor, related model) tuples, one for each relation in the lookup.
+        """
+        hops = []
+        model = self.primary_model
+        for x in lookup.split("__"):
+            descriptor = getattr(model, x)
+            if isinstance(descriptor, ForwardManyToOneDescriptor):
+                model = descriptor.field.remote_field.model
+            elif isinstance(descriptor, ForwardOneToOneDescriptor):
+                model = descriptor.field.remote_field.model
+            elif isinstance(descriptor, ReverseOneToOneDescriptor):
+                model = descriptor.related.related_model
+            elif isinstance(descriptor, ReverseManyToOneDescriptor):
+                if getattr(descriptor, "reverse", None):
+                    model = descriptor.field.model
+                elif getattr(descriptor, "through", None):
+                    model = descriptor.field.related_model
+                else:
+                    model = descriptor.field.model
+            else:
+                raise NotImplementedError(f"Descriptor {descriptor.__class__.__name__} has not been implemented")
+            hops.append((x, descriptor, model))
+        return hops
+
     def get_sideloadable_queryset(self, prefetch):
         if isinstance(prefetch, str):
-            model = self.primary_model
-            for x in prefetch.split("__"):
-                descriptor = getattr(model, x)
-                if isinstance(descriptor, ForwardManyToOneDescriptor):
-                    model = descriptor.field.remote_field.model
-                elif isinstance(descriptor, ForwardOneToOneDescriptor):
-                    model = descriptor.field.remote_field.model
-                elif isinstance(descriptor, ReverseOneToOneDescriptor):
-                    model = descriptor.related.related_model
-                elif isinstance(descriptor, ReverseManyToOneDescriptor):
-                    if getattr(descriptor, "reverse", None):
-                        model = descriptor.field.model
-                    elif getattr(descriptor, "through", None):
-                        model = descriptor.field.related_model
-                    else:
-                        model = descriptor.field.model
-                else:
-                    raise NotImplementedError(f"Descriptor {descriptor.__class__.__name__} has not been implemented")
+            model = self.get_lookup_hops(prefetch)[-1][2]
             return model.objects.all()
         elif isinstance(prefetch, Prefetch):
             return prefetch.queryset
         else:
             raise NotImplementedError(f"finding queryset for prefetch type {type(prefetch)} has not been implemented")
 
+    def get_sideloading_join_lookups(
+        self, requested_prefetches: Dict[str, List], prefetches: Dict, view_prefetch_keys: Set[str]
+    ) -> List[str]:
+        """
+        Classifies the sideloading lookups and returns the ones that should be joined with select_related.
+
+        Only string lookups added by sideloading that consist of single valued relations are joined.
+        A "join" hint in Meta.field_options forces (True) or prevents (False) the join,
+        otherwise lookups up to `sideloading_join_max_depth` relations deep are joined.
+        """
+        lookup_hints = {}
+        for relation, relation_prefetches in requested_prefetches.items():
+            hint = self.get_sideloading_field_option(relation, "join")
+            for prefetch in relation_prefetches:
+                if isinstance(prefetch, str):
+                    lookup_hints.setdefault(prefetch, set()).add(hint)
+
+        join_lookups = []
+        for lookup, hints in lookup_hints.items():
+            if True not in hints and (False in hints or not self.sideloading_join_max_depth):
+                continue
+            if lookup in view_prefetch_keys or not isinstance(prefetches.get(lookup), str):
+                continue
+            hops = self.get_lookup_hops(lookup)
+            if not all(isinstance(descriptor, SINGLE_VALUED_RELATION_DESCRIPTORS) for _, descriptor, _ in hops):
+                if True in hints:
+                    raise ValueError(
+                        f"Sideloadable lookup '{lookup}' can't be joined as it has multi valued relations."
+                    )
+                continue
+            # filtered Prefetch objects on the path must not be overwritten by the join
+            parts = lookup.split("__")
+            if any(isinstance(prefetches.get("__".join(parts[:i])), Prefetch) for i in range(1, len(parts))):
+                continue
+            if True in hints or len(hops) <= self.sideloading_join_max_depth:
+                join_lookups.append(lookup)
+
+        return sorted(join_lookups)
+
+    def get_sideloading_relation_columns(self, relation: str, lookup: Optional[List[str]] = None) -> Optional[Set[str]]:
+        """
+        Returns the model fields the sideloaded relation serializer reads from the objects found at the lookup
+        (relative to the relation source). None is returned if pruning is disabled with the "only" field option
+        or the fields can't be determined.
+        """
+        if not self.get_sideloading_field_option(relation, "only", True):
+            return None
+        columns = get_serializer_columns(self.sideloadable_fields[relation].child, lookup=lookup)
+        modified_field = self.get_sideloading_field_option(relation, "modified_field")
+        if columns is not None and modified_field and not lookup:
+            columns.add(modified_field)  # required for filtering prefetched objects
+        return columns
+
+    def get_sideloading_lookup_columns(
+        self, lookup: str, relations_to_sideload: Dict, prefetched_lookups: Set[str]
+    ) -> Optional[Set[str]]:
+        """
+        Returns the model fields that have to be loaded for the objects prefetched with the lookup:
+        fields read by the primary and sideloaded serializers and the relation fields used to join the levels.
+        """
+        parts = lookup.split("__")
+        _, descriptor, model = self.get_lookup_hops(lookup)[-1]
+        columns = {model._meta.pk.name}
+
+        # relation to the parent level
+        if isinstance(descriptor, ForwardManyToOneDescriptor):
+            columns.add(descriptor.field.target_field.name)
+        elif isinstance(descriptor, ReverseOneToOneDescriptor):
+            columns.add(descriptor.related.field.name)
+        elif isinstance(descriptor, ReverseManyToOneDescriptor) and not isinstance(descriptor, ManyToManyDescriptor):
+            columns.add(descriptor.field.name)
+
+        # relations to the nested levels
+        for prefetched_lookup in prefetched_lookups:
+            if prefetched_lookup.startswith(f"{lookup}__") and prefetched_lookup.count("__") == len(parts):
+                child_descriptor = getattr(model, prefetched_lookup.rsplit("__", 1)[1])
+                if isinstance(child_descriptor, ForwardManyToOneDescriptor):
+                    columns.add(child_descriptor.field.name)
+
+        # fields read by the serializers
+        consumer_columns = [get_serializer_columns(self.primary_field.child, lookup=parts)]
+        for relation, source_keys in relations_to_sideload.items():
+            for source in self._get_requested_sources(relation=relation, source_keys=source_keys):
+                if source == lookup:
+                    consumer_columns.append(self.get_sideloading_relation_columns(relation))
+                elif lookup.startswith(f"{source}__"):
+                    source_depth = source.count("__") + 1
+                    relation_lookup = parts[source_depth:]
+                    consumer_columns.append(self.get_sideloading_relation_columns(relation, lookup=relation_lookup))
+        if any(c is None for c in consumer_columns):
+            return None
+        return columns.union(*consumer_columns)
+
+    def get_sideloading_pruned_prefetches(
+        self,
+        relations_to_sideload: Dict,
+        requested_prefetches: Dict[str, List],
+        prefetches: Dict,
+        view_prefetch_keys: Set[str],
+        join_lookups: List[str],
+    ) -> Dict:
+        """
+        Replaces the string prefetches added by sideloading with Prefetch objects that only load the required columns.
+        Intermediate levels of nested lookups are added as separate Prefetch objects.
+        """
+        opted_out_lookups = {
+            prefetch
+            for relation, relation_prefetches in requested_prefetches.items()
+            if not self.get_sideloading_field_option(relation, "only", True)
+            for prefetch in relation_prefetches
+            if isinstance(prefetch, str)
+        }
+
+        def is_joined(lookup):
+            return any(j == lookup or j.startswith(f"{lookup}__") for j in join_lookups)
+
+        lookups = set()
+        for key, prefetch in prefetches.items():
+            if not isinstance(prefetch, str) or key in view_prefetch_keys or key in opted_out_lookups:
+                continue
+            parts = key.split("__")
+            for i in range(1, len(parts) + 1):
+                lookup = "__".join(parts[:i])
+                if (lookup == key or lookup not in prefetches) and not is_joined(lookup):
+                    lookups.add(lookup)
+
+        prefetched_lookups = {p.prefetch_through if isinstance(p, Prefetch) else p for p in prefetches.values()}
+        prefetched_lookups |= lookups
+        pruned_prefetches = dict(prefetches)
+        for lookup in sorted(lookups):
+            columns = self.get_sideloading_lookup_columns(
+                lookup=lookup, relations_to_sideload=relations_to_sideload, prefetched_lookups=prefetched_lookups
+            )
+            if columns is None:
+                continue
+            _, descriptor, model = self.get_lookup_hops(lookup)[-1]
+            if isinstance(descriptor, SINGLE_VALUED_RELATION_DESCRIPTORS):
+                manager = model._base_manager
+            else:
+                manager = model._default_manager
+            pruned_prefetches[lookup] = Prefetch(lookup, queryset=manager.only(*sorted(columns)))
+        return pruned_prefetches
+
+    def get_sideloading_db_alias(self, request, relation: str) -> Optional[str]:
+        """
+        Returns the database alias the sideloaded relation is read from, None for the database of the primary objects.
+        Defaults to the "using" field option.
+        """
+        return self.get_sideloading_field_option(relation, "using")
+
+    def get_sideloading_db_aliases(self, request, relations_to_sideload: Dict, primary_db: str) -> Dict[str, str]:
+        """
+        Returns the database aliases of the relations read from another database than the primary objects.
+        Inside transactions all relations are read from the primary database so that uncommitted changes are seen.
+        """
+        if connections[primary_db].in_atomic_block:
+            return {}
+        db_aliases = {}
+        for relation in relations_to_sideload:
+            db_alias = self.get_sideloading_db_alias(request=request, relation=relation)
+            if db_alias and db_alias != primary_db:
+                db_aliases[relation] = db_alias
+        return db_aliases
+
+    def get_sideloading_routed_prefetches(
+        self,
+        requested_prefetches: Dict[str, List],
+        prefetches: Dict,
+        view_prefetch_keys: Set[str],
+        join_lookups: List[str],
+    ) -> Dict:
+        """
+        Reads the prefetches of the relations with a database alias from that database.
+        Lookups shared by relations with different aliases, view prefetches and joined lookups are not changed.
+        """
+        if not self.sideloading_db_aliases:
+            return prefetches
+
+        # prefetch keys (including the intermediate levels) of each relation
+        key_aliases = {}
+        for relation, relation_prefetches in requested_prefetches.items():
+            for prefetch in relation_prefetches:
+                lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+                parts = lookup.split("__")
+                keys = ["__".join(parts[:i]) for i in range(1, len(parts))] + [self.get_source_from_prefetch(prefetch)]
+                for key in keys:
+                    key_aliases.setdefault(key, set()).add(self.sideloading_db_aliases.get(relation))
+
+        routed_prefetches = dict(prefetches)
+        for key, db_aliases in sorted(key_aliases.items()):
+            db_alias = next(iter(db_aliases))
+            if len(db_aliases) > 1 or db_alias is None:
+                continue
+            if key in view_prefetch_keys or key in join_lookups:
+                continue
+            prefetch = prefetches.get(key)
+            if prefetch is None or isinstance(prefetch, MergedPrefetch):
+                continue
+            if isinstance(prefetch, Prefetch) and prefetch.queryset is not None:
+                prefetch = copy.copy(prefetch)
+                prefetch.queryset = prefetch.queryset.using(db_alias)
+            else:
+                lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+                _, descriptor, model = self.get_lookup_hops(lookup)[-1]
+                if isinstance(descriptor, SINGLE_VALUED_RELATION_DESCRIPTORS):
+                    manager = model._base_manager
+                else:
+                    manager = model._default_manager
+                to_attr = prefetch.to_attr if isinstance(prefetch, Prefetch) else None
+                prefetch = Prefetch(lookup, queryset=manager.using(db_alias), to_attr=to_attr)
+            routed_prefetches[key] = prefetch
+        return routed_prefetches
+
+    def get_sideloading_harvest_descriptor(self, relation: str, source: str, relation_prefetches: List):
+        """
+        Returns the descriptor of the source if the related ids can be harvested without loading the related objects
+        for every primary object. Forward foreign keys are read from the primary objects and many to many relations
+        from the through table. None is returned if the source has to be prefetched.
+        """
+        harvest = self.get_sideloading_field_option(relation, "harvest")
+        if harvest is None:
+            # capped and paginated relations are harvested so that outliers are never loaded completely,
+            # cached ids and reference data are only useful if the related objects are fetched separately
+            harvest = any(
+                [
+                    self.sideloading_harvest_ids,
+                    self.get_sideloading_field_option(relation, "max_items") is not None,
+                    self.get_sideloading_field_option(relation, "page_size") is not None,
+                    self.get_sideloading_field_option(relation, "cache_ids", False),
+                    self.get_sideloading_field_option(relation, "reference", False),
+                ]
+            )
+        if not harvest:
+            return None
+        if "__" in source:
+            return None
+        if any(isinstance(p, Prefetch) and source in (p.prefetch_through, p.prefetch_to) for p in relation_prefetches):
+            return None  # Prefetch objects can filter the relation
+        descriptor = getattr(self.primary_model, source, None)
+        if isinstance(descriptor, ManyToManyDescriptor):
+            return descriptor
+        if isinstance(descriptor, ForwardManyToOneDescriptor) and descriptor.field.target_field.primary_key:
+            return descriptor
+        return None
+
+    def get_sideloading_collapsed_source(
+        self, relation: str, source: str, requested_prefetches: Dict[str, List]
+    ) -> Optional[CollapsedSource]:
+        """
+        Returns a CollapsedSource if the multi hop source can be fetched with a single joined query
+        (Supplier.objects.filter(products__category__in=categories).distinct() for "products__supplier").
+        None is returned if an intermediate level is sideloaded by any relation or any level is filtered.
+        """
+        if not self.get_sideloading_field_option(relation, "collapse", self.sideloading_collapse_sources):
+            return None
+        if "__" not in source:
+            return None
+        try:
+            hops = self.get_lookup_hops(source)
+        except (AttributeError, NotImplementedError):
+            return None
+
+        levels = ["__".join(source.split("__")[:i]) for i in range(1, len(hops) + 1)]
+        for other_relation, relation_prefetches in requested_prefetches.items():
+            other_sources = self.sideloadable_field_sources.get(other_relation)
+            other_sources = set(other_sources.values()) if isinstance(other_sources, dict) else {other_sources}
+            other_collapse = self.get_sideloading_field_option(
+                other_relation, "collapse", self.sideloading_collapse_sources
+            )
+            for prefetch in relation_prefetches:
+                lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+                if lookup.startswith(f"{source}__"):
+                    continue  # nested levels are prefetched for the related objects
+                if isinstance(prefetch, Prefetch) and any(
+                    lookup == level or lookup.startswith(f"{level}__") for level in levels
+                ):
+                    return None  # Prefetch objects can filter the levels
+                if lookup == source or (other_collapse and "__" in lookup and lookup in other_sources):
+                    continue  # collapsed as well
+                if any(lookup == level or lookup.startswith(f"{level}__") for level in levels[:-1]):
+                    return None  # the intermediate level is sideloaded
+
+        request = getattr(self, "request", None)
+        primary_lookups = []
+        model = self.primary_model
+        for level, (name, descriptor, related_model) in zip(levels, hops):
+            if request is not None:
+                if self._get_sideloading_filter(source=level, model=related_model, request=request)[1]:
+                    return None
+            field = model._meta.get_field(name)
+            primary_lookup = field.field.name if isinstance(field, ForeignObjectRel) else field.related_query_name()
+            if primary_lookup.endswith("+"):
+                return None  # hidden reverse relation
+            primary_lookups.insert(0, primary_lookup)
+            model = related_model
+        return CollapsedSource(source=source, primary_lookup="__".join(primary_lookups))
+
+    def get_sideloading_harvested_sources(self, relations_to_sideload: Dict, requested_prefetches: Dict = None) -> Dict:
+        """
+        Returns the sources whose related ids are harvested (or collapsed to a joined query) instead of prefetched
+        {relation: {source: (descriptor or CollapsedSource, prefetches for the related objects)}}
+        """
+        if requested_prefetches is None:
+            requested_prefetches = self._get_requested_prefetches(relations_to_sideload=relations_to_sideload)
+
+        harvested_sources = {}
+        for relation, source_keys in relations_to_sideload.items():
+            relation_prefetches = requested_prefetches[relation]
+            for source in self._get_requested_sources(relation=relation, source_keys=source_keys):
+                descriptor = self.get_sideloading_harvest_descriptor(
+                    relation=relation, source=source, relation_prefetches=relation_prefetches
+                )
+                if descriptor is None:
+                    descriptor = self.get_sideloading_collapsed_source(
+                        relation=relation, source=source, requested_prefetches=requested_prefetches
+                    )
+                if descriptor is None:
+                    continue
+                # nested prefetches are applied to the related objects queryset
+                related_prefetches = []
+                for prefetch in relation_prefetches:
+                    lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+                    if not lookup.startswith(f"{source}__"):
+                        continue
+                    related_lookup = lookup.split("__", 1)[1]
+                    if isinstance(prefetch, Prefetch):
+                        related_prefetches.append(
+                            Prefetch(related_lookup, queryset=prefetch.queryset, to_attr=prefetch.to_attr)
+                        )
+                    else:
+                        related_prefetches.append(related_lookup)
+                harvested_sources.setdefault(relation, {})[source] = (descriptor, related_prefetches)
+        return harvested_sources
+
+    def get_harvested_id_pairs(self, descriptor, primaries) -> List:
+        """
+        Returns (primary pk, related id) pairs for the harvested source.
+        primaries can be a list of primary objects or a queryset.
+        """
+        if isinstance(descriptor, ManyToManyDescriptor):
+            if isinstance(primaries, QuerySet):
+                primary_pks = primaries.values("pk")
+            else:
+                primary_pks = [obj.pk for obj in primaries]
+            return self.get_through_id_pairs(descriptor, primary_pks)
+
+        attname = descriptor.field.attname
+        if isinstance(primaries, QuerySet):
+            pairs = primaries.values_list("pk", attname)
+        else:
+            pairs = ((obj.pk, getattr(obj, attname)) for obj in primaries)
+        return [(pk, related_id) for pk, related_id in pairs if related_id is not None]
+
+    def get_through_id_pairs(self, descriptor, primary_pks) -> List:
+        """
+        Returns (primary pk, related id) pairs of the many to many relation read from the through table.
+        """
+        through = descriptor.through
+        source_attname, target_attname = get_through_attnames(descriptor.field, reverse=descriptor.reverse)
+        return list(
+            through._default_manager.filter(**{f"{source_attname}__in": primary_pks}).values_list(
+                source_attname, target_attname
+            )
+        )
+
+    def get_cached_harvested_ids(self, descriptor, primaries) -> Dict:
+        """
+        Returns the many to many related ids by primary pk. The ids are read from the related ids cache with a single
+        get_many() call, the ids missing from the cache are read from the through table and added to the cache.
+        """
+        if isinstance(primaries, QuerySet) and primaries._result_cache is None:
+            primary_pks = list(primaries.values_list("pk", flat=True))
+        else:
+            primary_pks = [obj.pk for obj in primaries]
+
+        related_ids = get_cached_related_ids(descriptor.field, descriptor.reverse, primary_pks)
+        if related_ids is None:
+            raise ValueError(f"The 'cache_ids' field option requires the {RELATED_IDS_CACHE_SETTING} setting.")
+        missing_pks = [pk for pk in primary_pks if pk not in related_ids]
+        if missing_pks:
+            missing_related_ids = {pk: [] for pk in missing_pks}
+            for pk, related_id in self.get_through_id_pairs(descriptor, missing_pks):
+                missing_related_ids[pk].append(related_id)
+            set_cached_related_ids(
+                descriptor.field,
+                descriptor.reverse,
+                missing_related_ids,
+                timeout=self.sideloading_related_ids_cache_timeout,
+            )
+            related_ids.update(missing_related_ids)
+        return related_ids
+
+    def get_harvested_ids(
+        self,
+        descriptor,
+        primaries,
+        limit: Optional[int] = None,
+        cache_ids: bool = False,
+        related_queryset: Optional[QuerySet] = None,
+    ) -> Set:
+        """
+        Returns the related ids of the harvested source.
+        With related_queryset only the ids of its objects are returned, the ids are restricted before the limit.
+        With limit only the smallest related ids are returned, many to many ids are limited in the query.
+        With cache_ids many to many ids are read from the related ids cache and restricted with related_queryset.
+        """
+        if cache_ids and isinstance(descriptor, ManyToManyDescriptor):
+            related_ids = set(chain.from_iterable(self.get_cached_harvested_ids(descriptor, primaries).values()))
+            if related_queryset is not None and related_ids:
+                # the cache holds the unfiltered ids shared by every request
+                related_ids = set(related_queryset.filter(pk__in=related_ids).values_list("pk", flat=True))
+            return related_ids if limit is None else set(sorted(related_ids)[:limit])
+
+        if isinstance(descriptor, ManyToManyDescriptor) and (limit is not None or related_queryset is not None):
+            field = descriptor.field
+            through = descriptor.through
+            if descriptor.reverse:
+                source_name, target_name = field.m2m_reverse_field_name(), field.m2m_field_name()
+            else:
+                source_name, target_name = field.m2m_field_name(), field.m2m_reverse_field_name()
+            primary_pks = primaries.values("pk") if isinstance(primaries, QuerySet) else [obj.pk for obj in primaries]
+            target_attname = through._meta.get_field(target_name).attname
+            filters = {f"{source_name}__in": primary_pks}
+            if related_queryset is not None:
+                filters[f"{target_attname}__in"] = related_queryset.values("pk")
+            related_ids = (
+                through._default_manager.filter(**filters)
+                .values_list(target_attname, flat=True)
+                .distinct()
+                .order_by(target_attname)
+            )
+            return set(related_ids if limit is None else related_ids[:limit])
+
+        related_ids = {related_id for _, related_id in self.get_harvested_id_pairs(descriptor, primaries)}
+        if related_queryset is not None and related_ids:
+            related_ids = set(related_queryset.filter(pk__in=related_ids).values_list("pk", flat=True))
+        if limit is not None:
+            related_ids = set(sorted(related_ids)[:limit])
+        return related_ids
+
+    def harvest_related(self, relation: str, source: str, descriptor, primaries) -> Tuple[Set, List[Q]]:
+        """
+        Returns the related ids and the related object filters of the harvested or collapsed source.
+        """
+        if isinstance(descriptor, CollapsedSource):
+            return set(), [descriptor.get_filter(primaries)]
+        related_ids = self.get_harvested_ids(
+            descriptor,
+            primaries,
+            limit=self.get_sideloading_relation_limit(relation),
+            cache_ids=self.get_sideloading_field_option(relation, "cache_ids", False),
+            related_queryset=self.get_sideloading_harvest_queryset(relation=relation, source=source),
+        )
+        return related_ids, []
+
+    def get_sideloading_harvest_queryset(self, relation: str, source: str) -> Optional[QuerySet]:
+        """
+        Returns the queryset the harvested ids of the source are restricted to, None if the ids are not filtered.
+        The harvested ids are filtered with add_sideloading_prefetch_filter() like the prefetched objects and
+        the request filters (known ids and modification time) are applied, so that the "max_items" limit only counts
+        the returned objects.
+        """
+        model = self.sideloadable_fields[relation].child.Meta.model
+        queryset = model.objects.all()
+        filtered = False
+        request = getattr(self, "request", None)
+        if request is not None:
+            filtered_queryset, added, fingerprint = self._get_sideloading_filter(
+                source=source, model=model, request=request
+            )
+            if added and fingerprint:
+                queryset, filtered = filtered_queryset, True
+        restricted_queryset = self.filter_sideloaded_objects(relation=relation, objects=queryset)
+        if restricted_queryset is queryset and not filtered:
+            return None
+        return restricted_queryset.using(self.sideloading_db_aliases.get(relation))
+
+    def get_sideloading_relation_limit(self, relation: str) -> Optional[int]:
+        """
+        Returns the amount of related ids to be collected for the relation, one more than "max_items" is required
+        to detect truncation.
+        """
+        max_items = self.get_sideloading_field_option(relation, "max_items")
+        return None if max_items is None else max_items + 1
+
+    def limit_sideloaded_objects(self, relation: str, objects, sideloadable_page: Dict):
+        """
+        Caps the sideloaded relation objects to the "max_items" field option ordered by the primary key.
+        Querysets are limited in SQL. Truncated relations are listed in the sideloading metadata of the page.
+        """
+        max_items = self.get_sideloading_field_option(relation, "max_items")
+        if max_items is None:
+            return objects
+
+        limit = max_items + 1
+        if isinstance(objects, QuerySet):
+            objects = list(objects.order_by("pk")[:limit])
+        else:
+            objects = sorted(objects, key=lambda obj: obj.pk)[:limit]
+        if len(objects) > max_items:
+            objects = objects[:max_items]
+            self._add_sideloading_meta(
+                sideloadable_page=sideloadable_page, key="truncated", relation=relation, value={"max_items": max_items}
+            )
+        return objects
+
+    def paginate_sideloaded_objects(self, relation: str, source_keys, objects, sideloadable_page: Dict):
+        """
+        Returns the first "page_size" sideloaded relation objects (after the cursor of the sideload_next request)
+        ordered by the primary key. The cursor of the next objects is listed in the sideloading metadata of the page.
+        """
+        page_size = self.get_sideloading_field_option(relation, "page_size")
+        if page_size is None:
+            return objects
+
+        after = self.sideloading_relation_cursors.get(relation)
+        if isinstance(objects, QuerySet):
+            if after is not None:
+                objects = objects.filter(pk__gt=after)
+            objects = list(objects.order_by("pk")[: page_size + 1])
+        else:
+            objects = sorted((obj for obj in objects if after is None or obj.pk > after), key=lambda obj: obj.pk)
+            objects = objects[: page_size + 1]
+        if len(objects) > page_size:
+            objects = objects[:page_size]
+            cursor = {
+                "relation": relation,
+                "sources": sorted(source_keys) if source_keys else None,
+                "primary": self.get_sideloading_cursor_primary(),
+                "request": self.get_sideloading_cursor_digest(request=self.request),
+                "after": str(objects[-1].pk),
+            }
+            self._add_sideloading_meta(
+                sideloadable_page=sideloadable_page,
+                key="cursors",
+                relation=relation,
+                value=signing.dumps(cursor, salt=self.get_sideloading_cursor_salt(), compress=True),
+            )
+        return objects
+
+    def get_sideloading_cursor_salt(self) -> str:
+        return f"drf_sideloading.cursor:{self.__class__.__module__}.{self.__class__.__name__}"
+
+    def get_sideloading_cursor_primary(self) -> Optional[str]:
+        """
+        Returns the lookup value of the detail request the cursor is created for, None for list requests.
+        """
+        if self.sideloading_cursor is not None:
+            return self.sideloading_cursor["primary"]
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            return str(self.kwargs[lookup_url_kwarg])
+        return None
+
+    def get_sideloading_cursor_scope(self, request):
+        """
+        Returns a hashable key that determines who can use a cursor. Defaults to the user.
+
+        Example:
+
+        get_sideloading_cursor_scope(self, request):
+            return ("tenant", request.tenant.pk)
+        """
+        return ("user", request.user.pk)
+
+    def get_sideloading_cursor_digest(self, request) -> str:
+        """
+        Returns the digest of the cursor scope and the query parameters (filters, page...) of the request
+        without the sideloading parameters. The sideload_next request must match the request of the cursor.
+        """
+        sideloading_params = {
+            self.sideloading_query_param_name,
+            self.sideloading_cursor_query_param_name,
+            self.sideloading_since_query_param_name,
+            self.sideloading_format_query_param_name,
+            self.sideloading_explain_query_param_name,
+        }
+        query = [
+            (param, tuple(values))
+            for param, values in sorted(request.query_params.lists())
+            if not any([param in sideloading_params, param.startswith(f"{self.sideloading_known_query_param_name}[")])
+        ]
+        key = (self.get_sideloading_cursor_scope(request=request), query)
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get_sideloading_cursor(self, request) -> Dict:
+        """
+        Returns the validated cursor of the sideload_next request.
+        """
+        token = request.query_params.get(self.sideloading_cursor_query_param_name)
+        if not token:
+            raise ValidationError({self.sideloading_cursor_query_param_name: [_("This field is required.")]})
+        try:
+            cursor = signing.loads(token, salt=self.get_sideloading_cursor_salt())
+        except signing.BadSignature:
+            raise ValidationError({self.sideloading_cursor_query_param_name: [_("Invalid cursor.")]})
+        if any(
+            [
+                self.get_sideloading_field_option(cursor["relation"], "page_size") is None,
+                cursor["request"] != self.get_sideloading_cursor_digest(request=request),
+            ]
+        ):
+            raise ValidationError({self.sideloading_cursor_query_param_name: [_("Invalid cursor.")]})
+        return cursor
+
+    @classmethod
+    def uses_sideloading_relation_pagination(cls) -> bool:
+        """
+        Returns True if a relation of the sideloading serializer is paginated or the serializer is picked per request.
+        """
+        if cls.get_sideloading_serializer_class is not SideloadableRelationsMixin.get_sideloading_serializer_class:
+            return True
+        serializer_class = cls.sideloading_serializer_class
+        return serializer_class is not None and any(
+            "page_size" in options for options in getattr(serializer_class.Meta, "field_options", {}).values()
+        )
+
+    @classmethod
+    def get_extra_actions(cls):
+        """
+        Adds the sideload_next action to the views using relation pagination.
+        """
+        actions = super().get_extra_actions()
+        if cls.uses_sideloading_relation_pagination():
+            actions.append(get_sideload_next_action())
+        return actions
+
+    def sideload_next(self, request, *args, **kwargs):
+        """
+        Returns the next objects of a paginated sideloaded relation for the primary objects of the cursor.
+        The query parameters of the request the cursor was created for (filters, page...) must be sent again.
+        """
+        self.initialize_serializer(request=request)
+        cursor = self.get_sideloading_cursor(request=request)
+        relation = cursor["relation"]
+        relations_to_sideload = {relation: set(cursor["sources"]) if cursor["sources"] else None}
+        related_model = self.sideloadable_fields[relation].child.Meta.model
+        self.sideloading_relation_cursors = {relation: related_model._meta.pk.to_python(cursor["after"])}
+        self.sideloading_cursor = cursor
+        self.sideloading_known_ids = self.get_sideloading_known_ids(request=request)
+        self.sideloading_since = self.get_sideloading_since(request=request)
+
+        # the primary objects are looked up again with the filters and the page of the request
+        queryset = self.filter_queryset(self.get_queryset())
+        if cursor["primary"] is not None:
+            obj = get_object_or_404(queryset, **{self.lookup_field: cursor["primary"]})
+            self.check_object_permissions(request, obj)
+            queryset = queryset.filter(pk=obj.pk)
+        else:
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                queryset = queryset.filter(pk__in=[obj.pk for obj in page])
+        queryset = self.add_sideloading_prefetches(
+            queryset=queryset, request=request, relations_to_sideload=relations_to_sideload
+        )
+        sideloadable_page = self.get_sideloadable_page_from_queryset(
+            queryset=queryset, relations_to_sideload=relations_to_sideload
+        )
+        serializer = self.get_sideloading_serializer(
+            instance=sideloadable_page,
+            relations_to_sideload=relations_to_sideload,
+            context={"request": request},
+        )
+        data = serializer.data
+        data.pop(self.primary_field_name)
+        return Response(data)
+
+    def get_sideloading_fragments(self, relation: str, objects) -> Union[bytes, Dict]:
+        """
+        Returns pre encoded JSON of the sideloaded relation (from a cache etc.) that is written to the response
+        verbatim, skipping the serialization and encoding of the objects.
+        Either the encoded relation list (bytes) or a dict of encoded objects by primary key can be returned.
+        Only used if the accepted renderer supports fragments (SideloadingJSONRenderer).
+        """
+        return {}
+
+    def add_sideloading_fragments(self, relation: str, objects):
+        """
+        Replaces the sideloaded relation or its objects with the JSON fragments of get_sideloading_fragments().
+        """
+        renderer = getattr(self.request, "accepted_renderer", None)
+        if not getattr(renderer, "supports_json_fragments", False):
+            return objects
+        if self.get_sideloading_format(request=self.request) == SIDELOADING_FORMAT_COLUMNAR:
+            return objects  # fragments can't be split into columns
+
+        fragments = self.get_sideloading_fragments(relation=relation, objects=objects)
+        if isinstance(fragments, bytes):
+            return JSONFragment(fragments)
+        if not fragments:
+            return objects
+        return [JSONFragment(fragments[obj.pk]) if obj.pk in fragments else obj for obj in objects]
+
+    def get_merged_prefetch(
+        self, existing_prefetch: Union[str, Prefetch], prefetch: Union[str, Prefetch]
+    ) -> Optional[MergedPrefetch]:
+        """
+        Merges differently filtered view and sideloading prefetches of the same multi valued relation into a single
+        query with the filters OR'd. The view prefetch keeps its attribute, the sideloading rows are stored separately.
+        None is returned if the prefetches can't be merged (nested lookups, joins or slicing in the querysets).
+        """
+        lookups = {p.prefetch_through if isinstance(p, Prefetch) else p for p in [existing_prefetch, prefetch]}
+        if len(lookups) != 1:
+            return None
+        lookup = lookups.pop()
+        if "__" in lookup or not isinstance(getattr(self.primary_model, lookup, None), ReverseManyToOneDescriptor):
+            return None
+
+        model = self.get_lookup_hops(lookup)[-1][2]
+        querysets = []
+        for consumer_prefetch in [existing_prefetch, prefetch]:
+            queryset = getattr(consumer_prefetch, "queryset", None)
+            if queryset is None:
+                queryset = model._default_manager.all()
+            if queryset.model != model or queryset.query.is_sliced or queryset._prefetch_related_lookups:
+                return None
+            if len(queryset.query.alias_map) > 1:
+                return None  # the filters are reused as annotations, joins would not match
+            querysets.append(queryset)
+
+        unfiltered_querysets = [queryset for queryset in querysets if not queryset.query.where]
+        merged_queryset = unfiltered_querysets[0] if unfiltered_querysets else querysets[0] | querysets[1]
+        flags = []
+        for i, queryset in enumerate(querysets):
+            if not queryset.query.where:
+                flags.append(None)
+                continue
+            flag = f"_sideloading_merged_{i}"
+            condition = ExpressionWrapper(queryset.query.where.clone(), output_field=BooleanField())
+            merged_queryset = merged_queryset.annotate(**{flag: condition})
+            flags.append(flag)
+
+        # load the columns of both consumers
+        deferred_loading = [queryset.query.deferred_loading for queryset in querysets]
+        if not any(defer for _, defer in deferred_loading):
+            merged_queryset = merged_queryset.only(*sorted(set().union(*(fields for fields, _ in deferred_loading))))
+        else:
+            merged_queryset.query.clear_deferred_loading()
+
+        existing_to_attr = getattr(existing_prefetch, "to_attr", None)
+        sideloading_to_attr = f"_sideloading_{self.get_source_from_prefetch(prefetch)}"
+        return MergedPrefetch(
+            lookup,
+            queryset=merged_queryset,
+            consumers=[(existing_to_attr, flags[0]), (sideloading_to_attr, flags[1])],
+            sideloading_prefetch=prefetch,
+        )
+
+    def apply_merged_prefetches(self, objects):
+        """
+        Partitions the rows of the merged prefetches into the attributes of their consumers.
+        """
+        for merged_prefetch in self.sideloading_merged_prefetches.values():
+            for obj in objects:
+                if merged_prefetch.prefetch_to not in obj.__dict__:
+                    continue  # already partitioned
+                rows = obj.__dict__.pop(merged_prefetch.prefetch_to)
+                for to_attr, flag in merged_prefetch.consumers:
+                    values = [row for row in rows if flag is None or getattr(row, flag)]
+                    if to_attr:
+                        setattr(obj, to_attr, values)
+                        continue
+                    manager = getattr(obj, merged_prefetch.prefetch_through)
+                    queryset = manager.get_queryset()
+                    queryset._result_cache = values
+                    queryset._prefetch_done = True
+                    if not hasattr(obj, "_prefetched_objects_cache"):
+                        obj._prefetched_objects_cache = {}
+                    obj._prefetched_objects_cache[get_prefetch_cache_name(manager)] = queryset
+
     def add_sideloading_prefetches(self, queryset, request, relations_to_sideload):
         # Iterate over the prefetches of the original queryset and modify them
         view_prefetches = {}
         for prefetch in queryset._prefetch_related_lookups:
             self._add_prefetch(prefetches=view_prefetches, prefetch=prefetch, request=request)
         original_prefetches = [v for k, v in sorted(view_prefetches.items())]
+        view_prefetch_keys = set(view_prefetches.keys())
 
         # find applicable prefetches
+        requested_prefetches = self._get_requested_prefetches(relations_to_sideload=relations_to_sideload)
+
+        # harvested sources don't need the related objects prefetched
+        harvested_sources = self.get_sideloading_harvested_sources(
+            relations_to_sideload=relations_to_sideload, requested_prefetches=requested_prefetches
+        )
+        for relation, sources in harvested_sources.items():
+            requested_prefetches[relation] = [
+                prefetch
+                for prefetch in requested_prefetches[relation]
+                if not any(
+                    lookup == source or lookup.startswith(f"{source}__")
+                    for lookup in [prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch]
+                    for source in sources
+                )
+            ]
+
         gathered_prefetches = self._get_relevant_prefetches(
             relations_to_sideload=relations_to_sideload,
             gathered_prefetches=view_prefetches,
             request=request,
+            requested_prefetches=requested_prefetches,
+            merge_keys=view_prefetch_keys,
+        )
+        self.sideloading_merged_prefetches = {
+            key: prefetch for key, prefetch in gathered_prefetches.items() if isinstance(prefetch, MergedPrefetch)
+        }
+        for key in self.sideloading_merged_prefetches:
+            if any(lookup.startswith(f"{key}__") for lookup in gathered_prefetches):
+                raise ValueError(
+                    f"Can't merge the view and sideloading prefetches of '{key}' as it has nested prefetches. "
+                    "Set a to_attr to the sideloading Prefetch."
+                )
+
+        self.sideloading_db_aliases = self.get_sideloading_db_aliases(
+            request=request, relations_to_sideload=relations_to_sideload, primary_db=queryset.db
+        )
+
+        # single valued relations can be fetched with a join instead of an extra query
+        join_lookups = self.get_sideloading_join_lookups(
+            requested_prefetches=requested_prefetches,
+            prefetches=gathered_prefetches,
+            view_prefetch_keys=view_prefetch_keys,
+        )
+
+        # fetch only the columns the serializers require
+        gathered_prefetches = self.get_sideloading_pruned_prefetches(
+            relations_to_sideload=relations_to_sideload,
+            requested_prefetches=requested_prefetches,
+            prefetches=gathered_prefetches,
+            view_prefetch_keys=view_prefetch_keys,
+            join_lookups=join_lookups,
+        )
+
+        # read the relations from their own databases
+        gathered_prefetches = self.get_sideloading_routed_prefetches(
+            requested_prefetches=requested_prefetches,
+            prefetches=gathered_prefetches,
+            view_prefetch_keys=view_prefetch_keys,
+            join_lookups=join_lookups,
         )
 
         # replace prefetches if any change made
-        prefetches = [v for k, v in sorted(gathered_prefetches.items())]
+        prefetches = [v for k, v in sorted(gathered_prefetches.items()) if k not in join_lookups]
         if prefetches != original_prefetches:
             if original_prefetches:
                 queryset = queryset.prefetch_related(None)
             queryset = queryset.prefetch_related(*prefetches)
+        if join_lookups:
+            queryset = queryset.select_related(*join_lookups)
         return queryset
 
+    def has_sideloading_explain_permission(self, request) -> bool:
+        """
+        Only staff users are allowed to see the sideloading plan and SQL.
+        """
+        user = getattr(request, "user", None)
+        return bool(user and user.is_staff)
+
+    def get_sideloading_explain_mode(self, request) -> Optional[str]:
+        """
+        Returns None, "plan" or "explain" depending on the explain query parameter.
+        """
+        value = request.query_params.get(self.sideloading_explain_query_param_name)
+        if not value or value.lower() in ("0", "false"):
+            return None
+        if not self.has_sideloading_explain_permission(request):
+            raise PermissionDenied(_("Sideloading explain is only available to staff users."))
+        return "explain" if value.lower() == "explain" else "plan"
+
+    def explain_sideloading(self, request, relations_to_sideload: Dict, detail: bool = False, analyze: bool = False):
+        """
+        Builds and executes the sideloading querysets and returns the plan instead of the payload:
+        resolved relations, final prefetches and joins, reused and replaced view prefetches
+        and the executed SQL queries (with the database EXPLAIN output if analyze is set).
+        """
+        view_queryset = self.get_queryset()
+        view_prefetches = {self.get_source_from_prefetch(p): p for p in view_queryset._prefetch_related_lookups}
+        harvested_sources = self.get_sideloading_harvested_sources(relations_to_sideload=relations_to_sideload)
+        costs = self.get_sideloading_costs(relations_to_sideload=relations_to_sideload)
+
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            queries.append({"sql": sql, "params": params, "many": many})
+            return execute(sql, params, many, context)
+
+        connection = connections[view_queryset.db]
+        with connection.execute_wrapper(record_query):
+            if detail:
+                queryset = self.get_sideloadable_object_as_queryset(
+                    request=request, relations_to_sideload=relations_to_sideload
+                )
+                page = None
+            else:
+                queryset = self.add_sideloading_prefetches(
+                    queryset=view_queryset, request=request, relations_to_sideload=relations_to_sideload
+                )
+                queryset = self.filter_queryset(queryset)
+                page = self.paginate_queryset(queryset)
+            if page is not None:
+                sideloadable_page = self.get_sideloadable_page(page=page, relations_to_sideload=relations_to_sideload)
+            else:
+                sideloadable_page = self.get_sideloadable_page_from_queryset(
+                    queryset=queryset, relations_to_sideload=relations_to_sideload
+                )
+            # evaluate the serializer as it triggers the remaining queries
+            self.get_sideloading_serializer(
+                instance=sideloadable_page, relations_to_sideload=relations_to_sideload, context={"request": request}
+            ).data
+
+        if analyze:
+            prefix = connection.ops.explain_query_prefix()
+            with connection.cursor() as cursor:
+                for query in queries:
+                    if query.pop("many") or not query["sql"].lstrip().upper().startswith("SELECT"):
+                        continue
+                    cursor.execute(f"{prefix} {query['sql']}", query["params"])
+                    query["explain"] = [" ".join(str(c) for c in row) for row in cursor.fetchall()]
+        else:
+            for query in queries:
+                query.pop("many")
+
+        prefetches = {self.get_source_from_prefetch(p): p for p in queryset._prefetch_related_lookups}
+        select_related = self._get_select_related_lookups(queryset.query.select_related)
+        return {
+            "relations": {
+                relation: {
+                    "sources": self._get_requested_sources(relation=relation, source_keys=source_keys),
+                    "harvested": sorted(harvested_sources.get(relation, {})),
+                    "max_items": self.get_sideloading_field_option(relation, "max_items"),
+                    "cost": costs[relation],
+                }
+                for relation, source_keys in relations_to_sideload.items()
+            },
+            "dropped": list(self.sideloading_dropped_relations),
+            "prefetches": [self._describe_prefetch(prefetch) for prefetch in queryset._prefetch_related_lookups],
+            "select_related": select_related,
+            "view_prefetches": {
+                "reused": sorted(k for k, v in view_prefetches.items() if prefetches.get(k) is v),
+                "replaced": sorted(k for k, v in view_prefetches.items() if prefetches.get(k) is not v),
+            },
+            "queries": queries,
+        }
+
+    @contextmanager
+    def profile_sideloading(self, request, relations_to_sideload: Dict):
+        """
+        Profiles a sample of the requests with cProfile and records the executed queries.
+        Profiles of requests slower than sideloading_profile_threshold are passed to save_sideloading_profile().
+        """
+        if self.sideloading_profile_threshold is None or random.random() >= self.sideloading_profile_sample_rate:
+            yield
+            return
+
+        queries = []
+
+        def record_query(alias):
+            def wrapper(execute, sql, params, many, context):
+                start = time.perf_counter()
+                try:
+                    return execute(sql, params, many, context)
+                finally:
+                    queries.append({"alias": alias, "sql": sql, "duration": time.perf_counter() - start})
+
+            return wrapper
+
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(record_query(alias)))
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is active
+                yield
+                return
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                duration = time.perf_counter() - start
+                if duration >= self.sideloading_profile_threshold:
+                    profile = {
+                        "view": self.__class__.__name__,
+                        "method": request.method,
+                        "path": request.get_full_path(),
+                        "relations": {k: sorted(v) if v else None for k, v in relations_to_sideload.items()},
+                        "duration": duration,
+                        "queries": queries,
+                    }
+                    self.save_sideloading_profile(request=request, profile=profile, stats=pstats.Stats(profiler))
+
+    def save_sideloading_profile(self, request, profile: Dict, stats: pstats.Stats):
+        """
+        Writes the cProfile stats (.prof) and the request details with the slowest functions (.json)
+        to sideloading_profile_dir. Can be overwritten to send the profiles elsewhere.
+        The profiles contain request paths and queries, a missing directory is created readable by the owner only.
+        """
+        directory = self.sideloading_profile_dir
+        if not directory:
+            raise ValueError(f"'{self.__class__.__name__}' sideloading_profile_dir is not set")
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{self.__class__.__name__}-{uuid.uuid4().hex[:8]}"
+
+        stats.dump_stats(os.path.join(directory, f"{name}.prof"))
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(30)
+        with open(os.path.join(directory, f"{name}.json"), "w") as f:
+            json.dump({**profile, "stats": output.getvalue()}, f, indent=2, default=str)
+
+    def get_sideloading_single_flight_scope(self, request):
+        """
+        Returns a hashable key that determines who can share a sideloading response. Defaults to the user,
+        anonymous requests share the responses with each other.
+
+        Example:
+
+        get_sideloading_single_flight_scope(self, request):
+            return ("tenant", request.tenant.pk)
+        """
+        return ("user", request.user.pk)
+
+    def get_sideloading_single_flight_key(self, request):
+        # the accept header selects the version and the sideloading format
+        return (
+            self.__class__,
+            request.method,
+            request.get_full_path(),
+            request.META.get("HTTP_ACCEPT"),
+            self.get_sideloading_single_flight_scope(request=request),
+        )
+
+    def coalesce_sideloading_response(self, request, get_response) -> Response:
+        """
+        Returns get_response() if sideloading_single_flight is disabled or no identical request is in flight,
+        otherwise waits for the identical request and returns a copy of its response (with a deep copy of the data
+        per request). The requests that time out or whose leader fails compute the response themselves.
+        """
+        if not self.sideloading_single_flight:
+            return get_response()
+
+        key = self.get_sideloading_single_flight_key(request=request)
+        with self._sideloading_flights_lock:
+            flight = self._sideloading_flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._sideloading_flights[key] = SingleFlight()
+
+        if not leader:
+            if flight.done.wait(self.sideloading_single_flight_timeout) and flight.response is not None:
+                return Response(copy.deepcopy(flight.data), status=flight.response.status_code, headers=flight.headers)
+            return get_response()
+
+        try:
+            response = get_response()
+            # data and headers are copied before the response is finalized for the leader
+            flight.data, flight.headers = copy.deepcopy(response.data), dict(response.items())
+            flight.response = response
+            return response
+        finally:
+            with self._sideloading_flights_lock:
+                self._sideloading_flights.pop(key, None)
+            flight.done.set()
+
+    def get_sideloading_snapshot_scope(self, request):
+        """
+        Returns a hashable key that determines who can share a snapshot. Defaults to the user, the snapshots are
+        computed for anonymous requests. Return a constant if the response does not depend on the user.
+
+        Example:
+
+        get_sideloading_snapshot_scope(self, request):
+            return None
+        """
+        return ("user", request.user.pk)
+
+    def get_sideloading_snapshot_key(self, request) -> Optional[str]:
+        """
+        Returns the snapshot cache key of the list request, None if the request is not configured
+        in the SIDELOADING_SNAPSHOTS setting. The key depends on the accepted media type, the version,
+        the sideloading format and the snapshot scope of the request.
+        """
+        if get_snapshot_cache() is None:
+            return None
+        variant = (
+            getattr(request, "accepted_media_type", None),
+            getattr(request, "version", None),
+            self.get_sideloading_format(request=request),
+            self.get_sideloading_snapshot_scope(request=request),
+        )
+        return get_snapshot_key(request.path, request.query_params, variant)
+
+    def get_sideloading_snapshot_models(self, relations_to_sideload: Dict) -> Set:
+        """
+        Returns the models the response is computed from, changes to these make the snapshot stale.
+        """
+        models = {self.primary_model} | get_serializer_models(self.primary_field)
+        for relation, prefetches in self._get_requested_prefetches(relations_to_sideload).items():
+            models |= get_serializer_models(self.sideloadable_fields[relation])
+            for prefetch in prefetches:
+                lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+                models |= {hop[2] for hop in self.get_lookup_hops(lookup)}
+        return models
+
+    def get_sideloading_snapshot_response(self, request, relations_to_sideload: Dict) -> Response:
+        """
+        Returns the stored snapshot of the list request, on a miss the response is computed live.
+        Snapshots are only stored by the requests of refresh_snapshots() (the sideloading_snapshots command).
+        """
+        key = self.get_sideloading_snapshot_key(request=request)
+        if key is None:
+            return self.get_sideloading_list_response(request=request, relations_to_sideload=relations_to_sideload)
+
+        refresh = get_snapshot_refresh(request)
+        if refresh is None or refresh.dirty_only:
+            snapshot = get_snapshot(key)
+            if snapshot is not None:
+                return Response(snapshot["data"], status=snapshot["status"], headers=snapshot["headers"])
+        if refresh is None:
+            return self.get_sideloading_list_response(request=request, relations_to_sideload=relations_to_sideload)
+
+        # versions are read before the response is computed, changes made meanwhile make the snapshot stale
+        versions = get_model_versions(self.get_sideloading_snapshot_models(relations_to_sideload), create=True)
+        response = self.get_sideloading_list_response(request=request, relations_to_sideload=relations_to_sideload)
+        if response.status_code == 200:
+            set_snapshot(key, response, versions)
+            refresh.stored = True
+        return response
+
     # modified DRF methods
 
     def retrieve(self, request, *args, **kwargs):
@@ -301,21 +1832,41 @@ class SideloadableRelationsMixin(object):
                     return self.http_method_not_allowed(request, *args, **kwargs)
                 raise exc
 
-        # return object with sideloading serializer
-        queryset = self.get_sideloadable_object_as_queryset(
+        explain_mode = self.get_sideloading_explain_mode(request=request)
+        if explain_mode:
+            return Response(
+                self.explain_sideloading(
+                    request=request,
+                    relations_to_sideload=relations_to_sideload,
+                    detail=True,
+                    analyze=explain_mode == "explain",
+                )
+            )
+
+        return self.coalesce_sideloading_response(
             request=request,
-            relations_to_sideload=relations_to_sideload,
+            get_response=lambda: self.get_sideloading_retrieve_response(
+                request=request, relations_to_sideload=relations_to_sideload
+            ),
         )
-        sideloadable_page = self.get_sideloadable_page_from_queryset(
-            queryset=queryset,
-            relations_to_sideload=relations_to_sideload,
-        )
-        serializer = self.get_sideloading_serializer(
-            instance=sideloadable_page,
-            relations_to_sideload=relations_to_sideload,
-            context={"request": request},
-        )
-        return Response(serializer.data)
+
+    def get_sideloading_retrieve_response(self, request, relations_to_sideload: Dict) -> Response:
+        with self.profile_sideloading(request=request, relations_to_sideload=relations_to_sideload):
+            # return object with sideloading serializer
+            queryset = self.get_sideloadable_object_as_queryset(
+                request=request,
+                relations_to_sideload=relations_to_sideload,
+            )
+            sideloadable_page = self.get_sideloadable_page_from_queryset(
+                queryset=queryset,
+                relations_to_sideload=relations_to_sideload,
+            )
+            serializer = self.get_sideloading_serializer(
+                instance=sideloadable_page,
+                relations_to_sideload=relations_to_sideload,
+                context={"request": request},
+            )
+            return Response(serializer.data)
 
     def list(self, request, *args, **kwargs):
         if not isinstance(self, ListModelMixin):
@@ -333,39 +1884,56 @@ class SideloadableRelationsMixin(object):
                     return self.http_method_not_allowed(request, *args, **kwargs)
                 raise exc
 
-        # After this `relations_to_sideload` is safe to use
-        queryset = self.get_queryset()
-        queryset = self.add_sideloading_prefetches(
-            queryset=queryset,
+        explain_mode = self.get_sideloading_explain_mode(request=request)
+        if explain_mode:
+            return Response(
+                self.explain_sideloading(
+                    request=request, relations_to_sideload=relations_to_sideload, analyze=explain_mode == "explain"
+                )
+            )
+
+        return self.coalesce_sideloading_response(
             request=request,
-            relations_to_sideload=relations_to_sideload,
+            get_response=lambda: self.get_sideloading_snapshot_response(
+                request=request, relations_to_sideload=relations_to_sideload
+            ),
         )
-        queryset = self.filter_queryset(queryset)
 
-        # Create page
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            sideloadable_page = self.get_sideloadable_page(
-                page=page,
-                relations_to_sideload=relations_to_sideload,
-            )
-            serializer = self.get_sideloading_serializer(
-                instance=sideloadable_page,
-                relations_to_sideload=relations_to_sideload,
-                context={"request": request},
-            )
-            return self.get_paginated_response(serializer.data)
-        else:
-            sideloadable_page = self.get_sideloadable_page_from_queryset(
+    def get_sideloading_list_response(self, request, relations_to_sideload: Dict) -> Response:
+        with self.profile_sideloading(request=request, relations_to_sideload=relations_to_sideload):
+            # After this `relations_to_sideload` is safe to use
+            queryset = self.get_queryset()
+            queryset = self.add_sideloading_prefetches(
                 queryset=queryset,
+                request=request,
                 relations_to_sideload=relations_to_sideload,
             )
-            serializer = self.get_sideloading_serializer(
-                instance=sideloadable_page,
-                relations_to_sideload=relations_to_sideload,
-                context={"request": request},
-            )
-            return Response(serializer.data)
+            queryset = self.filter_queryset(queryset)
+
+            # Create page
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                sideloadable_page = self.get_sideloadable_page(
+                    page=page,
+                    relations_to_sideload=relations_to_sideload,
+                )
+                serializer = self.get_sideloading_serializer(
+                    instance=sideloadable_page,
+                    relations_to_sideload=relations_to_sideload,
+                    context={"request": request},
+                )
+                return self.get_paginated_response(serializer.data)
+            else:
+                sideloadable_page = self.get_sideloadable_page_from_queryset(
+                    queryset=queryset,
+                    relations_to_sideload=relations_to_sideload,
+                )
+                serializer = self.get_sideloading_serializer(
+                    instance=sideloadable_page,
+                    relations_to_sideload=relations_to_sideload,
+                    context={"request": request},
+                )
+                return Response(serializer.data)
 
     def get_sideloadable_page_from_queryset(self, queryset, relations_to_sideload: Dict):
         """
@@ -376,29 +1944,54 @@ class SideloadableRelationsMixin(object):
             raise ValueError("relations_to_sideload is required")
         # this works wonders, but can't be used when page is paginated...
         sideloadable_page = {self.primary_field_name: queryset}
+        self._add_dropped_relations_meta(sideloadable_page=sideloadable_page)
+        if self.sideloading_merged_prefetches:
+            # evaluates the queryset, the serializer uses the partitioned objects from the result cache
+            self.apply_merged_prefetches(queryset)
+        harvested_sources = self.get_sideloading_harvested_sources(relations_to_sideload=relations_to_sideload)
 
         for relation, source_keys in relations_to_sideload.items():
             field = self.sideloadable_fields[relation]
             field_source = field.child.source
-            source_model = field.child.Meta.model
             relation_key = field_source or relation
+            relation_harvested_sources = harvested_sources.get(relation, {})
 
             related_ids = set()
+            related_filters = []
+            related_prefetches = []
             sideloadable_field_source = self.sideloadable_field_sources.get(relation)
             if isinstance(sideloadable_field_source, dict):
                 for src_key, src in sideloadable_field_source.items():
                     if src_key in source_keys or source_keys is None or src_key == "__all__":
-                        related_ids |= set(queryset.values_list(src, flat=True))
+                        if src in relation_harvested_sources:
+                            descriptor, source_prefetches = relation_harvested_sources[src]
+                            source_ids, source_filters = self.harvest_related(relation, src, descriptor, queryset)
+                            related_ids |= source_ids
+                            related_filters += source_filters
+                            related_prefetches += source_prefetches
+                        else:
+                            related_ids |= set(queryset.values_list(src, flat=True))
+            elif (field_source or sideloadable_field_source) in relation_harvested_sources:
+                harvested_source = field_source or sideloadable_field_source
+                descriptor, related_prefetches = relation_harvested_sources[harvested_source]
+                related_ids, related_filters = self.harvest_related(relation, harvested_source, descriptor, queryset)
             else:
                 prefetch_key = field_source or self.sideloadable_field_sources[relation]
                 prefetch_object = next(
                     (x for x in queryset._prefetch_related_lookups if getattr(x, "prefetch_to", None) == prefetch_key),
                     None,
                 )
-                if prefetch_key in queryset._prefetch_related_lookups:
+                if prefetch_key in self.sideloading_merged_prefetches:
+                    related_objects = self.filter_related_objects(
+                        related_objects=queryset, lookup=self._get_merged_source(prefetch_key)
+                    )
+                    related_ids |= {obj.pk for obj in related_objects}
+                elif prefetch_key in queryset._prefetch_related_lookups or is_select_related(queryset, prefetch_key):
                     related_ids |= set(queryset.values_list(prefetch_key, flat=True))
                 elif prefetch_object:
-                    if prefetch_object.queryset:
+                    if prefetch_object.queryset is not None and (
+                        prefetch_object.to_attr or prefetch_object.queryset.query.where
+                    ):
                         # performance thing?
                         # related_ids |= set(
                         #     prefetch_object.queryset.filter(
@@ -428,19 +2021,171 @@ class SideloadableRelationsMixin(object):
                 else:
                     raise ValueError(f"No prefetch for {prefetch_key} found!")
 
-            sideloadable_page[relation_key] = source_model.objects.filter(id__in=related_ids)
+            sideloadable_page[relation_key] = self.limit_sideloaded_objects(
+                relation=relation,
+                objects=self.filter_sideloaded_objects(
+                    relation=relation,
+                    objects=self.get_sideloading_relation_objects(
+                        relation=relation,
+                        related_ids=related_ids,
+                        prefetches=related_prefetches,
+                        related_filters=related_filters,
+                    ),
+                ),
+                sideloadable_page=sideloadable_page,
+            )
+            sideloadable_page[relation_key] = self.paginate_sideloaded_objects(
+                relation=relation,
+                source_keys=source_keys,
+                objects=sideloadable_page[relation_key],
+                sideloadable_page=sideloadable_page,
+            )
+            sideloadable_page[relation_key] = self.add_sideloading_fragments(
+                relation=relation, objects=sideloadable_page[relation_key]
+            )
+            sideloadable_page[relation_key] = self.add_sideloading_reference_rows(
+                relation=relation, objects=sideloadable_page[relation_key]
+            )
 
         return sideloadable_page
 
+    def get_sideloading_relation_objects(
+        self, relation: str, related_ids: Set, prefetches: List = None, related_filters: List[Q] = None
+    ):
+        """
+        Returns the sideloaded relation objects, reference data relations are answered from the in memory table.
+        """
+        if related_filters or not self.uses_sideloading_reference_table(relation):
+            return self.get_sideloadable_relation_queryset(
+                relation=relation, related_ids=related_ids, prefetches=prefetches, related_filters=related_filters
+            )
+        table = self.get_sideloading_reference_table(relation=relation, prefetches=prefetches)
+        return [table.objects[pk] for pk in sorted(pk for pk in related_ids if pk in table.objects)]
+
+    def uses_sideloading_reference_table(self, relation: str) -> bool:
+        """
+        Returns True if the relation is answered from the in memory reference table. Relations filtered with
+        add_sideloading_prefetch_filter() are loaded per request, the table is shared by every request.
+        """
+        if not self.get_sideloading_field_option(relation, "reference"):
+            return False
+        request = getattr(self, "request", None)
+        if request is None:
+            return True
+        model = self.sideloadable_fields[relation].child.Meta.model
+        sources = self.sideloadable_field_sources[relation]
+        for source in sources.values() if isinstance(sources, dict) else [sources]:
+            _filtered_queryset, added, fingerprint = self._get_sideloading_filter(
+                source=source, model=model, request=request
+            )
+            if added and fingerprint:
+                return False
+        return True
+
+    def get_sideloading_reference_scope(self, request):
+        """
+        Returns a hashable key that determines who can share a reference table. None (default) shares the tables
+        with every request, the rows are serialized without the request and the view in the context.
+        Return a key if the serializers of the reference relations depend on the request.
+
+        Example:
+
+        get_sideloading_reference_scope(self, request):
+            return ("language", request.LANGUAGE_CODE)
+        """
+        return None
+
+    def get_sideloading_reference_context(self, scope) -> Dict:
+        """
+        Returns the serializer context of the reference table rows, the shared tables get no request and view.
+        """
+        context = self.get_sideloading_serializer_context()
+        context.setdefault("sideloading_format", self.get_sideloading_format(request=self.request))
+        if scope is None:
+            context.pop("request", None)
+            context.pop("view", None)
+        return context
+
+    def get_sideloading_reference_table(self, relation: str, prefetches: List = None) -> ReferenceTable:
+        """
+        Returns the in memory table of the reference data relation. The whole table is loaded and serialized
+        once per worker and reference scope and again after the TTL ("reference" field option or
+        sideloading_reference_ttl) or changes to the serialized models.
+        """
+        field = self.sideloadable_fields[relation]
+        scope = self.get_sideloading_reference_scope(request=self.request)
+        key = (self.__class__, field.child.__class__, relation, scope)
+        table = get_reference_table(key)
+        if table is None:
+            queryset = field.child.Meta.model._default_manager.using(self.sideloading_db_aliases.get(relation))
+            if prefetches:
+                queryset = queryset.prefetch_related(*prefetches)
+            objects = {obj.pk: obj for obj in queryset.order_by("pk")}
+            reference = self.get_sideloading_field_option(relation, "reference")
+            # the child of the bound sideloading serializer has the serializer context
+            serializer = self.get_sideloading_serializer_class()(
+                relations_to_sideload={relation: None}, context=self.get_sideloading_reference_context(scope=scope)
+            )
+            child = serializer.fields[relation].child
+            table = ReferenceTable(
+                objects=objects,
+                rows={pk: SerializedObject(child.to_representation(obj)) for pk, obj in objects.items()},
+                models=get_serializer_models(field),
+                ttl=self.sideloading_reference_ttl if reference is True else reference,
+            )
+            set_reference_table(key, table)
+        return table
+
+    def add_sideloading_reference_rows(self, relation: str, objects):
+        """
+        Replaces the objects of the reference data relation with their serialized representations.
+        """
+        if not self.uses_sideloading_reference_table(relation) or isinstance(objects, (QuerySet, bytes)):
+            return objects
+        table = self.get_sideloading_reference_table(relation=relation)
+        return [table.rows.get(obj.pk, obj) if isinstance(obj, models.Model) else obj for obj in objects]
+
+    def get_sideloadable_relation_queryset(
+        self, relation: str, related_ids: Set, prefetches: List = None, related_filters: List[Q] = None
+    ):
+        """
+        Returns the queryset of the sideloaded relation objects, the objects matching any of the related_filters
+        (joined queries of collapsed sources) are included.
+        """
+        model = self.sideloadable_fields[relation].child.Meta.model
+        # the joined queries replace prefetches, these read the related objects with the base manager
+        manager = model._base_manager if related_filters else model.objects
+        queryset = manager.using(self.sideloading_db_aliases.get(relation))
+        if related_filters:
+            conditions = ([Q(pk__in=related_ids)] if related_ids else []) + related_filters
+            queryset = queryset.filter(reduce(or_, conditions)).distinct()
+        else:
+            queryset = queryset.filter(pk__in=related_ids)
+        columns = self.get_sideloading_relation_columns(relation)
+        if columns:
+            for prefetch in prefetches or []:
+                lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+                descriptor = getattr(model, lookup.split("__")[0], None)
+                if isinstance(descriptor, ForwardManyToOneDescriptor):
+                    columns.add(descriptor.field.name)
+            queryset = queryset.only(*sorted(columns))
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
     def get_sideloadable_page(self, page, relations_to_sideload: Dict):
         """
         Populates page with sideloaded data by collecting distinct values form sideloaded data
         """
         sideloadable_page = {self.primary_field_name: page}
+        self._add_dropped_relations_meta(sideloadable_page=sideloadable_page)
+        self.apply_merged_prefetches(page)
+        harvested_sources = self.get_sideloading_harvested_sources(relations_to_sideload=relations_to_sideload)
         for relation, source_keys in relations_to_sideload.items():
             field = self.sideloadable_fields[relation]
             field_source = field.child.source
             relation_key = field_source or relation
+            relation_harvested_sources = harvested_sources.get(relation, {})
 
             if not isinstance(field, ListSerializer):
                 raise RuntimeError("SideLoadable field '{}' must be set as many=True".format(relation))
@@ -448,17 +2193,52 @@ class SideloadableRelationsMixin(object):
             if relation not in sideloadable_page:
                 sideloadable_page[relation_key] = set()
 
-            if isinstance(self.sideloadable_field_sources.get(relation), dict):
-                # Multi source relation
-                for src_key, source_prefetch in self.sideloadable_field_sources[relation].items():
-                    if not source_keys or src_key in source_keys:
-                        sideloadable_page[relation_key] |= self.filter_related_objects(
-                            related_objects=page, lookup=source_prefetch
-                        )
-            else:
-                sideloadable_page[relation_key] |= self.filter_related_objects(
-                    related_objects=page, lookup=field_source or self.sideloadable_field_sources[relation]
+            related_ids = set()
+            related_filters = []
+            related_prefetches = []
+            for source in self._get_requested_sources(relation=relation, source_keys=source_keys):
+                if source in relation_harvested_sources:
+                    descriptor, source_prefetches = relation_harvested_sources[source]
+                    source_ids, source_filters = self.harvest_related(relation, source, descriptor, page)
+                    related_ids |= source_ids
+                    related_filters += source_filters
+                    related_prefetches += source_prefetches
+                else:
+                    sideloadable_page[relation_key] |= self.filter_related_objects(
+                        related_objects=page, lookup=self._get_merged_source(source)
+                    )
+
+            if relation_harvested_sources:
+                # related objects are fetched once, not attached to the primary objects
+                related_queryset = self.get_sideloading_relation_objects(
+                    relation=relation,
+                    related_ids=related_ids,
+                    prefetches=related_prefetches,
+                    related_filters=related_filters,
                 )
+                if sideloadable_page[relation_key]:
+                    sideloadable_page[relation_key] |= set(related_queryset)
+                else:
+                    sideloadable_page[relation_key] = related_queryset
+
+            sideloadable_page[relation_key] = self.filter_sideloaded_objects(
+                relation=relation, objects=sideloadable_page[relation_key]
+            )
+            sideloadable_page[relation_key] = self.limit_sideloaded_objects(
+                relation=relation, objects=sideloadable_page[relation_key], sideloadable_page=sideloadable_page
+            )
+            sideloadable_page[relation_key] = self.paginate_sideloaded_objects(
+                relation=relation,
+                source_keys=source_keys,
+                objects=sideloadable_page[relation_key],
+                sideloadable_page=sideloadable_page,
+            )
+            sideloadable_page[relation_key] = self.add_sideloading_fragments(
+                relation=relation, objects=sideloadable_page[relation_key]
+            )
+            sideloadable_page[relation_key] = self.add_sideloading_reference_rows(
+                relation=relation, objects=sideloadable_page[relation_key]
+            )
 
         return sideloadable_page
 
@@ -525,6 +2305,44 @@ class SideloadableRelationsMixin(object):
 
     # internal_methods:
 
+    def _add_sideloading_meta(self, sideloadable_page: Dict, key: str, relation: str, value):
+        # metadata is returned per relation in the serializer meta_key
+        sideloadable_page.setdefault(self.sideloading_meta_key, {}).setdefault(key, {})[relation] = value
+
+    def _add_dropped_relations_meta(self, sideloadable_page: Dict):
+        for relation in self.sideloading_dropped_relations:
+            self._add_sideloading_meta(
+                sideloadable_page=sideloadable_page, key="dropped", relation=relation, value=True
+            )
+
+    def _describe_prefetch(self, prefetch: Union[str, Prefetch]) -> Dict:
+        if isinstance(prefetch, str):
+            return {"lookup": prefetch}
+        description = {"lookup": prefetch.prefetch_through, "to_attr": prefetch.to_attr}
+        if isinstance(prefetch, MergedPrefetch):
+            description["merged_to"] = [to_attr or prefetch.prefetch_through for to_attr, _ in prefetch.consumers]
+        if prefetch.queryset is not None:
+            fields, defer = prefetch.queryset.query.deferred_loading
+            description["filtered"] = bool(prefetch.queryset.query.where)
+            description["only"] = None if defer else sorted(fields)
+        return description
+
+    def _get_select_related_lookups(self, select_related, prefix: str = "") -> Union[bool, List[str]]:
+        if not isinstance(select_related, dict):
+            return select_related
+        lookups = []
+        for name, nested in sorted(select_related.items()):
+            lookups.append(f"{prefix}{name}")
+            lookups += self._get_select_related_lookups(nested, prefix=f"{prefix}{name}__")
+        return lookups
+
+    def _get_requested_sources(self, relation: str, source_keys) -> List[str]:
+        # sources the sideloaded relation objects are collected from
+        field_sources = self.sideloadable_field_sources[relation]
+        if isinstance(field_sources, dict):
+            return [src for src_key, src in field_sources.items() if not source_keys or src_key in source_keys]
+        return [self.sideloadable_fields[relation].child.source or field_sources]
+
     def _clean_prefetches(self, field, relation, value, ensure_list=False):
         if not value:
             raise ValueError(f"Sideloadable field '{relation}' prefetch or source must be set!")
@@ -630,34 +2448,81 @@ class SideloadableRelationsMixin(object):
 
         return queryset, False
 
+    def get_sideloading_filter_scope(self, request):
+        """
+        Returns a hashable key (tenant, role...) that determines the result of add_sideloading_prefetch_filter()
+        for the request. The filtered querysets are cached per source and scope across requests.
+        None (default) disables the caching.
+
+        Example:
+
+        get_sideloading_filter_scope(self, request):
+            return ("staff", request.user.is_staff)
+        """
+        return None
+
+    @classmethod
+    def get_sideloading_filter_cache(cls) -> Dict:
+        """
+        Returns the filtered prefetch queryset cache of the view class, subclasses don't share the cache.
+        """
+        with cls._sideloading_filter_cache_lock:
+            if "_sideloading_filter_cache" not in cls.__dict__:
+                cls._sideloading_filter_cache = {}
+            return cls._sideloading_filter_cache
+
+    def _get_sideloading_filter(self, source: str, model, request):
+        # returns the filtered model queryset, if the filter was added and the fingerprint of the filters
+        scope = self.get_sideloading_filter_scope(request=request)
+        filter_cache = self.get_sideloading_filter_cache() if scope is not None else None
+        cache_key = (source, model, scope)
+        if filter_cache is not None:
+            result = filter_cache.get(cache_key)
+            if result is not None:
+                return result
+
+        filtered_queryset, added = self.add_sideloading_prefetch_filter(
+            source=source, queryset=model.objects.all(), request=request
+        )
+        fingerprint = where_node_fingerprint(filtered_queryset.query.where) if added else frozenset()
+        result = filtered_queryset, added, fingerprint
+
+        if filter_cache is not None:
+            with self._sideloading_filter_cache_lock:
+                while filter_cache and len(filter_cache) >= self.sideloading_filter_cache_size:
+                    # drop the oldest entry
+                    filter_cache.pop(next(iter(filter_cache)))
+                filter_cache[cache_key] = result
+        return result
+
     def _add_sideloading_filter(self, prefetch: Union[str, Prefetch], request) -> Union[str, Prefetch]:
         # fetch sideloadable source and queryset
         prefetch_source = self.get_source_from_prefetch(prefetches=prefetch)
         prefetch_queryset = self.get_sideloadable_queryset(prefetch)
-        filtered_queryset, added = self.add_sideloading_prefetch_filter(
-            source=prefetch_source, queryset=prefetch_queryset, request=request
+        filtered_queryset, added, fingerprint = self._get_sideloading_filter(
+            source=prefetch_source, model=prefetch_queryset.model, request=request
         )
-        if added:
-            filter_node = self.add_sideloading_prefetch_filter(
-                source=prefetch_source, queryset=prefetch_queryset.model.objects.all(), request=request
-            )[0].query.where
-            if filter_node:  # check if any filtering is actually applied
-                if isinstance(prefetch, str):
-                    # Replace string prefetch with a filtered one
-                    prefetch = Prefetch(lookup=prefetch, queryset=filtered_queryset)
-                elif isinstance(prefetch, Prefetch):
-                    # add filters if not already applied
-                    if not contains_where_node(existing_node=prefetch_queryset.query.where, new_node=filter_node):
-                        prefetch.queryset = filtered_queryset
-                else:
-                    raise NotImplementedError(
-                        f"Adding filters to prefetch type {type(prefetch)} has not been implemented"
-                    )
+        if added and fingerprint:  # check if any filtering is actually applied
+            if isinstance(prefetch, str):
+                # Replace string prefetch with a filtered one
+                prefetch = Prefetch(lookup=prefetch, queryset=filtered_queryset.all())
+            elif isinstance(prefetch, Prefetch):
+                # add filters if not already applied
+                if not fingerprint <= where_node_fingerprint(prefetch_queryset.query.where):
+                    # the user defined Prefetch is shared between requests and must not be modified,
+                    # the filters of the (cached) filtered queryset are combined with its queryset
+                    prefetch = copy.copy(prefetch)
+                    prefetch.queryset = prefetch_queryset & filtered_queryset
+            else:
+                raise NotImplementedError(f"Adding filters to prefetch type {type(prefetch)} has not been implemented")
 
         return prefetch
 
-    def _add_prefetch(self, prefetches: Dict, prefetch: Union[str, Prefetch], request) -> str:
+    def _add_prefetch(
+        self, prefetches: Dict, prefetch: Union[str, Prefetch], request, merge_keys: Set[str] = None
+    ) -> str:
         # add prefetch to prefetches dict and return the prefetch_attr
+        # conflicting prefetches with keys in merge_keys are merged into a single query if possible
         if not isinstance(prefetch, (str, Prefetch)):
             raise ValueError(f"Adding prefetch of type '{type(prefetch)}' has not been implemented")
         if isinstance(prefetch, str) and len(prefetch) == 1:
@@ -667,6 +2532,17 @@ class SideloadableRelationsMixin(object):
 
         prefetch_attr = self.get_source_from_prefetch(prefetch)
         existing_prefetch = prefetches.get(prefetch_attr)
+        if isinstance(existing_prefetch, MergedPrefetch):
+            # the prefetch has to match the sideloading part of the merged prefetch
+            existing_prefetch = existing_prefetch.sideloading_prefetch
+        elif existing_prefetch and prefetch_attr in (merge_keys or ()):
+            existing_fingerprint = self._get_prefetch_fingerprint(existing_prefetch)
+            if existing_fingerprint != self._get_prefetch_fingerprint(prefetch):
+                merged_prefetch = self.get_merged_prefetch(existing_prefetch=existing_prefetch, prefetch=prefetch)
+                if merged_prefetch is not None:
+                    prefetches[prefetch_attr] = merged_prefetch
+                    return prefetch_attr
+
         if not existing_prefetch:
             prefetches[prefetch_attr] = prefetch
         elif isinstance(existing_prefetch, str):
@@ -710,15 +2586,20 @@ class SideloadableRelationsMixin(object):
 
         return prefetch_attr
 
-    def _get_relevant_prefetches(self, relations_to_sideload: Dict, request, gathered_prefetches: Dict = None) -> Dict:
-        """
-        Collects all relevant prefetches and returns
-        compressed prefetches and sources per relation to be used later.
-        """
+    def _get_prefetch_fingerprint(self, prefetch: Union[str, Prefetch]) -> frozenset:
+        if isinstance(prefetch, Prefetch) and prefetch.queryset is not None:
+            return where_node_fingerprint(prefetch.queryset.query.where)
+        return frozenset()
 
-        if gathered_prefetches is None:
-            gathered_prefetches = {}
+    def _get_merged_source(self, source: str) -> str:
+        # sideloading reads merged prefetches from their own attribute
+        merged_prefetch = self.sideloading_merged_prefetches.get(source)
+        return merged_prefetch.consumers[-1][0] if merged_prefetch else source
 
+    def _get_requested_prefetches(self, relations_to_sideload: Dict) -> Dict[str, List]:
+        """
+        Returns the cleaned prefetches of every requested relation (and its requested sources) as a flat list.
+        """
         # cleaned prefetches
         cleaned_prefetches = self._gather_all_prefetches()
 
@@ -727,18 +2608,42 @@ class SideloadableRelationsMixin(object):
         if not cleaned_prefetches:
             raise ValueError("'cleaned_prefetches' is a required argument")
 
+        requested_prefetches = {}
         for relation, requested_sources in relations_to_sideload.items():
             relation_prefetches = cleaned_prefetches.get(relation)
             if requested_sources:
-                for source in requested_sources:
-                    for source_prefetch in relation_prefetches[source]:
-                        self._add_prefetch(prefetches=gathered_prefetches, prefetch=source_prefetch, request=request)
+                requested_prefetches[relation] = list(
+                    chain(*[relation_prefetches[source] for source in requested_sources])
+                )
             elif isinstance(relation_prefetches, dict):
-                for source_prefetches in relation_prefetches.values():
-                    for source_prefetch in source_prefetches:
-                        self._add_prefetch(prefetches=gathered_prefetches, prefetch=source_prefetch, request=request)
+                requested_prefetches[relation] = list(chain(*relation_prefetches.values()))
             else:
-                for relation_prefetch in relation_prefetches:
-                    self._add_prefetch(prefetches=gathered_prefetches, prefetch=relation_prefetch, request=request)
+                requested_prefetches[relation] = list(relation_prefetches)
+
+        return requested_prefetches
+
+    def _get_relevant_prefetches(
+        self,
+        relations_to_sideload: Dict,
+        request,
+        gathered_prefetches: Dict = None,
+        requested_prefetches: Dict = None,
+        merge_keys: Set[str] = None,
+    ) -> Dict:
+        """
+        Collects all relevant prefetches and returns
+        compressed prefetches and sources per relation to be used later.
+        """
+
+        if gathered_prefetches is None:
+            gathered_prefetches = {}
+        if requested_prefetches is None:
+            requested_prefetches = self._get_requested_prefetches(relations_to_sideload=relations_to_sideload)
+
+        for relation_prefetches in requested_prefetches.values():
+            for relation_prefetch in relation_prefetches:
+                self._add_prefetch(
+                    prefetches=gathered_prefetches, prefetch=relation_prefetch, request=request, merge_keys=merge_keys
+                )
 
         return gathered_prefetches
@@ -0,0 +1,44 @@
+import importlib.util
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+if importlib.util.find_spec("msgpack") is not None:
+    import msgpack
+else:
+    msgpack = None
+
+if importlib.util.find_spec("cbor2") is not None:
+    import cbor2
+else:
+    cbor2 = None
+
+
+class SideloadingMessagePackParser(BaseParser):
+    """
+    Parses MessagePack request data, requires msgpack to be installed.
+    """
+
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        assert msgpack is not None, "SideloadingMessagePackParser requires msgpack to be installed"
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except Exception as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
+
+
+class SideloadingCBORParser(BaseParser):
+    """
+    Parses CBOR request data, requires cbor2 to be installed.
+    """
+
+    media_type = "application/cbor"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        assert cbor2 is not None, "SideloadingCBORParser requires cbor2 to be installed"
+        try:
+            return cbor2.loads(stream.read())
+        except Exception as exc:
+            raise ParseError(f"CBOR parse error - {exc}")
@@ -0,0 +1,77 @@
+import time
+from typing import Dict, Optional, Set
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+# in memory reference tables of the worker by (view class, relation)
+_reference_tables: Dict = {}
+
+
+class ReferenceTable:
+    """
+    All objects of a reference data relation loaded into memory with their serialized representations.
+
+    models - the models the serialized representations are read from, changes to these drop the table
+    """
+
+    def __init__(self, objects: Dict, rows: Dict, models: Set, ttl: Optional[float] = None):
+        self.objects = objects
+        self.rows = rows
+        self.models = models
+        self.expires = None if ttl is None else time.monotonic() + ttl
+
+    @property
+    def expired(self) -> bool:
+        return self.expires is not None and time.monotonic() >= self.expires
+
+
+def get_reference_table(key) -> Optional[ReferenceTable]:
+    """
+    Returns the loaded reference table, None if it is missing or expired.
+    """
+    table = _reference_tables.get(key)
+    if table is None or table.expired:
+        return None
+    return table
+
+
+def set_reference_table(key, table: ReferenceTable) -> None:
+    connect_reference_receivers(table.models)
+    _reference_tables[key] = table
+
+
+def invalidate_reference_tables(models) -> None:
+    """
+    Drops the reference tables read from any of the models, these are loaded again on the next request.
+    Only the tables of the current process are dropped, the other workers rely on the TTL.
+    """
+    for key, table in list(_reference_tables.items()):
+        if table.models & set(models):
+            _reference_tables.pop(key, None)
+
+
+def model_changed_receiver(sender, **kwargs) -> None:
+    if _reference_tables:
+        invalidate_reference_tables([sender])
+
+
+def m2m_changed_receiver(sender, instance, action, model, **kwargs) -> None:
+    if _reference_tables and action in ("post_add", "post_remove", "post_clear"):
+        invalidate_reference_tables([sender, instance.__class__, model])
+
+
+def connect_reference_receivers(models) -> None:
+    """
+    Connects the receivers dropping the tables to the serialized models and their many to many through models.
+    The tables only live in the current process, so the receivers are connected when a table is loaded.
+    """
+    for model in models:
+        post_save.connect(model_changed_receiver, sender=model, dispatch_uid="drf_sideloading_reference_post_save")
+        post_delete.connect(model_changed_receiver, sender=model, dispatch_uid="drf_sideloading_reference_post_delete")
+        for field in model._meta.get_fields():
+            if field.many_to_many:
+                m2m_changed.connect(
+                    m2m_changed_receiver,
+                    sender=field.through if hasattr(field, "through") else field.remote_field.through,
+                    dispatch_uid="drf_sideloading_reference_m2m_changed",
+                )
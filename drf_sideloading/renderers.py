@@ -0,0 +1,129 @@
+import copy
+import importlib.util
+import re
+import uuid
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from drf_sideloading.serializers import JSONFragment
+
+if importlib.util.find_spec("orjson") is not None:
+    import orjson
+else:
+    orjson = None
+
+if importlib.util.find_spec("msgpack") is not None:
+    import msgpack
+else:
+    msgpack = None
+
+if importlib.util.find_spec("cbor2") is not None:
+    import cbor2
+else:
+    cbor2 = None
+
+
+class SideloadingJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer for large sideloading responses.
+
+    The data is encoded with orjson if it is installed. Types orjson can't encode (Decimal, lazy translations,
+    dates...) are passed to the DRF JSONEncoder and U+2028 and U+2029 are escaped like in the JSONRenderer.
+    The output matches the JSONRenderer output, except that orjson encodes NaN and Infinity as null instead of
+    raising an error (STRICT_JSON).
+    Falls back to the JSONRenderer if orjson is not installed or the output has to be indented, ASCII or
+    non compact.
+
+    JSONFragment values are written to the output verbatim.
+    """
+
+    supports_json_fragments = True
+
+    def use_orjson(self, accepted_media_type=None, renderer_context=None) -> bool:
+        if orjson is None:
+            return False
+        if self.ensure_ascii or not self.compact:
+            return False
+        return self.get_indent(accepted_media_type or "", renderer_context or {}) is None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        # fragments are encoded as placeholder strings and replaced in the output
+        fragments = []
+        placeholder = f"__json_fragment_{uuid.uuid4().hex}_"
+        encoder = self.encoder_class()
+
+        def default(obj):
+            if isinstance(obj, JSONFragment):
+                fragments.append(obj)
+                return f"{placeholder}{len(fragments) - 1}"
+            return encoder.default(obj)
+
+        if self.use_orjson(accepted_media_type=accepted_media_type, renderer_context=renderer_context):
+            ret = orjson.dumps(data, default=default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+            # the line separators are valid JSON but not valid javascript, the JSONRenderer escapes them
+            ret = ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+        else:
+            renderer = copy.copy(self)
+            renderer.encoder_class = type(
+                "FragmentJSONEncoder", (self.encoder_class,), {"default": lambda encoder, obj: default(obj)}
+            )
+            ret = super(SideloadingJSONRenderer, renderer).render(
+                data, accepted_media_type=accepted_media_type, renderer_context=renderer_context
+            )
+
+        if fragments:
+            pattern = re.compile(b'"' + placeholder.encode() + rb'(\d+)"')
+            ret = pattern.sub(lambda match: fragments[int(match.group(1))], ret)
+        return ret
+
+
+class SideloadingMessagePackRenderer(BaseRenderer):
+    """
+    Renders the response as MessagePack, requires msgpack to be installed.
+    Primary keys and other numbers are encoded as native integers and floats.
+    Types msgpack can't encode (Decimal, dates, lazy translations...) are converted with the DRF JSONEncoder.
+    MessagePack has no standard string references, so repeated strings (field names, values) are encoded in full.
+    Use the CBOR renderer to share them.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    encoder_class = JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        assert msgpack is not None, "SideloadingMessagePackRenderer requires msgpack to be installed"
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=self.encoder_class().default, use_bin_type=True, datetime=False)
+
+
+class SideloadingCBORRenderer(BaseRenderer):
+    """
+    Renders the response as CBOR, requires cbor2 to be installed.
+    Repeated strings (field names, values) are encoded once and referenced afterwards (stringref extension).
+    Types cbor2 can't encode (lazy translations...) are converted with the DRF JSONEncoder.
+    """
+
+    media_type = "application/cbor"
+    format = "cbor"
+    charset = None
+    render_style = "binary"
+    encoder_class = JSONEncoder
+    string_referencing = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        assert cbor2 is not None, "SideloadingCBORRenderer requires cbor2 to be installed"
+        if data is None:
+            return b""
+        json_encoder = self.encoder_class()
+
+        def default(encoder, value):
+            encoder.encode(json_encoder.default(value))
+
+        return cbor2.dumps(data, default=default, string_referencing=self.string_referencing)
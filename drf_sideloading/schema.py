@@ -1,6 +1,7 @@
 from typing import Dict, Union
 from django.utils.translation import gettext_lazy as _
 
+from drf_spectacular.plumbing import ResolvedComponent, build_array_type, build_basic_type, build_object_type
 from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiExample,
@@ -8,51 +9,161 @@ from drf_spectacular.utils import (
 )
 from drf_spectacular.openapi import AutoSchema
 
+# compiled sideloading plans by (view class, sideloading serializer class), clear after changing the views at runtime
+_sideloading_plans: Dict = {}
+
 
 class SideloadingAutoSchema(AutoSchema):
     override_parameters = []
+    # the view actions that sideload, other actions of the view are documented without sideloading
+    sideloading_actions = ("list", "retrieve")
 
-    def get_override_parameters(self):
-        if self.method == "GET":
-            # return self.override_parameters
-            self.view.initialize_serializer(request=getattr(self.view, "request", None))
-            sideloading_keys_sources: Dict[str, Union[str, Dict[str, str]]] = self.view.get_sideloading_field_sources()
-            sideloading_keys = list(k for k, v in sideloading_keys_sources.items() if isinstance(v, str))
-            multi_source_sideloading_items = {
-                k: list(v.keys()) for k, v in sideloading_keys_sources.items() if isinstance(v, dict)
+    def is_sideloading_operation(self) -> bool:
+        return all(
+            [
+                self.method == "GET",
+                getattr(self.view, "sideloading_serializer_class", None) is not None,
+                getattr(self.view, "action", None) in self.sideloading_actions,
+            ]
+        )
+
+    def get_sideloading_plan(self) -> Dict:
+        """
+        Returns the sideloading parameter and the sideloadable fields of the view. The plan is compiled once
+        per view and sideloading serializer class and reused for every operation.
+        """
+        request = getattr(self.view, "request", None)
+        sideloading_serializer_class = self.view.get_sideloading_serializer_class(request=request)
+        key = (self.view.__class__, sideloading_serializer_class)
+        if key not in _sideloading_plans:
+            self.view.initialize_serializer(request=request)
+            _sideloading_plans[key] = {
+                "name": sideloading_serializer_class.__name__.replace("Serializer", ""),
+                "primary": (self.view.primary_field_name, self.view.primary_field),
+                "fields": dict(self.view.sideloadable_fields),
+                "meta_key": sideloading_serializer_class.meta_key,
+                "parameters": self.get_sideloading_parameters(),
             }
-            examples = []
-            if sideloading_keys:
-                examples.append(
-                    OpenApiExample(
-                        name=_("Regular sideloading"),
-                        value=",".join(sideloading_keys[:2]),
-                        request_only=True,
-                    )
-                )
-            for k, v in multi_source_sideloading_items.items():
-                examples.append(
-                    OpenApiExample(
-                        name=_(f"Multi source sideloading for {k}"),
-                        value=f"{k}[{','.join(v)}]",
-                        request_only=True,
-                    )
+        return _sideloading_plans[key]
+
+    def get_sideloading_parameters(self):
+        sideloading_keys_sources: Dict[str, Union[str, Dict[str, str]]] = self.view.get_sideloading_field_sources()
+        sideloading_keys = list(k for k, v in sideloading_keys_sources.items() if isinstance(v, str))
+        multi_source_sideloading_items = {
+            k: list(v.keys()) for k, v in sideloading_keys_sources.items() if isinstance(v, dict)
+        }
+        costs = self.view.get_sideloading_costs(relations_to_sideload={k: None for k in sideloading_keys_sources})
+        examples = []
+        if sideloading_keys:
+            examples.append(
+                OpenApiExample(
+                    name=_("Regular sideloading"),
+                    value=",".join(sideloading_keys[:2]),
+                    request_only=True,
                 )
-            return [
-                OpenApiParameter(
-                    name="sideload",
-                    type=OpenApiTypes.STR,
-                    location=OpenApiParameter.QUERY,
-                    many=True,
-                    description=_(
-                        "This option allows you to fetch related obejcts for all of the relations with a signle query. "
-                        "Multi-source sideloadable fields can be filtered by the sources by declaring the required "
-                        "sources in square brackets after the sideloading key. All available Mutli-source fields will "
-                        "have an example provided with all available sources. The comma separated sources can be "
-                        "ommited with the square brackets if all sources are to be sideloaded."
-                    ),
-                    enum=sideloading_keys_sources.keys(),
-                    examples=examples,
+            )
+        for k, v in multi_source_sideloading_items.items():
+            examples.append(
+                OpenApiExample(
+                    name=_(f"Multi source sideloading for {k}"),
+                    value=f"{k}[{','.join(v)}]",
+                    request_only=True,
                 )
-            ]
+            )
+        return [
+            OpenApiParameter(
+                name="sideload",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                many=True,
+                description=_(
+                    "This option allows you to fetch related obejcts for all of the relations with a signle query. "
+                    "Multi-source sideloadable fields can be filtered by the sources by declaring the required "
+                    "sources in square brackets after the sideloading key. All available Mutli-source fields will "
+                    "have an example provided with all available sources. The comma separated sources can be "
+                    "ommited with the square brackets if all sources are to be sideloaded."
+                ),
+                enum=sideloading_keys_sources.keys(),
+                examples=examples,
+                extensions={"x-sideloading-costs": costs},
+            )
+        ]
+
+    def get_sideloading_next_parameters(self):
+        return [
+            OpenApiParameter(
+                name=self.view.sideloading_cursor_query_param_name,
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                required=True,
+                description=_(
+                    "Cursor of the next objects of a paginated sideloaded relation, listed in the sideloading "
+                    "metadata of the previous response. The query parameters of the original request must be sent "
+                    "with the cursor."
+                ),
+            )
+        ]
+
+    def get_override_parameters(self):
+        if self.is_sideloading_operation():
+            return self.get_sideloading_plan()["parameters"]
+        if self.method == "GET" and getattr(self.view, "action", None) == "sideload_next":
+            return self.get_sideloading_next_parameters()
         return []
+
+    def get_sideloading_response_component(self) -> ResolvedComponent:
+        """
+        Registers a component for each sideloaded relation ({name}{Relation}, an array of the relation objects)
+        and the sideloading response referencing them ({name}Response).
+        """
+        plan = self.get_sideloading_plan()
+        primary_name, primary_field = plan["primary"]
+        properties = {
+            primary_name: build_array_type(self.resolve_serializer(primary_field.child, "response").ref),
+        }
+        for relation, field in plan["fields"].items():
+            component = ResolvedComponent(
+                name=f"{plan['name']}{relation.title().replace('_', '')}",
+                type=ResolvedComponent.SCHEMA,
+                schema=build_array_type(self.resolve_serializer(field.child, "response").ref),
+                object=f"{plan['name']}.{relation}",
+            )
+            self.registry.register_on_missing(component)
+            properties[relation] = component.ref
+        properties[plan["meta_key"]] = build_basic_type(OpenApiTypes.OBJECT)
+
+        component = ResolvedComponent(
+            name=f"{plan['name']}Response",
+            type=ResolvedComponent.SCHEMA,
+            schema=build_object_type(properties=properties, required=[primary_name]),
+            object=f"{plan['name']}Response",
+        )
+        self.registry.register_on_missing(component)
+        return component
+
+    def get_operation(self, path, path_regex, path_prefix, method, registry):
+        """
+        Documents the sideloading responses as oneOf the regular response and the sideloading response.
+        """
+        operation = super().get_operation(path, path_regex, path_prefix, method, registry)
+        if operation is None or not self.is_sideloading_operation():
+            return operation
+        content = operation.get("responses", {}).get("200", {}).get("content")
+        if not content:
+            return operation
+
+        schema = self.get_sideloading_response_component().ref
+        paginator = self.view.paginator if self.view.action == "list" else None
+        if paginator is not None:
+            name = self.get_sideloading_plan()["name"]
+            component = ResolvedComponent(
+                name=self.get_paginated_name(f"{name}Response"),
+                type=ResolvedComponent.SCHEMA,
+                schema=paginator.get_paginated_response_schema(schema),
+                object=f"{name}PaginatedResponse",
+            )
+            self.registry.register_on_missing(component)
+            schema = component.ref
+        for media_type_object in content.values():
+            media_type_object["schema"] = {"oneOf": [media_type_object["schema"], schema]}
+        return operation
@@ -1,18 +1,126 @@
-from collections import OrderedDict
+import copy
+from typing import Dict, List, Optional, Set
 
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
 from rest_framework.fields import SkipField, empty
+from rest_framework.relations import PrimaryKeyRelatedField
+
+# options that can be set per sideloadable field in Meta.field_options
+FIELD_OPTIONS = {
+    "cache_ids",
+    "collapse",
+    "harvest",
+    "join",
+    "max_items",
+    "modified_field",
+    "only",
+    "page_size",
+    "reference",
+    "using",
+}
+
+# output formats of the sideloaded relations
+SIDELOADING_FORMAT_OBJECTS = "objects"
+SIDELOADING_FORMAT_COLUMNAR = "columnar"
+
+
+class JSONFragment(bytes):
+    """
+    Pre encoded JSON (from a cache etc.) that renderers supporting fragments write to the output verbatim.
+    Can be used in place of a sideloaded object or a whole sideloaded relation.
+    """
+
+
+class SerializedObject(dict):
+    """
+    Sideloaded object serialized in advance (in memory reference data etc.) that is not serialized again.
+    """
+
+
+def serializer_requires_request(serializer) -> bool:
+    """
+    Returns True if the serializer or its nested serializers have hyperlinked fields, these build the urls
+    from the request.
+    """
+    for field in serializer.fields.values():
+        field = getattr(field, "child_relation", field)
+        field = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(field, serializers.HyperlinkedRelatedField):
+            return True
+        if isinstance(field, serializers.BaseSerializer) and serializer_requires_request(field):
+            return True
+    return False
+
+
+def get_serializer_columns(serializer, lookup: Optional[List[str]] = None) -> Optional[Set[str]]:
+    """
+    Returns the model field names the ModelSerializer reads from the objects found at the lookup.
+    The lookup is a list of relation names starting from the serializer model, without it the serializer model
+    fields are returned. None is returned if the required fields can't be determined.
+    """
+    if lookup:
+        columns = set()
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if not field.source_attrs:
+                return None  # source="*" can read anything
+            if field.source_attrs[0] != lookup[0]:
+                continue
+            child = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(child, serializers.ModelSerializer) and len(field.source_attrs) == 1:
+                child_columns = get_serializer_columns(child, lookup[1:])
+            elif isinstance(getattr(field, "child_relation", field), PrimaryKeyRelatedField):
+                # primary keys are always loaded
+                child_columns = set()
+            else:
+                return None
+            if child_columns is None:
+                return None
+            columns |= child_columns
+        return columns
+
+    model = serializer.Meta.model
+    columns = {model._meta.pk.name}
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if not field.source_attrs:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_many or model_field.one_to_many or (model_field.one_to_one and not model_field.concrete):
+            continue  # read from another table
+        if not model_field.concrete:
+            return None
+        columns.add(model_field.name)
+    return columns
 
 
 class SideLoadableSerializer(serializers.Serializer):
     fields_to_load = None
     relations_to_sideload = None
+    # response key for sideloading metadata (truncated relations etc.)
+    meta_key = "_sideloading"
 
     def __init__(self, instance=None, data=empty, relations_to_sideload=None, **kwargs):
         self.relations_to_sideload = relations_to_sideload
         self.fields_to_load = [self.Meta.primary] + list(relations_to_sideload.keys())
         super(SideLoadableSerializer, self).__init__(instance=instance, data=data, **kwargs)
 
+    def get_fields(self):
+        """
+        Returns copies of the primary and requested relation fields only, other relations are never copied or bound.
+        """
+        if self.fields_to_load is None:
+            return super().get_fields()
+        return {
+            name: copy.deepcopy(field) for name, field in self._declared_fields.items() if name in self.fields_to_load
+        }
+
     @classmethod
     def many_init(cls, *args, **kwargs):
         raise NotImplementedError("Sideloadable serializer with many=True has not been implemented")
@@ -29,6 +137,44 @@ class SideLoadableSerializer(serializers.Serializer):
         if getattr(cls.Meta, "prefetches", None):
             if not isinstance(cls.Meta.prefetches, dict):
                 raise ValueError("Sideloadable serializer Meta attribute 'prefetches' must be a dict.")
+        if getattr(cls.Meta, "field_options", None):
+            if not isinstance(cls.Meta.field_options, dict):
+                raise ValueError("Sideloadable serializer Meta attribute 'field_options' must be a dict.")
+            for name, options in cls.Meta.field_options.items():
+                if name not in cls._declared_fields or name == cls.Meta.primary:
+                    raise ValueError(
+                        f"Sideloadable serializer Meta.field_options key '{name}' is not a sideloadable field!"
+                    )
+                if not isinstance(options, dict):
+                    raise ValueError(f"Sideloadable serializer Meta.field_options for '{name}' must be a dict.")
+                max_items = options.get("max_items")
+                if max_items is not None and (not isinstance(max_items, int) or max_items < 1):
+                    raise ValueError(
+                        f"Sideloadable serializer Meta.field_options 'max_items' for '{name}' must be positive."
+                    )
+                page_size = options.get("page_size")
+                if page_size is not None and (not isinstance(page_size, int) or page_size < 1):
+                    raise ValueError(
+                        f"Sideloadable serializer Meta.field_options 'page_size' for '{name}' must be positive."
+                    )
+                modified_field = options.get("modified_field")
+                if modified_field is not None and not isinstance(modified_field, str):
+                    raise ValueError(
+                        f"Sideloadable serializer Meta.field_options 'modified_field' for '{name}' "
+                        "must be a field name."
+                    )
+                reference = options.get("reference")
+                if reference is not None and (not isinstance(reference, (bool, int, float)) or reference < 0):
+                    raise ValueError(
+                        f"Sideloadable serializer Meta.field_options 'reference' for '{name}' "
+                        "must be a boolean or a TTL in seconds."
+                    )
+                invalid_options = set(options) - FIELD_OPTIONS
+                if invalid_options:
+                    raise ValueError(
+                        f"Sideloadable serializer Meta.field_options for '{name}' has unknown options: "
+                        f"{', '.join(sorted(invalid_options))}"
+                    )
 
         # check serializer fields:
         for name, field in cls._declared_fields.items():
@@ -36,17 +182,20 @@ class SideLoadableSerializer(serializers.Serializer):
                 raise ValueError(f"SideLoadable field '{name}' must be set as many=True")
             if not isinstance(field.child, serializers.ModelSerializer):
                 raise ValueError(f"SideLoadable field '{name}' serializer must be inherited from ModelSerializer")
+            field_options = getattr(cls.Meta, "field_options", {}).get(name, {})
+            if field_options.get("reference") and serializer_requires_request(field.child):
+                raise ValueError(
+                    f"Sideloadable serializer Meta.field_options 'reference' for '{name}' can't be used with "
+                    "serializers that require the request."
+                )
 
     def to_representation(self, instance):
         """
         Object instance -> Dict of primitive datatypes.
         """
-        ret = OrderedDict()
-        fields = [
-            f
-            for f in self.fields.values()
-            if not f.write_only and f.source in instance.keys() and f.field_name in self.fields_to_load
-        ]
+        # plain dict, keeps the insertion order and is encoded faster than an OrderedDict
+        ret = {}
+        fields = [f for f in self.fields.values() if not f.write_only and f.source in instance.keys()]
 
         for field in fields:
             try:
@@ -61,7 +210,33 @@ class SideLoadableSerializer(serializers.Serializer):
             # resolve the pk value.
             if getattr(attribute, "pk", attribute) is None:
                 ret[field.field_name] = None
+            elif isinstance(attribute, JSONFragment):
+                # pre encoded relation
+                ret[field.field_name] = attribute
+            elif isinstance(attribute, list) and any(
+                isinstance(item, (JSONFragment, SerializedObject)) for item in attribute
+            ):
+                # pre encoded and serialized objects are not serialized again
+                ret[field.field_name] = [
+                    item if isinstance(item, (JSONFragment, SerializedObject)) else field.child.to_representation(item)
+                    for item in attribute
+                ]
             else:
                 ret[field.field_name] = field.to_representation(attribute)
 
+        if self.context.get("sideloading_format") == SIDELOADING_FORMAT_COLUMNAR:
+            for field in fields:
+                if field.field_name != self.Meta.primary and isinstance(ret.get(field.field_name), list):
+                    ret[field.field_name] = self.to_columns(field=field, rows=ret[field.field_name])
+
+        if self.meta_key in instance:
+            ret[self.meta_key] = instance[self.meta_key]
+
         return ret
+
+    def to_columns(self, field, rows: List[Dict]) -> Dict[str, List]:
+        """
+        Serialized relation objects -> Dict of column arrays {"id": [1, 2], "name": ["a", "b"]}
+        """
+        names = [f.field_name for f in field.child._readable_fields]
+        return {name: [row.get(name) for row in rows] for name in names}
@@ -0,0 +1,250 @@
+import hashlib
+import io
+import sys
+import uuid
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.wsgi import WSGIRequest
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.urls import resolve
+from rest_framework import serializers
+
+# name of the Django cache the sideloading snapshots are stored in, a file based cache keeps them on the local disk
+SNAPSHOT_CACHE_SETTING = "SIDELOADING_SNAPSHOT_CACHE"
+# list of {"path": "/products/", "query": {"sideload": "categories,suppliers"}} dicts of the precomputed requests,
+# "accept" sets the Accept header of the request (defaults to application/json)
+SNAPSHOTS_SETTING = "SIDELOADING_SNAPSHOTS"
+SNAPSHOT_PREFIX = "drf_sideloading:snapshot"
+MODEL_VERSION_PREFIX = "drf_sideloading:snapshot_model"
+# WSGI environ key of the SnapshotRefresh of the requests made by refresh_snapshots(), clients can't set it
+SNAPSHOT_REFRESH_ENVIRON_KEY = "drf_sideloading.snapshot_refresh"
+
+# models and through models the invalidation receivers are connected to
+_connected_models: List = []
+
+
+class SnapshotRefresh:
+    """
+    Marks a request made by refresh_snapshots(), only these requests store snapshots.
+
+    dirty_only - fresh snapshots are served instead of computed again
+    stored - set by the view after the snapshot is stored
+    """
+
+    def __init__(self, dirty_only: bool = False):
+        self.dirty_only = dirty_only
+        self.stored = False
+
+
+def get_snapshot_refresh(request) -> Optional[SnapshotRefresh]:
+    return request.META.get(SNAPSHOT_REFRESH_ENVIRON_KEY)
+
+
+def get_snapshot_cache():
+    """
+    Returns the cache set with the SIDELOADING_SNAPSHOT_CACHE setting, None if the setting is not defined.
+    """
+    alias = getattr(settings, SNAPSHOT_CACHE_SETTING, None)
+    return caches[alias] if alias else None
+
+
+def get_configured_snapshots() -> List[Dict]:
+    return getattr(settings, SNAPSHOTS_SETTING, [])
+
+
+def normalize_query(query) -> Tuple:
+    """
+    Returns the query parameters (a QueryDict or a dict of values or lists of values) as a sorted tuple.
+    """
+    if hasattr(query, "lists"):
+        items = query.lists()
+    else:
+        items = ((k, v if isinstance(v, (list, tuple)) else [v]) for k, v in query.items())
+    return tuple(sorted((k, tuple(str(x) for x in v)) for k, v in items))
+
+
+def get_snapshot_key(path: str, query, variant: Tuple = ()) -> Optional[str]:
+    """
+    Returns the cache key of the snapshot of the request, None if the request is not configured for snapshots.
+    variant holds everything else the response depends on (media type, version, user scope...).
+    """
+    query = normalize_query(query)
+    for snapshot in get_configured_snapshots():
+        if snapshot["path"] == path and normalize_query(snapshot.get("query", {})) == query:
+            return f"{SNAPSHOT_PREFIX}:{hashlib.sha1(repr((path, query, variant)).encode()).hexdigest()}"
+    return None
+
+
+def get_serializer_models(serializer) -> set:
+    """
+    Returns the models of the serializer and its nested serializers.
+    """
+    serializer = serializer.child if isinstance(serializer, serializers.ListSerializer) else serializer
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return set()
+    models = {serializer.Meta.model}
+    for field in serializer.fields.values():
+        models |= get_serializer_models(field)
+    return models
+
+
+def get_model_versions(models: Iterable, cache=None, create: bool = False) -> Dict[str, Optional[str]]:
+    """
+    Returns the current versions of the models, missing versions are created if create is set.
+    A snapshot is stale if any of the versions it was computed with have changed or are missing.
+    """
+    cache = cache or get_snapshot_cache()
+    keys = {f"{MODEL_VERSION_PREFIX}:{model._meta.label_lower}": model._meta.label_lower for model in models}
+    versions = cache.get_many(list(keys))
+    if create and len(versions) < len(keys):
+        for key in keys:
+            if key not in versions:
+                cache.add(key, uuid.uuid4().hex, timeout=None)
+        versions = cache.get_many(list(keys))
+    return {label: versions.get(key) for key, label in keys.items()}
+
+
+def mark_models_dirty(models: Iterable, cache=None) -> None:
+    """
+    Changes the versions of the models, the snapshots computed with the previous versions are refreshed on the next
+    request.
+    """
+    cache = cache or get_snapshot_cache()
+    if cache is not None:
+        cache.set_many(
+            {f"{MODEL_VERSION_PREFIX}:{model._meta.label_lower}": uuid.uuid4().hex for model in models}, timeout=None
+        )
+
+
+def get_snapshot(key: str, cache=None) -> Optional[Dict]:
+    """
+    Returns the stored snapshot (data, status and headers of the response), None if it is missing or stale.
+    """
+    cache = cache or get_snapshot_cache()
+    snapshot = cache.get(key)
+    if snapshot is None:
+        return None
+    current = cache.get_many([f"{MODEL_VERSION_PREFIX}:{label}" for label in snapshot["versions"]])
+    if any(current.get(f"{MODEL_VERSION_PREFIX}:{label}") != v for label, v in snapshot["versions"].items()):
+        return None
+    return snapshot
+
+
+def set_snapshot(key: str, response, versions: Dict[str, str], cache=None) -> None:
+    """
+    Stores the response with the model versions read before the response was computed.
+    """
+    cache = cache or get_snapshot_cache()
+    cache.set(
+        key,
+        {
+            "data": response.data,
+            "status": response.status_code,
+            "headers": dict(response.items()),
+            "versions": versions,
+        },
+        timeout=None,
+    )
+
+
+def build_snapshot_request(snapshot: Dict, refresh: SnapshotRefresh, host: str, secure: bool) -> WSGIRequest:
+    """
+    Returns an anonymous GET request of the configured snapshot marked with the refresh.
+    """
+    return WSGIRequest(
+        {
+            "REQUEST_METHOD": "GET",
+            "SCRIPT_NAME": "",
+            "PATH_INFO": snapshot["path"],
+            "QUERY_STRING": urlencode(snapshot.get("query", {}), doseq=True),
+            "SERVER_NAME": host,
+            "SERVER_PORT": "443" if secure else "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": host,
+            "HTTP_ACCEPT": snapshot.get("accept", "application/json"),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "https" if secure else "http",
+            "wsgi.input": io.BytesIO(),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": False,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+            SNAPSHOT_REFRESH_ENVIRON_KEY: refresh,
+        }
+    )
+
+
+def refresh_snapshots(dirty_only: bool = False, host: str = "localhost", secure: bool = False) -> List[Tuple]:
+    """
+    Recomputes the configured snapshots by requesting the views. Returns (path, query, status code) tuples,
+    the status code is None for the fresh snapshots skipped with dirty_only.
+    """
+    if get_snapshot_cache() is None:
+        raise ValueError(f"{SNAPSHOT_CACHE_SETTING} setting is not defined.")
+
+    results = []
+    for snapshot in get_configured_snapshots():
+        path, query = snapshot["path"], snapshot.get("query", {})
+        refresh = SnapshotRefresh(dirty_only=dirty_only)
+        # the view computes and stores the snapshot
+        match = resolve(path)
+        response = match.func(build_snapshot_request(snapshot, refresh, host, secure), *match.args, **match.kwargs)
+        fresh = dirty_only and response.status_code == 200 and not refresh.stored
+        results.append((path, query, None if fresh else response.status_code))
+    return results
+
+
+def model_changed_receiver(sender, **kwargs) -> None:
+    mark_models_dirty([sender])
+
+
+def m2m_changed_receiver(sender, instance, action, model, **kwargs) -> None:
+    if action in ("post_add", "post_remove", "post_clear"):
+        mark_models_dirty({sender, instance.__class__, model})
+
+
+def get_snapshot_view_models(path: str) -> Set:
+    """
+    Returns the models every sideloadable relation of the view of the snapshot path is computed from.
+    """
+    view_class = resolve(path).func.cls
+    view = view_class(request=None, format_kwarg=None)
+    view.initialize_serializer(request=None)
+    return view.get_sideloading_snapshot_models({relation: None for relation in view.sideloadable_fields})
+
+
+def connect_snapshot_receivers() -> None:
+    """
+    Connects the receivers marking the snapshots stale to the models of the configured snapshots and their many to
+    many through models if the SIDELOADING_SNAPSHOT_CACHE setting is defined. The other models keep their fast deletes.
+    """
+    disconnect_snapshot_receivers()
+    if get_snapshot_cache() is None:
+        return
+    models = set()
+    for snapshot in get_configured_snapshots():
+        models |= get_snapshot_view_models(snapshot["path"])
+    for model in models:
+        post_save.connect(model_changed_receiver, sender=model, dispatch_uid="drf_sideloading_snapshots_post_save")
+        post_delete.connect(model_changed_receiver, sender=model, dispatch_uid="drf_sideloading_snapshots_post_delete")
+        _connected_models.append(model)
+    throughs = {
+        field.through if hasattr(field, "through") else field.remote_field.through
+        for model in models
+        for field in model._meta.get_fields()
+        if field.many_to_many
+    }
+    for through in throughs:
+        m2m_changed.connect(m2m_changed_receiver, sender=through, dispatch_uid="drf_sideloading_snapshots_m2m_changed")
+        _connected_models.append(through)
+
+
+def disconnect_snapshot_receivers() -> None:
+    while _connected_models:
+        model = _connected_models.pop()
+        post_save.disconnect(sender=model, dispatch_uid="drf_sideloading_snapshots_post_save")
+        post_delete.disconnect(sender=model, dispatch_uid="drf_sideloading_snapshots_post_delete")
+        m2m_changed.disconnect(sender=model, dispatch_uid="drf_sideloading_snapshots_m2m_changed")
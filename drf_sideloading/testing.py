@@ -0,0 +1,143 @@
+import difflib
+import inspect
+import itertools
+import json
+import os
+import re
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+from django.db import connections
+
+# set the environment variable to rewrite the stored snapshots with the recorded queries
+SNAPSHOT_UPDATE_ENV = "SIDELOADING_UPDATE_SNAPSHOTS"
+
+IN_PLACEHOLDERS_RE = re.compile(r"IN \((?:%s|\?)(?:, (?:%s|\?))*\)")
+
+
+def get_sideloading_combinations(view_class, request=None, max_relations: Optional[int] = None) -> List[str]:
+    """
+    Returns every valid sideload query parameter value of the view, including the source selections
+    of the multi source relations. max_relations limits the number of relations in a combination.
+    Pass the request if the sideloading serializer class depends on it.
+    """
+    view = view_class(request=request, format_kwarg=None)
+    view.initialize_serializer(request=request)
+
+    choices = []
+    for relation, sources in view.get_sideloading_field_sources().items():
+        relation_choices = [relation]
+        if isinstance(sources, dict):
+            # selecting all of the sources equals to the relation without a selection
+            for size in range(1, len(sources)):
+                relation_choices.extend(
+                    f"{relation}[{','.join(selection)}]" for selection in itertools.combinations(sources, size)
+                )
+        choices.append(relation_choices)
+
+    combinations = []
+    for size in range(1, min(max_relations or len(choices), len(choices)) + 1):
+        for relations in itertools.combinations(choices, size):
+            combinations.extend(",".join(combination) for combination in itertools.product(*relations))
+    return combinations
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Collapses the IN clause placeholders, the number of the related ids depends on the test data.
+    """
+    return IN_PLACEHOLDERS_RE.sub("IN (...)", sql)
+
+
+class SideloadingQueriesMixin:
+    """
+    TestCase mixin asserting the queries of every sideload combination of a view against a stored snapshot.
+    """
+
+    # defaults to the "snapshots" directory next to the test module
+    sideloading_snapshot_dir = None
+
+    def get_sideloading_snapshot_path(self, name: str) -> str:
+        directory = self.sideloading_snapshot_dir or os.path.join(
+            os.path.dirname(inspect.getfile(self.__class__)), "snapshots"
+        )
+        return os.path.join(directory, f"{name}.json")
+
+    def record_sideloading_queries(
+        self, path: str, sideload: str, data: Optional[Dict] = None, query_param_name: str = "sideload", **extra
+    ) -> Dict:
+        """
+        Requests the path with the sideload parameter and returns the number and the SQL of the executed queries.
+        """
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            queries.append(normalize_sql(sql))
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            response = self.client.get(path=path, data={**(data or {}), query_param_name: sideload}, **extra)
+        self.assertEqual(response.status_code, 200, f"{query_param_name}={sideload}: {response.content!r}")
+        return {"queries": len(queries), "sql": queries}
+
+    def assertSideloadingQueries(
+        self,
+        view_class,
+        path: str,
+        snapshot: str,
+        request=None,
+        max_relations: Optional[int] = None,
+        data: Optional[Dict] = None,
+        **extra,
+    ):
+        """
+        Records the queries of every sideload combination of the view and compares them to the snapshot.
+        A missing snapshot fails the test, set SIDELOADING_UPDATE_SNAPSHOTS to write the missing snapshots and
+        rewrite the existing ones.
+        """
+        recorded = {
+            sideload: self.record_sideloading_queries(
+                path=path,
+                sideload=sideload,
+                data=data,
+                query_param_name=view_class.sideloading_query_param_name,
+                **extra,
+            )
+            for sideload in get_sideloading_combinations(view_class, request=request, max_relations=max_relations)
+        }
+
+        snapshot_path = self.get_sideloading_snapshot_path(snapshot)
+        if not os.environ.get(SNAPSHOT_UPDATE_ENV) and not os.path.exists(snapshot_path):
+            self.fail(
+                f"Sideloading queries snapshot {snapshot_path} is missing, set {SNAPSHOT_UPDATE_ENV}=1 to write it."
+            )
+        if os.environ.get(SNAPSHOT_UPDATE_ENV):
+            os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+            with open(snapshot_path, "w") as f:
+                json.dump(recorded, f, indent=2, sort_keys=True)
+                f.write("\n")
+            return
+
+        with open(snapshot_path) as f:
+            stored = json.load(f)
+        if recorded == stored:
+            return
+
+        changed = [
+            f"  {sideload}: {stored.get(sideload, {}).get('queries')} -> {recorded.get(sideload, {}).get('queries')}"
+            for sideload in sorted(set(stored) | set(recorded))
+            if stored.get(sideload, {}).get("queries") != recorded.get(sideload, {}).get("queries")
+        ]
+        diff = difflib.unified_diff(
+            json.dumps(stored, indent=2, sort_keys=True).splitlines(),
+            json.dumps(recorded, indent=2, sort_keys=True).splitlines(),
+            fromfile=snapshot_path,
+            tofile="recorded",
+            lineterm="",
+        )
+        message = ["Sideloading queries differ from the snapshot."]
+        if changed:
+            message.extend(["Query counts:", *changed])
+        self.fail("\n".join([*message, *diff]))
@@ -51,7 +51,7 @@ setup(
     author="Namespace OÜ",
     author_email="info@namespace.ee",
     url="https://github.com/namespace-ee/drf-sideloading",
-    packages=["drf_sideloading"],
+    packages=["drf_sideloading", "drf_sideloading.management", "drf_sideloading.management.commands"],
     include_package_data=True,
     install_requires=["Django>=2.0", "djangorestframework>=3.7.0"],
     license="MIT",
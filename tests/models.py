@@ -7,6 +7,7 @@ class Category(models.Model):
 
 class Supplier(models.Model):
     name = models.CharField(max_length=255)
+    modified = models.DateTimeField(auto_now=True)
 
 
 class SupplierMetadata(models.Model):
@@ -16,6 +17,7 @@ class SupplierMetadata(models.Model):
 
 class Partner(models.Model):
     name = models.CharField(max_length=255)
+    modified = models.DateTimeField(auto_now=True)
 
 
 class Product(models.Model):
@@ -85,6 +85,26 @@ class ProductSideloadableSerializer(SideLoadableSerializer):
         }
 
 
+class RelationPaginatedProductSideloadableSerializer(SideLoadableSerializer):
+    products = ProductSerializer(many=True)
+    categories = CategorySerializer(source="category", many=True)
+    partners = PartnerSerializer(many=True)
+
+    class Meta:
+        primary = "products"
+        prefetches = {"categories": "category", "partners": "partners"}
+        field_options = {"partners": {"page_size": 2}}
+
+
+class RelationPaginatedCategorySideloadableSerializer(SideLoadableSerializer):
+    categories = CategorySerializer(many=True)
+    products = ProductSerializer(many=True)
+
+    class Meta:
+        primary = "categories"
+        field_options = {"products": {"page_size": 3}}
+
+
 class NewProductSideloadableSerializer(SideLoadableSerializer):
     products = ProductSerializer(many=True)
     new_categories = CategorySerializer(source="category", many=True)
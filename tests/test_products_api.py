@@ -1,12 +1,40 @@
+import importlib.util
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone as dt_timezone
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
 from django.db.models import Prefetch
-from django.test import TestCase
-from django.urls import reverse
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
 from rest_framework import status, serializers
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import BasePermission
 from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
 
+from drf_sideloading import reference
+from drf_sideloading.cache import connect_related_ids_receivers
+from drf_sideloading.mixins import SingleFlight
 from drf_sideloading.serializers import SideLoadableSerializer
+from drf_sideloading.snapshots import get_snapshot_view_models
 from tests.models import Category, Supplier, Product, Partner, ProductMetadata, SupplierMetadata
 from tests.serializers import (
     ProductSerializer,
@@ -14,8 +42,15 @@ from tests.serializers import (
     SupplierSerializer,
     PartnerSerializer,
     ProductMetadataSerializer,
+    ProductSideloadableSerializer,
+)
+from tests.viewsets import (
+    CategoryViewSet,
+    PaginatedCategoryViewSet,
+    ProductViewSet,
+    PaginatedProductViewSet,
+    RelationPaginatedProductViewSet,
 )
-from tests.viewsets import ProductViewSet
 
 
 class BaseTestCase(TestCase):
@@ -1194,3 +1229,1780 @@ class VersionesSideloadableSerializerTestCase(BaseTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
         self.assertIsInstance(response.json(), dict)
         self.assertListEqual(["products", "new_categories"], list(response.json().keys()))
+
+
+class ProductSideloadJoinTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadJoinTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            suppliers = SupplierSerializer(source="supplier", many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "categories": "category",
+                    "suppliers": ["supplier", "supplier__metadata"],
+                    "partners": "partners",
+                }
+                field_options = {"categories": {"join": False}}
+
+        ProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        ProductViewSet.sideloading_join_max_depth = 2
+
+    @classmethod
+    def tearDownClass(cls):
+        ProductViewSet.sideloading_join_max_depth = 0
+        super(ProductSideloadJoinTestCase, cls).tearDownClass()
+
+    def test_list_sideloading_joins_single_valued_relations(self):
+        response = self.client.get(
+            path=reverse("product-list"), data={"sideload": "categories,suppliers,partners"}, **self.DEFAULT_HEADERS
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertListEqual(["products", "categories", "suppliers", "partners"], list(response.json().keys()))
+        queryset = response.data.serializer.instance["products"]
+        self.assertDictEqual({"supplier": {"metadata": {}}}, queryset.query.select_related)
+        self.assertListEqual(
+            ["category", "partners"], sorted(getattr(p, "prefetch_to", p) for p in queryset._prefetch_related_lookups)
+        )
+        supplier_names = {supplier["name"] for supplier in response.json()["suppliers"]}
+        self.assertSetEqual({"Supplier1", "Supplier2", "Supplier3", "Supplier4"}, supplier_names)
+
+    def test_detail_sideloading_joins_single_valued_relations(self):
+        response = self.client.get(
+            path=reverse("product-detail", args=[self.product1.id]),
+            data={"sideload": "suppliers"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertListEqual(
+            [{"name": "Supplier1", "metadata": {"supplier": self.supplier1.id, "properties": "Supplier1 metadata"}}],
+            response.json()["suppliers"],
+        )
+
+
+class ProductSideloadColumnPruningTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadColumnPruningTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            suppliers = SupplierSerializer(source="supplier", many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "categories": "category",
+                    "suppliers": ["supplier", "supplier__metadata"],
+                    "partners": "partners",
+                }
+                field_options = {"categories": {"only": False}}
+
+        ProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+
+    def test_list_sideloading_loads_only_serialized_columns(self):
+        response = self.client.get(
+            path=reverse("product-list"), data={"sideload": "categories,suppliers,partners"}, **self.DEFAULT_HEADERS
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        sideloadable_page = response.data.serializer.instance
+        self.assertEqual((frozenset(), True), sideloadable_page["category"].query.deferred_loading)
+        self.assertEqual(({"id", "name"}, False), sideloadable_page["supplier"].query.deferred_loading)
+        self.assertEqual(({"id", "name"}, False), sideloadable_page["partners"].query.deferred_loading)
+
+        prefetches = {getattr(p, "prefetch_to", p): p for p in sideloadable_page["products"]._prefetch_related_lookups}
+        self.assertEqual("category", prefetches["category"])
+        self.assertEqual(({"id", "name"}, False), prefetches["supplier"].queryset.query.deferred_loading)
+        self.assertEqual(
+            ({"id", "supplier", "properties"}, False), prefetches["supplier__metadata"].queryset.query.deferred_loading
+        )
+        self.assertEqual(
+            ["Partner1", "Partner2", "Partner3", "Partner4"], [p["name"] for p in response.json()["partners"]]
+        )
+
+    def test_paginated_list_sideloading_loads_relation_columns_of_intermediate_levels(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                path=reverse("categorypaginated-list"), data={"sideload": "suppliers"}, **self.DEFAULT_HEADERS
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual(4, len(response.json()["results"]["suppliers"]))
+        product_queries = [q["sql"] for q in context.captured_queries if 'FROM "tests_product"' in q["sql"]]
+        self.assertEqual(1, len(product_queries))
+        self.assertNotIn('"tests_product"."name"', product_queries[0])
+        self.assertIn('"tests_product"."supplier_id"', product_queries[0])
+
+
+class ProductSideloadHarvestIdsTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadHarvestIdsTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            suppliers = SupplierSerializer(source="supplier", many=True)
+            partners = PartnerSerializer(many=True)
+            filtered_partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "categories": "category",
+                    "suppliers": ["supplier", "supplier__metadata"],
+                    "partners": "partners",
+                    "filtered_partners": Prefetch(
+                        lookup="partners",
+                        queryset=Partner.objects.filter(name__in=["Partner2", "Partner4"]),
+                        to_attr="filtered_partners",
+                    ),
+                }
+
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        PaginatedProductViewSet.sideloading_harvest_ids = True
+
+    @classmethod
+    def tearDownClass(cls):
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        PaginatedProductViewSet.sideloading_harvest_ids = False
+        super(ProductSideloadHarvestIdsTestCase, cls).tearDownClass()
+
+    def test_paginated_list_sideloading_harvests_ids(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                path=reverse("productpaginated-list"),
+                data={"sideload": "categories,suppliers,partners"},
+                **self.DEFAULT_HEADERS,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        self.assertEqual(["Category"], [c["name"] for c in results["categories"]])
+        self.assertEqual(["Supplier1", "Supplier2", "Supplier3"], sorted(s["name"] for s in results["suppliers"]))
+        self.assertEqual("Supplier1 metadata", results["suppliers"][0]["metadata"]["properties"])
+        self.assertEqual(
+            ["Partner1", "Partner2", "Partner3", "Partner4"], sorted(p["name"] for p in results["partners"])
+        )
+
+        # related objects are not attached to the primary objects
+        products = response.data["results"].serializer.instance["products"]
+        self.assertFalse(any(getattr(product, "_prefetched_objects_cache", None) for product in products))
+        self.assertFalse(any(Product.category.is_cached(product) for product in products))
+        # partners ids are read from the through table without joining the partners
+        through_queries = [q["sql"] for q in context.captured_queries if 'FROM "tests_product_partners"' in q["sql"]]
+        self.assertEqual(1, len(through_queries))
+        self.assertNotIn('"tests_partner"', through_queries[0])
+
+    def test_paginated_list_sideloading_prefetches_filtered_relations(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "partners,filtered_partners"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        self.assertEqual(
+            ["Partner1", "Partner2", "Partner3", "Partner4"], sorted(p["name"] for p in results["partners"])
+        )
+        self.assertEqual(["Partner2", "Partner4"], sorted(p["name"] for p in results["filtered_partners"]))
+
+    def test_detail_sideloading_harvests_ids(self):
+        response = self.client.get(
+            path=reverse("productpaginated-detail", args=[self.product1.id]),
+            data={"sideload": "categories,partners"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual(["Partner1", "Partner2", "Partner4"], sorted(p["name"] for p in response.json()["partners"]))
+
+    def test_harvested_ids_are_filtered(self):
+        def add_sideloading_prefetch_filter(view, source, queryset, request):
+            if source == "partners":
+                return queryset.exclude(name="Partner2"), True
+            return queryset, False
+
+        with patch.object(PaginatedProductViewSet, "add_sideloading_prefetch_filter", add_sideloading_prefetch_filter):
+            for path in [reverse("productpaginated-list"), reverse("productpaginated-detail", args=[self.product1.id])]:
+                response = self.client.get(path=path, data={"sideload": "partners"}, **self.DEFAULT_HEADERS)
+                self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+                results = response.json().get("results", response.json())
+                self.assertNotIn("Partner2", [p["name"] for p in results["partners"]])
+                self.assertIn("Partner1", [p["name"] for p in results["partners"]])
+
+
+class ProductSideloadMaxItemsTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadMaxItemsTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            suppliers = SupplierSerializer(source="supplier", many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "categories": "category",
+                    "suppliers": ["supplier", "supplier__metadata"],
+                    "partners": "partners",
+                }
+                field_options = {"suppliers": {"max_items": 2}, "partners": {"max_items": 2}}
+
+        cls.original_serializer_classes = {
+            ProductViewSet: ProductViewSet.sideloading_serializer_class,
+            PaginatedProductViewSet: PaginatedProductViewSet.sideloading_serializer_class,
+        }
+        ProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+
+    @classmethod
+    def tearDownClass(cls):
+        for view_class, serializer_class in cls.original_serializer_classes.items():
+            view_class.sideloading_serializer_class = serializer_class
+        super(ProductSideloadMaxItemsTestCase, cls).tearDownClass()
+
+    def test_list_sideloading_truncates_relations(self):
+        response = self.client.get(
+            path=reverse("product-list"), data={"sideload": "categories,suppliers,partners"}, **self.DEFAULT_HEADERS
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertListEqual(
+            ["products", "categories", "suppliers", "partners", "_sideloading"], list(response.json().keys())
+        )
+        self.assertEqual(["Supplier1", "Supplier2"], [s["name"] for s in response.json()["suppliers"]])
+        self.assertEqual(["Partner1", "Partner2"], [p["name"] for p in response.json()["partners"]])
+        self.assertDictEqual(
+            {"truncated": {"suppliers": {"max_items": 2}, "partners": {"max_items": 2}}},
+            response.json()["_sideloading"],
+        )
+
+    def test_paginated_list_sideloading_truncates_relations_in_sql(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"), data={"sideload": "partners", "page": 2}, **self.DEFAULT_HEADERS
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        # product4 has no partners, relation is not truncated
+        self.assertListEqual(["products", "partners"], list(response.json()["results"].keys()))
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                path=reverse("productpaginated-list"), data={"sideload": "partners"}, **self.DEFAULT_HEADERS
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        self.assertEqual(["Partner1", "Partner2"], [p["name"] for p in results["partners"]])
+        self.assertDictEqual({"truncated": {"partners": {"max_items": 2}}}, results["_sideloading"])
+        # the primary serializer reads the partners of every product, check only the sideloading queries
+        sideloading_queries = [
+            q["sql"]
+            for q in context.captured_queries
+            if 'FROM "tests_product_partners"' in q["sql"] or '"tests_partner"."id" IN' in q["sql"]
+        ]
+        self.assertEqual(2, len(sideloading_queries))
+        self.assertTrue(all(sql.endswith("LIMIT 3") for sql in sideloading_queries), sideloading_queries)
+
+    def test_detail_sideloading_without_truncation(self):
+        response = self.client.get(
+            path=reverse("product-detail", args=[self.product2.id]),
+            data={"sideload": "partners"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertListEqual(["products", "partners"], list(response.json().keys()))
+
+    def test_filtered_objects_are_not_counted(self):
+        def add_sideloading_prefetch_filter(view, source, queryset, request):
+            if source == "partners":
+                return queryset.exclude(name="Partner2"), True
+            return queryset, False
+
+        with patch.object(ProductViewSet, "add_sideloading_prefetch_filter", add_sideloading_prefetch_filter):
+            response = self.client.get(
+                path=reverse("product-list"), data={"sideload": "partners"}, **self.DEFAULT_HEADERS
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual(["Partner1", "Partner3"], [p["name"] for p in response.json()["partners"]])
+        self.assertDictEqual({"truncated": {"partners": {"max_items": 2}}}, response.json()["_sideloading"])
+
+    def test_known_objects_are_not_counted(self):
+        response = self.client.get(
+            path=reverse("product-list"),
+            data={"sideload": "partners", "sideload_known[partners]": f"{self.partner1.id},{self.partner2.id}"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual(["Partner3", "Partner4"], [p["name"] for p in response.json()["partners"]])
+        self.assertNotIn("_sideloading", response.json())
+
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "partners", "sideload_known[partners]": str(self.partner1.id)},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        self.assertEqual(["Partner2", "Partner3"], [p["name"] for p in results["partners"]])
+        self.assertDictEqual({"truncated": {"partners": {"max_items": 2}}}, results["_sideloading"])
+
+
+class ProductSideloadCostBudgetTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadCostBudgetTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            suppliers = SupplierSerializer(source="supplier", many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "categories": "category",
+                    "suppliers": ["supplier", "supplier__metadata"],
+                    "partners": "partners",
+                }
+
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        PaginatedProductViewSet.sideloading_max_cost = 6
+
+    @classmethod
+    def tearDownClass(cls):
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        PaginatedProductViewSet.sideloading_max_cost = None
+        PaginatedProductViewSet.sideloading_budget_action = "reject"
+        super(ProductSideloadCostBudgetTestCase, cls).tearDownClass()
+
+    def test_sideloading_costs(self):
+        view = PaginatedProductViewSet()
+        view.initialize_serializer(request=None)
+        costs = view.get_sideloading_costs(
+            relations_to_sideload={"categories": None, "suppliers": None, "partners": None}
+        )
+        self.assertDictEqual(
+            {
+                "categories": {"queries": 1, "join_depth": 1, "fan_out": 0, "cost": 2},
+                "suppliers": {"queries": 2, "join_depth": 2, "fan_out": 0, "cost": 4},
+                "partners": {"queries": 1, "join_depth": 1, "fan_out": 1, "cost": 4},
+            },
+            costs,
+        )
+
+    def test_sideloading_within_budget(self):
+        PaginatedProductViewSet.sideloading_budget_action = "reject"
+        response = self.client.get(
+            path=reverse("productpaginated-list"), data={"sideload": "categories,partners"}, **self.DEFAULT_HEADERS
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertListEqual(["products", "categories", "partners"], list(response.json()["results"].keys()))
+
+    def test_sideloading_over_budget_rejected(self):
+        PaginatedProductViewSet.sideloading_budget_action = "reject"
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "categories,suppliers,partners"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            {"sideload": ["Sideloading cost 10 exceeds the allowed cost of 6."]},
+            response.json(),
+        )
+
+    def test_sideloading_over_budget_downgraded(self):
+        PaginatedProductViewSet.sideloading_budget_action = "downgrade"
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "categories,suppliers,partners"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        self.assertListEqual(["products", "categories", "partners", "_sideloading"], list(results.keys()))
+        self.assertDictEqual({"dropped": {"suppliers": True}}, results["_sideloading"])
+
+    def test_sideloading_over_budget_all_dropped(self):
+        PaginatedProductViewSet.sideloading_budget_action = "downgrade"
+        with patch.object(PaginatedProductViewSet, "sideloading_max_cost", 0.5):
+            response = self.client.get(
+                path=reverse("productpaginated-list"), data={"sideload": "categories"}, **self.DEFAULT_HEADERS
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual({"sideload": ["Sideloading cost 2 exceeds the allowed cost of 0.5."]}, response.json())
+
+    @skipUnless(importlib.util.find_spec("drf_spectacular"), "drf-spectacular is not installed")
+    def test_schema_sideloading_costs(self):
+        from drf_sideloading.schema import SideloadingAutoSchema
+
+        schema = SideloadingAutoSchema()
+        schema.view = PaginatedProductViewSet(action="list")
+        schema.method = "GET"
+        schema.path = reverse("productpaginated-list")
+        (parameter,) = schema.get_override_parameters()
+        self.assertEqual({"categories", "suppliers", "partners"}, set(parameter.extensions["x-sideloading-costs"]))
+        self.assertEqual(4, parameter.extensions["x-sideloading-costs"]["partners"]["cost"])
+
+
+class ProductSideloadExplainTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadExplainTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            suppliers = SupplierSerializer(source="supplier", many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "categories": "category",
+                    "suppliers": ["supplier", "supplier__metadata"],
+                    "partners": "partners",
+                }
+
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        cls.original_queryset = PaginatedProductViewSet.queryset
+        PaginatedProductViewSet.queryset = Product.objects.order_by("id").prefetch_related("category")
+        PaginatedProductViewSet.has_sideloading_explain_permission = lambda self, request: True
+
+    @classmethod
+    def tearDownClass(cls):
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        PaginatedProductViewSet.queryset = cls.original_queryset
+        del PaginatedProductViewSet.has_sideloading_explain_permission
+        super(ProductSideloadExplainTestCase, cls).tearDownClass()
+
+    def test_explain_requires_staff_user(self):
+        response = self.client.get(
+            path=reverse("product-list"),
+            data={"sideload": "categories", "sideload_explain": "1"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, response.json())
+
+    def test_explain_list(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "categories,suppliers,partners", "sideload_explain": "1"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        plan = response.json()
+        self.assertListEqual(
+            ["relations", "dropped", "prefetches", "select_related", "view_prefetches", "queries"], list(plan.keys())
+        )
+        self.assertListEqual(["categories", "suppliers", "partners"], list(plan["relations"].keys()))
+        self.assertListEqual(["supplier"], plan["relations"]["suppliers"]["sources"])
+        self.assertListEqual(
+            ["category", "partners", "supplier", "supplier__metadata"], [p["lookup"] for p in plan["prefetches"]]
+        )
+        self.assertDictEqual({"reused": ["category"], "replaced": []}, plan["view_prefetches"])
+        self.assertEqual('SELECT COUNT(*) AS "__count" FROM "tests_product"', plan["queries"][0]["sql"])
+        self.assertNotIn("explain", plan["queries"][0])
+
+    def test_explain_detail_with_database_explain(self):
+        response = self.client.get(
+            path=reverse("productpaginated-detail", args=[self.product1.id]),
+            data={"sideload": "categories", "sideload_explain": "explain"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        plan = response.json()
+        self.assertTrue(all(query["explain"] for query in plan["queries"]), plan["queries"])
+
+
+class ProductSideloadFilterCacheTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadFilterCacheTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {"partners": "partners"}
+
+        def add_sideloading_prefetch_filter(self, source, queryset, request):
+            cls.filter_calls.append(source)
+            if source == "partners":
+                return queryset.exclude(name="Partner2"), True
+            return queryset, False
+
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        PaginatedProductViewSet.add_sideloading_prefetch_filter = add_sideloading_prefetch_filter
+
+    @classmethod
+    def tearDownClass(cls):
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        del PaginatedProductViewSet.add_sideloading_prefetch_filter
+        if "get_sideloading_filter_scope" in PaginatedProductViewSet.__dict__:
+            del PaginatedProductViewSet.get_sideloading_filter_scope
+        super(ProductSideloadFilterCacheTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.__class__.filter_calls = []
+        PaginatedProductViewSet.get_sideloading_filter_cache().clear()
+
+    def test_filter_applied_once_per_request_without_scope(self):
+        for _ in range(2):
+            response = self.client.get(
+                path=reverse("productpaginated-list"), data={"sideload": "partners"}, **self.DEFAULT_HEADERS
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+            self.assertEqual(
+                ["Partner1", "Partner3", "Partner4"], [p["name"] for p in response.json()["results"]["partners"]]
+            )
+        self.assertEqual(["partners", "partners"], self.filter_calls)
+        self.assertDictEqual({}, PaginatedProductViewSet.get_sideloading_filter_cache())
+
+    def test_filter_cached_per_scope(self):
+        PaginatedProductViewSet.get_sideloading_filter_scope = lambda self, request: request.query_params.get("scope")
+        for scope in ["a", "a", "b"]:
+            response = self.client.get(
+                path=reverse("productpaginated-list"),
+                data={"sideload": "partners", "scope": scope},
+                **self.DEFAULT_HEADERS,
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+            self.assertEqual(
+                ["Partner1", "Partner3", "Partner4"], [p["name"] for p in response.json()["results"]["partners"]]
+            )
+        self.assertEqual(["partners", "partners"], self.filter_calls)
+        self.assertEqual(
+            [("partners", Partner, "a"), ("partners", Partner, "b")],
+            list(PaginatedProductViewSet.get_sideloading_filter_cache()),
+        )
+        # the cache is not shared with the other view classes
+        self.assertDictEqual({}, ProductViewSet.get_sideloading_filter_cache())
+
+    def test_filter_cached_for_prefetch_objects(self):
+        PaginatedProductViewSet.get_sideloading_filter_scope = lambda self, request: "scope"
+        prefetches = {
+            "partners": Prefetch(lookup="partners", queryset=Partner.objects.exclude(name="Partner4").order_by("-id"))
+        }
+        serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        with patch.object(serializer_class.Meta, "prefetches", prefetches):
+            for _ in range(2):
+                response = self.client.get(
+                    path=reverse("productpaginated-list"), data={"sideload": "partners"}, **self.DEFAULT_HEADERS
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+                self.assertEqual(
+                    ["Partner1", "Partner3"], sorted(p["name"] for p in response.json()["results"]["partners"])
+                )
+        # the hook is not called again for the Prefetch, the cached filters are combined with its queryset
+        self.assertEqual(["partners"], self.filter_calls)
+
+
+class ProductSideloadMergedPrefetchTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadMergedPrefetchTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "partners": Prefetch(
+                        lookup="partners", queryset=Partner.objects.filter(name__in=["Partner2", "Partner4"])
+                    ),
+                }
+
+        cls.original_queryset = ProductViewSet.queryset
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        ProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        ProductViewSet.queryset = Product.objects.prefetch_related("partners")
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        PaginatedProductViewSet.queryset = Product.objects.order_by("id").prefetch_related("partners")
+
+    @classmethod
+    def tearDownClass(cls):
+        ProductViewSet.queryset = cls.original_queryset
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        PaginatedProductViewSet.queryset = Product.objects.order_by("id")
+        super(ProductSideloadMergedPrefetchTestCase, cls).tearDownClass()
+
+    def assertPartnersQueries(self, context, expected_count):
+        partner_queries = [q["sql"] for q in context.captured_queries if 'FROM "tests_partner"' in q["sql"]]
+        self.assertEqual(expected_count, len(partner_queries), partner_queries)
+
+    def test_list_merges_view_and_sideloading_prefetches(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                path=reverse("product-list"), data={"sideload": "partners"}, **self.DEFAULT_HEADERS
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        # the view prefetch is not filtered by sideloading
+        self.assertEqual(
+            [[self.partner1.id, self.partner2.id, self.partner4.id], [self.partner2.id], [self.partner3.id], []],
+            [p["partners"] for p in response.json()["products"]],
+        )
+        self.assertEqual(["Partner2", "Partner4"], sorted(p["name"] for p in response.json()["partners"]))
+        # merged prefetch and sideloaded partners
+        self.assertPartnersQueries(context, 2)
+
+    def test_paginated_list_merges_view_and_sideloading_prefetches(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                path=reverse("productpaginated-list"), data={"sideload": "partners"}, **self.DEFAULT_HEADERS
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        self.assertEqual(
+            [[self.partner1.id, self.partner2.id, self.partner4.id], [self.partner2.id], [self.partner3.id]],
+            [p["partners"] for p in results["products"]],
+        )
+        self.assertEqual(["Partner2", "Partner4"], sorted(p["name"] for p in results["partners"]))
+        self.assertPartnersQueries(context, 1)
+
+
+class ProductSideloadColumnarFormatTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadColumnarFormatTestCase, cls).setUpClass()
+        ProductViewSet.sideloading_serializer_class = ProductSideloadableSerializer
+
+    def test_columnar_format_query_param(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "main_suppliers,categories", "sideload_format": "columnar"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        # primary objects are not changed
+        self.assertEqual(["Product1", "Product2", "Product3"], [p["name"] for p in results["products"]])
+        self.assertDictEqual({"name": ["Category"]}, results["categories"])
+        self.assertEqual(["name", "metadata"], list(results["main_suppliers"].keys()))
+        self.assertEqual(["Supplier1", "Supplier2", "Supplier3"], sorted(results["main_suppliers"]["name"]))
+        self.assertEqual(3, len(results["main_suppliers"]["metadata"]))
+
+    def test_columnar_format_media_type_param(self):
+        response = self.client.get(
+            path=reverse("product-detail", args=[self.product1.id]),
+            data={"sideload": "categories"},
+            HTTP_ACCEPT="application/json; sideload_format=columnar",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertDictEqual({"name": ["Category"]}, response.json()["categories"])
+        self.assertEqual("Product1", response.json()["products"][0]["name"])
+
+    def test_invalid_format(self):
+        response = self.client.get(
+            path=reverse("product-list"),
+            data={"sideload": "categories", "sideload_format": "rows"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual({"sideload_format": ["'rows' is not one of the available formats."]}, response.json())
+
+
+class ProductSideloadKnownIdsTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadKnownIdsTestCase, cls).setUpClass()
+        ProductViewSet.sideloading_serializer_class = ProductSideloadableSerializer
+
+    def test_list_known_ids_excluded(self):
+        response = self.client.get(
+            path=reverse("product-list"),
+            data={
+                "sideload": "main_suppliers,categories",
+                "sideload_known[main_suppliers]": f"{self.supplier1.id},{self.supplier2.id}",
+            },
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual(4, len(response.json()["products"]))
+        self.assertEqual(["Supplier3", "Supplier4"], sorted(s["name"] for s in response.json()["main_suppliers"]))
+        self.assertEqual(["Category"], [c["name"] for c in response.json()["categories"]])
+
+    def test_paginated_list_known_ids_excluded(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "main_suppliers,categories", "sideload_known[categories]": str(self.category.id)},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        self.assertEqual([], results["categories"])
+        self.assertEqual(["Supplier1", "Supplier2", "Supplier3"], sorted(s["name"] for s in results["main_suppliers"]))
+
+    def test_detail_all_known(self):
+        response = self.client.get(
+            path=reverse("product-detail", args=[self.product1.id]),
+            data={"sideload": "main_suppliers", "sideload_known[main_suppliers]": str(self.supplier1.id)},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual([], response.json()["main_suppliers"])
+
+    def test_invalid_known_ids(self):
+        response = self.client.get(
+            path=reverse("product-list"),
+            data={"sideload": "main_suppliers", "sideload_known[main_suppliers]": "1,a"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            {"sideload_known[main_suppliers]": ["'main_suppliers' known ids must be valid primary keys."]},
+            response.json(),
+        )
+
+    def test_invalid_known_relation(self):
+        response = self.client.get(
+            path=reverse("product-list"),
+            data={"sideload": "main_suppliers", "sideload_known[vendors]": "1"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            {"sideload_known[vendors]": ["'vendors' is not one of the available choices."]}, response.json()
+        )
+
+
+class ProductSideloadSinceTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadSinceTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            main_suppliers = SupplierSerializer(source="supplier", many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "categories": "category",
+                    "main_suppliers": ["supplier", "supplier__metadata"],
+                    "partners": "partners",
+                }
+                field_options = {
+                    "main_suppliers": {"modified_field": "modified"},
+                    "partners": {"modified_field": "modified"},
+                }
+
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        ProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+
+    @classmethod
+    def tearDownClass(cls):
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        super(ProductSideloadSinceTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        old = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+        new = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        Supplier.objects.update(modified=old)
+        Partner.objects.update(modified=old)
+        Supplier.objects.filter(pk=self.supplier2.pk).update(modified=new)
+        Partner.objects.filter(pk=self.partner2.pk).update(modified=new)
+
+    def test_list_since(self):
+        response = self.client.get(
+            path=reverse("product-list"),
+            data={"sideload": "categories,main_suppliers,partners", "sideload_since": "2025-01-01T00:00:00Z"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual(4, len(response.json()["products"]))
+        self.assertEqual(["Category"], [c["name"] for c in response.json()["categories"]])
+        self.assertEqual(["Supplier2"], [s["name"] for s in response.json()["main_suppliers"]])
+        self.assertEqual(["Partner2"], [p["name"] for p in response.json()["partners"]])
+
+    def test_paginated_list_since(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                path=reverse("productpaginated-list"),
+                data={"sideload": "main_suppliers,partners", "sideload_since": "2025-01-01"},
+                **self.DEFAULT_HEADERS,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        results = response.json()["results"]
+        self.assertEqual(3, len(results["products"]))
+        self.assertEqual(["Supplier2"], [s["name"] for s in results["main_suppliers"]])
+        self.assertEqual(["Partner2"], [p["name"] for p in results["partners"]])
+        # the modification time is loaded with the prefetched objects
+        supplier_queries = [q["sql"] for q in context.captured_queries if 'FROM "tests_supplier"' in q["sql"]]
+        self.assertEqual(1, len(supplier_queries), supplier_queries)
+
+    def test_since_before_max_items(self):
+        Partner.objects.filter(pk=self.partner4.pk).update(modified=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        field_options = ProductViewSet.sideloading_serializer_class.Meta.field_options
+        with patch.dict(field_options, {"partners": {"modified_field": "modified", "max_items": 1}}):
+            response = self.client.get(
+                path=reverse("product-list"),
+                data={"sideload": "partners", "sideload_since": "2025-01-01"},
+                **self.DEFAULT_HEADERS,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual(["Partner2"], [p["name"] for p in response.json()["partners"]])
+        self.assertDictEqual({"truncated": {"partners": {"max_items": 1}}}, response.json()["_sideloading"])
+
+    def test_null_modified_field(self):
+        view = PaginatedProductViewSet(request=None, format_kwarg=None)
+        view.initialize_serializer(request=None)
+        view.sideloading_since = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        partners = list(Partner.objects.order_by("pk"))
+        partners[2].modified = None
+        self.assertEqual(
+            set(view.filter_modified_objects("partners", Partner.objects.all())),
+            view.filter_modified_objects("partners", partners),
+        )
+        self.assertEqual({self.partner2}, view.filter_modified_objects("partners", partners))
+
+    def test_unix_timestamp(self):
+        response = self.client.get(
+            path=reverse("product-detail", args=[self.product2.id]),
+            data={"sideload": "main_suppliers", "sideload_since": str(datetime(2025, 1, 1).timestamp())},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual(["Supplier2"], [s["name"] for s in response.json()["main_suppliers"]])
+
+        response = self.client.get(
+            path=reverse("product-detail", args=[self.product1.id]),
+            data={"sideload": "main_suppliers", "sideload_since": str(datetime(2025, 1, 1).timestamp())},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEqual([], response.json()["main_suppliers"])
+
+    def test_invalid_since(self):
+        response = self.client.get(
+            path=reverse("product-list"),
+            data={"sideload": "main_suppliers", "sideload_since": "yesterday"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual({"sideload_since": ["'yesterday' is not a valid timestamp."]}, response.json())
+
+    def test_invalid_modified_field_option(self):
+        class InvalidSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+
+            class Meta:
+                primary = "products"
+                field_options = {"categories": {"modified_field": True}}
+
+        with self.assertRaisesMessage(ValueError, "'modified_field' for 'categories' must be a field name."):
+            InvalidSideloadableSerializer.check_setup()
+
+
+@override_settings(SIDELOADING_RELATED_IDS_CACHE="default")
+class ProductSideloadRelatedIdsCacheTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadRelatedIdsCacheTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {"partners": "partners"}
+                field_options = {"partners": {"cache_ids": True}}
+
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        ProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+
+    @classmethod
+    def tearDownClass(cls):
+        ProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        super(ProductSideloadRelatedIdsCacheTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def get_partner_names(self, path):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path=path, data={"sideload": "partners"}, **self.DEFAULT_HEADERS)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        data = response.json().get("results", response.json())
+        through_queries = [q["sql"] for q in context.captured_queries if 'FROM "tests_product_partners"' in q["sql"]]
+        return sorted(p["name"] for p in data["partners"]), len(through_queries)
+
+    def test_list_ids_cached(self):
+        self.assertEqual(
+            (["Partner1", "Partner2", "Partner3", "Partner4"], 1), self.get_partner_names(reverse("product-list"))
+        )
+        self.assertEqual(
+            (["Partner1", "Partner2", "Partner3", "Partner4"], 0), self.get_partner_names(reverse("product-list"))
+        )
+        # pages share the cached ids of the primary objects
+        self.assertEqual(
+            (["Partner1", "Partner2", "Partner3", "Partner4"], 0),
+            self.get_partner_names(reverse("productpaginated-list")),
+        )
+
+    def test_detail_ids_cached(self):
+        path = reverse("product-detail", args=[self.product2.id])
+        self.assertEqual((["Partner2"], 1), self.get_partner_names(path))
+        self.assertEqual((["Partner2"], 0), self.get_partner_names(path))
+
+    def test_cached_ids_are_filtered(self):
+        def add_sideloading_prefetch_filter(view, source, queryset, request):
+            if source == "partners":
+                return queryset.exclude(name="Partner2"), True
+            return queryset, False
+
+        path = reverse("product-detail", args=[self.product1.id])
+        self.assertEqual((["Partner1", "Partner2", "Partner4"], 1), self.get_partner_names(path))
+        with patch.object(ProductViewSet, "add_sideloading_prefetch_filter", add_sideloading_prefetch_filter):
+            self.assertEqual((["Partner1", "Partner4"], 0), self.get_partner_names(path))
+        self.assertEqual((["Partner1", "Partner2", "Partner4"], 0), self.get_partner_names(path))
+
+    def test_m2m_changed_invalidation(self):
+        path = reverse("product-detail", args=[self.product1.id])
+        self.assertEqual((["Partner1", "Partner2", "Partner4"], 1), self.get_partner_names(path))
+
+        self.product1.partners.remove(self.partner1)
+        self.assertEqual((["Partner2", "Partner4"], 1), self.get_partner_names(path))
+
+        self.partner3.products.add(self.product1)  # reverse side
+        self.assertEqual((["Partner2", "Partner3", "Partner4"], 1), self.get_partner_names(path))
+
+        self.partner3.products.clear()
+        self.assertEqual((["Partner2", "Partner4"], 1), self.get_partner_names(path))
+
+        self.product1.partners.clear()
+        self.assertEqual(([], 1), self.get_partner_names(path))
+
+    def test_through_model_invalidation(self):
+        path = reverse("product-detail", args=[self.product4.id])
+        self.assertEqual(([], 1), self.get_partner_names(path))
+
+        # Django sends no signals for auto created through models, these are sent for custom through models
+        through = Product.partners.through
+        self.addCleanup(connect_related_ids_receivers)
+        with patch.object(through._meta, "auto_created", False):
+            connect_related_ids_receivers()
+            row = through.objects.create(product=self.product4, partner=self.partner3)
+            post_save.send(sender=through, instance=row, created=True)
+            self.assertEqual((["Partner3"], 1), self.get_partner_names(path))
+
+            row.delete()
+            post_delete.send(sender=through, instance=row)
+            self.assertEqual(([], 1), self.get_partner_names(path))
+
+    @override_settings(SIDELOADING_RELATED_IDS_CACHE=None)
+    def test_cache_setting_required(self):
+        with self.assertRaisesMessage(ValueError, "requires the SIDELOADING_RELATED_IDS_CACHE setting"):
+            self.client.get(path=reverse("product-list"), data={"sideload": "partners"}, **self.DEFAULT_HEADERS)
+
+
+class ProductSideloadDatabaseRoutingTestCase(TransactionTestCase):
+    databases = {"default", "replica"}
+    DEFAULT_HEADERS = BaseTestCase.DEFAULT_HEADERS
+    setUp = BaseTestCase.setUp
+
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadDatabaseRoutingTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            main_suppliers = SupplierSerializer(source="supplier", many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {
+                    "categories": "category",
+                    "main_suppliers": ["supplier", "supplier__metadata"],
+                    "partners": "partners",
+                }
+                field_options = {
+                    "main_suppliers": {"using": "replica"},
+                    "partners": {"using": "replica", "harvest": True},
+                }
+
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        ProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+
+    @classmethod
+    def tearDownClass(cls):
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        super(ProductSideloadDatabaseRoutingTestCase, cls).tearDownClass()
+
+    def get_tables(self, path):
+        """
+        Returns the response data and the tables read from each database.
+        Partners read by the primary serializer (joined with the through table) are not counted.
+        """
+        with CaptureQueriesContext(connections["default"]) as default_context:
+            with CaptureQueriesContext(connections["replica"]) as replica_context:
+                response = self.client.get(
+                    path=path, data={"sideload": "categories,main_suppliers,partners"}, **self.DEFAULT_HEADERS
+                )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        tables = {}
+        for alias, context in [("default", default_context), ("replica", replica_context)]:
+            tables[alias] = {
+                table
+                for query in context.captured_queries
+                for table in ["tests_product", "tests_category", "tests_supplier", "tests_partner"]
+                if re.search(f'FROM "{table}"(?! INNER JOIN)', query["sql"])
+            }
+        return response.json().get("results", response.json()), tables
+
+    def assertSideloaded(self, data, suppliers, partners):
+        self.assertEqual(["Category"], [c["name"] for c in data["categories"]])
+        self.assertEqual(suppliers, sorted(s["name"] for s in data["main_suppliers"]))
+        self.assertEqual(partners, sorted(p["name"] for p in data["partners"]))
+
+    def test_list_relations_read_from_replica(self):
+        data, tables = self.get_tables(reverse("product-list"))
+        self.assertSideloaded(
+            data, ["Supplier1", "Supplier2", "Supplier3", "Supplier4"], ["Partner1", "Partner2", "Partner3", "Partner4"]
+        )
+        self.assertEqual({"tests_product", "tests_category"}, tables["default"])
+        self.assertEqual({"tests_supplier", "tests_partner"}, tables["replica"])
+
+    def test_paginated_list_relations_read_from_replica(self):
+        data, tables = self.get_tables(reverse("productpaginated-list"))
+        self.assertSideloaded(
+            data, ["Supplier1", "Supplier2", "Supplier3"], ["Partner1", "Partner2", "Partner3", "Partner4"]
+        )
+        self.assertEqual({"tests_product", "tests_category"}, tables["default"])
+        self.assertEqual({"tests_supplier", "tests_partner"}, tables["replica"])
+
+    def test_relations_read_from_primary_database_in_transaction(self):
+        with transaction.atomic():
+            data, tables = self.get_tables(reverse("product-detail", args=[self.product2.id]))
+        self.assertSideloaded(data, ["Supplier2"], ["Partner2"])
+        self.assertEqual({"tests_product", "tests_category", "tests_supplier", "tests_partner"}, tables["default"])
+        self.assertEqual(set(), tables["replica"])
+
+    def test_db_alias_hook(self):
+        with patch.object(ProductViewSet, "get_sideloading_db_alias", return_value="replica"):
+            data, tables = self.get_tables(reverse("product-detail", args=[self.product2.id]))
+        self.assertSideloaded(data, ["Supplier2"], ["Partner2"])
+        self.assertEqual({"tests_product"}, tables["default"])
+        self.assertEqual({"tests_category", "tests_supplier", "tests_partner"}, tables["replica"])
+
+
+class SideloadableSerializerFieldsTestCase(BaseTestCase):
+    def test_only_requested_fields_bound(self):
+        serializer = ProductSideloadableSerializer(
+            instance={"products": [self.product1], "category": [self.category]},
+            relations_to_sideload={"categories": None},
+        )
+        self.assertEqual(["products", "categories"], list(serializer.fields.keys()))
+        self.assertIsNot(ProductSideloadableSerializer._declared_fields["categories"], serializer.fields["categories"])
+        self.assertEqual(
+            {"products": [ProductSerializer(instance=self.product1).data], "categories": [{"name": "Category"}]},
+            serializer.data,
+        )
+
+
+class CategorySideloadCollapsedSourcesTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(CategorySideloadCollapsedSourcesTestCase, cls).setUpClass()
+        PaginatedCategoryViewSet.sideloading_collapse_sources = True
+
+    @classmethod
+    def tearDownClass(cls):
+        PaginatedCategoryViewSet.sideloading_collapse_sources = False
+        super(CategorySideloadCollapsedSourcesTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.other_category = Category.objects.create(name="Other")
+        Product.objects.create(name="Product5", category=self.other_category, supplier=self.supplier1)
+
+    def get_queries(self, path, sideload):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path=path, data={"sideload": sideload}, **self.DEFAULT_HEADERS)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        return response.json().get("results", response.json()), [q["sql"] for q in context.captured_queries]
+
+    def test_paginated_list_collapsed_to_joined_query(self):
+        data, queries = self.get_queries(reverse("categorypaginated-list"), "suppliers,partners")
+        self.assertEqual(
+            ["Supplier1", "Supplier2", "Supplier3", "Supplier4"], sorted(s["name"] for s in data["suppliers"])
+        )
+        self.assertEqual(["Partner1", "Partner2", "Partner3", "Partner4"], sorted(p["name"] for p in data["partners"]))
+        # the intermediate products are not fetched
+        self.assertEqual([], [q for q in queries if q.startswith('SELECT "tests_product"."id"')])
+        supplier_queries = [q for q in queries if 'FROM "tests_supplier"' in q]
+        self.assertEqual(1, len(supplier_queries))
+        self.assertIn("DISTINCT", supplier_queries[0])
+        self.assertIn('INNER JOIN "tests_product"', supplier_queries[0])
+
+    def test_detail_collapsed_to_joined_query(self):
+        with patch.object(CategoryViewSet, "sideloading_collapse_sources", True):
+            data, queries = self.get_queries(reverse("category-detail", args=[self.other_category.id]), "suppliers")
+        self.assertEqual(["Supplier1"], [s["name"] for s in data["suppliers"]])
+        self.assertEqual([], [q for q in queries if q.startswith('SELECT "tests_product"."id"')])
+
+    def test_not_collapsed_by_default(self):
+        data, queries = self.get_queries(reverse("category-detail", args=[self.other_category.id]), "suppliers")
+        self.assertEqual(["Supplier1"], [s["name"] for s in data["suppliers"]])
+        self.assertNotEqual([], [q for q in queries if q.startswith('SELECT "tests_product"."id"')])
+
+    def test_collapsed_with_base_manager(self):
+        # like the prefetches of the forward relations the joined query does not use the default manager
+        with patch.object(Supplier, "objects", Supplier._base_manager.none()):
+            data, queries = self.get_queries(reverse("categorypaginated-list"), "suppliers")
+        self.assertEqual(
+            ["Supplier1", "Supplier2", "Supplier3", "Supplier4"], sorted(s["name"] for s in data["suppliers"])
+        )
+
+    def test_not_collapsed_with_intermediate_level_sideloaded(self):
+        data, queries = self.get_queries(reverse("categorypaginated-list"), "products,suppliers")
+        self.assertEqual(5, len(data["products"]))
+        self.assertEqual(
+            ["Supplier1", "Supplier2", "Supplier3", "Supplier4"], sorted(s["name"] for s in data["suppliers"])
+        )
+        self.assertEqual(1, len([q for q in queries if 'FROM "tests_supplier"' in q]))
+        self.assertNotIn("DISTINCT", [q for q in queries if 'FROM "tests_supplier"' in q][0])
+
+    def test_collapse_field_option(self):
+        class TempCategorySideloadableSerializer(SideLoadableSerializer):
+            categories = CategorySerializer(many=True)
+            suppliers = SupplierSerializer(source="products__supplier", many=True)
+
+            class Meta:
+                primary = "categories"
+                prefetches = {"suppliers": "products__supplier"}
+                field_options = {"suppliers": {"collapse": True}}
+
+        with patch.object(CategoryViewSet, "sideloading_serializer_class", TempCategorySideloadableSerializer):
+            data, queries = self.get_queries(reverse("category-list"), "suppliers")
+        self.assertEqual(
+            ["Supplier1", "Supplier2", "Supplier3", "Supplier4"], sorted(s["name"] for s in data["suppliers"])
+        )
+        self.assertEqual([], [q for q in queries if q.startswith('SELECT "tests_product"."id"')])
+
+
+class ProductSideloadProfilingTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadProfilingTestCase, cls).setUpClass()
+        ProductViewSet.sideloading_serializer_class = ProductSideloadableSerializer
+        ProductViewSet.sideloading_profile_threshold = 0
+        ProductViewSet.sideloading_profile_sample_rate = 1
+
+    @classmethod
+    def tearDownClass(cls):
+        ProductViewSet.sideloading_profile_threshold = None
+        ProductViewSet.sideloading_profile_sample_rate = 0.01
+        ProductViewSet.sideloading_profile_dir = None
+        super(ProductSideloadProfilingTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        ProductViewSet.sideloading_profile_dir = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super().tearDown()
+
+    def get(self, path):
+        response = self.client.get(path=path, data={"sideload": "categories,main_suppliers"}, **self.DEFAULT_HEADERS)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        return response
+
+    def test_slow_request_profile_written(self):
+        self.get(reverse("product-list"))
+        files = sorted(os.listdir(self.directory.name))
+        self.assertEqual([".json", ".prof"], [os.path.splitext(f)[1] for f in files])
+
+        with open(os.path.join(self.directory.name, files[0])) as f:
+            profile = json.load(f)
+        self.assertEqual("ProductViewSet", profile["view"])
+        self.assertEqual({"categories": None, "main_suppliers": None}, profile["relations"])
+        self.assertTrue(any('FROM "tests_supplier"' in q["sql"] for q in profile["queries"]))
+        self.assertIn("Ordered by: cumulative time", profile["stats"])
+        pstats.Stats(os.path.join(self.directory.name, files[1]))  # readable by pstats
+
+    def test_profile_directory_created_private(self):
+        directory = os.path.join(self.directory.name, "profiles")
+        with patch.object(ProductViewSet, "sideloading_profile_dir", directory):
+            self.get(reverse("product-list"))
+        self.assertEqual(2, len(os.listdir(directory)))
+        self.assertEqual(0o700, os.stat(directory).st_mode & 0o777)
+
+    def test_profile_directory_required(self):
+        with patch.object(ProductViewSet, "sideloading_profile_dir", None):
+            with self.assertRaisesMessage(ValueError, "'ProductViewSet' sideloading_profile_dir is not set"):
+                self.get(reverse("product-list"))
+
+    def test_custom_sink(self):
+        with patch.object(ProductViewSet, "sideloading_profile_dir", None), patch.object(
+            ProductViewSet, "save_sideloading_profile"
+        ) as save_sideloading_profile:
+            self.get(reverse("product-detail", args=[self.product1.id]))
+        save_sideloading_profile.assert_called_once()
+        self.assertEqual("GET", save_sideloading_profile.call_args.kwargs["profile"]["method"])
+        self.assertIsInstance(save_sideloading_profile.call_args.kwargs["stats"], pstats.Stats)
+
+    def test_fast_request_not_saved(self):
+        with patch.object(ProductViewSet, "sideloading_profile_threshold", 60):
+            self.get(reverse("product-list"))
+        self.assertEqual([], os.listdir(self.directory.name))
+
+    def test_request_not_sampled(self):
+        with patch.object(ProductViewSet, "sideloading_profile_sample_rate", 0):
+            with patch("cProfile.Profile") as profile:
+                self.get(reverse("product-list"))
+        profile.assert_not_called()
+        self.assertEqual([], os.listdir(self.directory.name))
+
+
+@skipUnless(importlib.util.find_spec("drf_spectacular"), "drf-spectacular is not installed")
+class SideloadingSchemaTestCase(TestCase):
+    def setUp(self):
+        from drf_sideloading import schema
+
+        schema._sideloading_plans.clear()
+
+    def get_schema(self):
+        from drf_sideloading.schema import SideloadingAutoSchema
+
+        schema = SideloadingAutoSchema()
+        schema.view = PaginatedProductViewSet(action="list")
+        schema.method = "GET"
+        schema.path = reverse("productpaginated-list")
+        return schema
+
+    def test_plan_compiled_once(self):
+        with patch.object(
+            PaginatedProductViewSet,
+            "initialize_serializer",
+            autospec=True,
+            side_effect=PaginatedProductViewSet.initialize_serializer,
+        ) as initialize_serializer:
+            (parameter,) = self.get_schema().get_override_parameters()
+            self.assertEqual([parameter], self.get_schema().get_override_parameters())
+        initialize_serializer.assert_called_once()
+
+    @override_settings(REST_FRAMEWORK={"DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema"})
+    def test_sideloading_response_components(self):
+        from drf_spectacular.generators import SchemaGenerator
+        from drf_sideloading.schema import SideloadingAutoSchema
+
+        with patch.object(PaginatedProductViewSet, "schema", SideloadingAutoSchema()):
+            result = SchemaGenerator().get_schema(request=None, public=True)
+        components = result["components"]["schemas"]
+        self.assertEqual(
+            {
+                "products",
+                "categories",
+                "main_suppliers",
+                "backup_suppliers",
+                "combined_suppliers",
+                "partners",
+                "metadata",
+                "_sideloading",
+            },
+            set(components["ProductSideloadableResponse"]["properties"]),
+        )
+        self.assertEqual(
+            {"type": "array", "items": {"$ref": "#/components/schemas/Partner"}},
+            components["ProductSideloadablePartners"],
+        )
+        self.assertIn("PaginatedProductSideloadableResponseList", components)
+
+        response = result["paths"]["/productpaginated/"]["get"]["responses"]["200"]
+        self.assertEqual(
+            [
+                {"$ref": "#/components/schemas/PaginatedProductList"},
+                {"$ref": "#/components/schemas/PaginatedProductSideloadableResponseList"},
+            ],
+            response["content"]["application/json"]["schema"]["oneOf"],
+        )
+        # other actions of the view don't sideload
+        operation = result["paths"]["/productrelationpaginated/sideload_next/"]["get"]
+        self.assertEqual(
+            {"$ref": "#/components/schemas/Product"},
+            operation["responses"]["200"]["content"]["application/json"]["schema"],
+        )
+        parameters = {parameter["name"]: parameter for parameter in operation.get("parameters", [])}
+        self.assertNotIn("sideload", parameters)
+        self.assertTrue(parameters["sideload_cursor"]["required"])
+
+
+class ProductSideloadSingleFlightTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+
+    def get_request(self, path="/productpaginated/?sideload=categories", user=None):
+        request = Request(self.factory.get(path))
+        request.user = user or AnonymousUser()
+        return request
+
+    def coalesce(self, requests, **kwargs):
+        """
+        Coalesces the requests in threads, the leader waits for the others to start waiting.
+        """
+        calls = []
+        waiting = []
+        responses = [None] * len(requests)
+        view = PaginatedProductViewSet()
+
+        class CountingEvent(threading.Event):
+            def wait(self, timeout=None):
+                waiting.append(threading.get_ident())
+                return super().wait(timeout)
+
+        class CountingSingleFlight(SingleFlight):
+            def __init__(self):
+                super().__init__()
+                self.done = CountingEvent()
+
+        def get_response():
+            calls.append(threading.get_ident())
+            deadline = time.monotonic() + 5
+            while len(waiting) < len(requests) - len(calls) and time.monotonic() < deadline:
+                time.sleep(0.001)
+            return Response({"products": [len(calls)]}, headers={"X-Leader": str(len(calls))})
+
+        def run(index):
+            responses[index] = view.coalesce_sideloading_response(request=requests[index], get_response=get_response)
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(len(requests))]
+        with ExitStack() as stack:
+            stack.enter_context(patch("drf_sideloading.mixins.SingleFlight", CountingSingleFlight))
+            stack.enter_context(patch.object(PaginatedProductViewSet, "sideloading_single_flight", True, **kwargs))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return calls, responses
+
+    def test_identical_requests_share_response(self):
+        calls, responses = self.coalesce([self.get_request() for _ in range(3)])
+        self.assertEqual(1, len(calls))
+        self.assertEqual(3, len({id(response) for response in responses}))
+        for response in responses:
+            self.assertEqual({"products": [1]}, response.data)
+            self.assertEqual("1", response["X-Leader"])
+        self.assertDictEqual({}, PaginatedProductViewSet._sideloading_flights)
+        # every request gets its own data
+        self.assertEqual(3, len({id(response.data["products"]) for response in responses}))
+
+    def test_different_requests_not_coalesced(self):
+        user = User.objects.create(username="user")
+        calls, responses = self.coalesce(
+            [
+                self.get_request(),
+                self.get_request(user=user),
+                self.get_request(path="/productpaginated/?sideload=partners"),
+            ]
+        )
+        self.assertEqual(3, len(calls))
+
+    def test_disabled(self):
+        view = PaginatedProductViewSet()
+        response = view.coalesce_sideloading_response(request=None, get_response=lambda: Response({}))
+        self.assertEqual({}, response.data)
+
+    def test_single_flight_request(self):
+        with patch.object(PaginatedProductViewSet, "sideloading_single_flight", True):
+            response = self.client.get(
+                path=reverse("productpaginated-list"), data={"sideload": "categories"}, **self.DEFAULT_HEADERS
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertListEqual(["products", "categories"], list(response.json()["results"].keys()))
+        self.assertDictEqual({}, PaginatedProductViewSet._sideloading_flights)
+
+
+@override_settings(
+    SIDELOADING_SNAPSHOT_CACHE="default",
+    SIDELOADING_SNAPSHOTS=[{"path": "/productpaginated/", "query": {"sideload": "categories,main_suppliers"}}],
+)
+class ProductSideloadSnapshotsTestCase(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def get(self, sideload="categories,main_suppliers", **headers):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                path=reverse("productpaginated-list"),
+                data={"sideload": sideload},
+                **{**self.DEFAULT_HEADERS, **headers},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        return response.json(), len(context.captured_queries)
+
+    def refresh(self, **kwargs):
+        output = io.StringIO()
+        call_command("sideloading_snapshots", host="testserver", stdout=output, **kwargs)
+        return output.getvalue()
+
+    def test_snapshot_receivers(self):
+        models = get_snapshot_view_models("/productpaginated/")
+        self.assertTrue({Product, Category, Supplier, SupplierMetadata, Partner, ProductMetadata} <= models)
+        for model in models:
+            self.assertTrue(post_delete.has_listeners(model))
+        self.assertTrue(m2m_changed.has_listeners(Product.partners.through))
+
+    def test_snapshot_served(self):
+        data, queries = self.get()
+        self.assertGreater(queries, 0)
+        # live requests don't store snapshots
+        self.assertGreater(self.get()[1], 0)
+
+        self.refresh()
+        self.assertEqual((data, 0), self.get())
+
+    def test_snapshot_refreshed_after_changes(self):
+        self.refresh()
+        self.supplier1.name = "Renamed"
+        self.supplier1.save()
+        data, queries = self.get()
+        self.assertGreater(queries, 0)
+        self.assertIn("Renamed", [supplier["name"] for supplier in data["results"]["main_suppliers"]])
+        self.refresh(dirty=True)
+        self.assertEqual(0, self.get()[1])
+
+        self.product4.partners.add(self.partner3)
+        self.assertGreater(self.get()[1], 0)
+        self.refresh(dirty=True)
+
+        # models that are not sideloaded do not affect the snapshot
+        self.partner1.name = "Renamed"
+        self.partner1.save()
+        self.assertEqual(0, self.get()[1])
+
+    def test_request_not_configured(self):
+        self.refresh()
+        self.assertGreater(self.get(sideload="categories")[1], 0)
+
+    def test_snapshot_variants(self):
+        self.refresh()
+        self.assertEqual(0, self.get()[1])
+        # other media types, versions and sideloading formats are computed live
+        data, queries = self.get(HTTP_ACCEPT="application/json; sideload_format=columnar")
+        self.assertGreater(queries, 0)
+        self.assertEqual(["Supplier1", "Supplier2", "Supplier3"], data["results"]["main_suppliers"]["name"])
+        self.assertGreater(self.get(HTTP_ACCEPT="application/json; version=2")[1], 0)
+
+        # the snapshots are computed for anonymous requests, they are not shared with the users
+        with patch.object(PaginatedProductViewSet, "get_sideloading_snapshot_scope", lambda view, request: ("user", 1)):
+            self.assertGreater(self.get()[1], 0)
+
+    def test_management_command(self):
+        self.assertEqual("/productpaginated/?sideload=categories%2Cmain_suppliers: refreshed\n", self.refresh())
+        data, queries = self.get()
+        self.assertEqual(0, queries)
+        self.assertEqual(
+            "http://testserver/productpaginated/?page=2&sideload=categories%2Cmain_suppliers", data["next"]
+        )
+        self.assertEqual("/productpaginated/?sideload=categories%2Cmain_suppliers: fresh\n", self.refresh(dirty=True))
+
+
+class ProductSideloadReferenceTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ProductSideloadReferenceTestCase, cls).setUpClass()
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+            partners = PartnerSerializer(many=True)
+
+            class Meta:
+                primary = "products"
+                prefetches = {"categories": "category", "partners": "partners"}
+                field_options = {"categories": {"reference": True}, "partners": {"reference": 60}}
+
+        cls.original_serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        PaginatedProductViewSet.sideloading_serializer_class = TempProductSideloadableSerializer
+
+    @classmethod
+    def tearDownClass(cls):
+        PaginatedProductViewSet.sideloading_serializer_class = cls.original_serializer_class
+        super(ProductSideloadReferenceTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        reference._reference_tables.clear()
+        super().setUp()
+
+    def get(self, sideload="categories,partners"):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                path=reverse("productpaginated-list"), data={"sideload": sideload}, **self.DEFAULT_HEADERS
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        tables = {
+            table
+            for query in context.captured_queries
+            for table in ("tests_category", "tests_partner")
+            # the partner ids of the products are read with joins
+            if re.search(rf'FROM "{table}"(?! INNER JOIN)', query["sql"])
+        }
+        return response.json()["results"], tables
+
+    def test_reference_tables_loaded_once(self):
+        results, tables = self.get()
+        self.assertEqual({"tests_category", "tests_partner"}, tables)
+        self.assertEqual([{"name": "Category"}], results["categories"])
+        self.assertEqual(["Partner1", "Partner2", "Partner3", "Partner4"], [p["name"] for p in results["partners"]])
+
+        self.assertEqual((results, set()), self.get())
+
+    def test_receivers_keep_fast_deletes(self):
+        self.get()
+        # the receivers are only connected to the serialized models of the loaded tables
+        self.assertTrue(post_delete.has_listeners(Category))
+        self.assertTrue(post_delete.has_listeners(Partner))
+        self.assertTrue(m2m_changed.has_listeners(Product.partners.through))
+        self.assertFalse(post_delete.has_listeners(Product))
+        self.assertFalse(post_delete.has_listeners(Product.partners.through))
+
+    def test_only_related_objects_returned(self):
+        Category.objects.create(name="Other")
+        self.partner3.products.clear()
+        results, tables = self.get()
+        self.assertEqual([{"name": "Category"}], results["categories"])
+        self.assertEqual(["Partner1", "Partner2", "Partner4"], [p["name"] for p in results["partners"]])
+
+    def test_reference_tables_refreshed_after_changes(self):
+        self.get()
+        self.category.name = "Renamed"
+        self.category.save()
+        results, tables = self.get()
+        self.assertEqual({"tests_category"}, tables)
+        self.assertEqual([{"name": "Renamed"}], results["categories"])
+
+    def test_reference_tables_expire(self):
+        self.get()
+        with patch("time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual({"tests_partner"}, self.get()[1])
+        with patch("time.monotonic", return_value=time.monotonic() + 301):
+            self.assertEqual({"tests_category", "tests_partner"}, self.get()[1])
+
+    def test_reference_tables_without_ttl(self):
+        with patch.object(PaginatedProductViewSet, "sideloading_reference_ttl", None):
+            self.get()
+        with patch("time.monotonic", return_value=time.monotonic() + 10**6):
+            self.assertEqual({"tests_partner"}, self.get()[1])
+
+    def test_invalid_reference_option(self):
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = CategorySerializer(source="category", many=True)
+
+            class Meta:
+                primary = "products"
+                field_options = {"categories": {"reference": "always"}}
+
+        with self.assertRaisesMessage(ValueError, "'reference' for 'categories' must be a boolean or a TTL"):
+            TempProductSideloadableSerializer.check_setup()
+
+    def test_reference_rows_serialized_with_context(self):
+        class ContextCategorySerializer(CategorySerializer):
+            context_keys = serializers.SerializerMethodField()
+
+            class Meta(CategorySerializer.Meta):
+                fields = ["name", "context_keys"]
+
+            def get_context_keys(self, instance):
+                return sorted(self.context)
+
+        serializer_class = PaginatedProductViewSet.sideloading_serializer_class
+        field = ContextCategorySerializer(source="category", many=True)
+        with patch.dict(serializer_class._declared_fields, {"categories": field}):
+            results, tables = self.get(sideload="categories")
+            # the shared tables are serialized without the request and the view
+            self.assertEqual(
+                [{"name": "Category", "context_keys": ["format", "sideloading_format"]}], results["categories"]
+            )
+
+            with patch.object(PaginatedProductViewSet, "get_sideloading_reference_scope", return_value=("user", None)):
+                results, tables = self.get(sideload="categories")
+            # the scoped tables are loaded separately with the full context
+            self.assertEqual({"tests_category"}, tables)
+            self.assertEqual(
+                [{"name": "Category", "context_keys": ["format", "request", "sideloading_format", "view"]}],
+                results["categories"],
+            )
+
+    def test_filtered_relation_not_referenced(self):
+        def add_sideloading_prefetch_filter(view, source, queryset, request):
+            if source == "partners":
+                return queryset.exclude(name="Partner2"), True
+            return queryset, False
+
+        self.get()
+        with patch.object(PaginatedProductViewSet, "add_sideloading_prefetch_filter", add_sideloading_prefetch_filter):
+            results, tables = self.get()
+        self.assertEqual({"tests_partner"}, tables)
+        self.assertEqual(["Partner1", "Partner3", "Partner4"], [p["name"] for p in results["partners"]])
+        # the unfiltered requests are still answered from the table
+        self.assertEqual(set(), self.get()[1])
+
+    def test_reference_requiring_request(self):
+        class HyperlinkedCategorySerializer(CategorySerializer):
+            url = serializers.HyperlinkedIdentityField(view_name="category-detail")
+
+            class Meta(CategorySerializer.Meta):
+                fields = ["name", "url"]
+
+        class TempProductSideloadableSerializer(SideLoadableSerializer):
+            products = ProductSerializer(many=True)
+            categories = HyperlinkedCategorySerializer(source="category", many=True)
+
+            class Meta:
+                primary = "products"
+                field_options = {"categories": {"reference": True}}
+
+        with self.assertRaisesMessage(ValueError, "'reference' for 'categories' can't be used with serializers that"):
+            TempProductSideloadableSerializer.check_setup()
+
+
+class ProductSideloadRelationPaginationTestCase(BaseTestCase):
+    def get(self, path, data):
+        response = self.client.get(path=path, data=data, **self.DEFAULT_HEADERS)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.json())
+        return response.json()
+
+    def test_relation_pages(self):
+        results = self.get(reverse("productrelationpaginated-list"), {"sideload": "categories,partners"})["results"]
+        self.assertEqual(["Partner1", "Partner2"], [p["name"] for p in results["partners"]])
+        self.assertEqual({"cursors"}, set(results["_sideloading"]))
+        self.assertEqual({"partners"}, set(results["_sideloading"]["cursors"]))
+
+        data = self.get(
+            reverse("productrelationpaginated-sideload-next"),
+            {"sideload_cursor": results["_sideloading"]["cursors"]["partners"]},
+        )
+        self.assertEqual(["partners"], list(data.keys()))
+        self.assertEqual(["Partner3", "Partner4"], [p["name"] for p in data["partners"]])
+
+    def test_filtered_relation_pages(self):
+        query = {"search": "Product1"}
+        results = self.get(reverse("productrelationpaginated-list"), {**query, "sideload": "partners"})["results"]
+        self.assertEqual(["Partner1", "Partner2"], [p["name"] for p in results["partners"]])
+
+        # the next page is limited to the partners of the filtered primary objects
+        cursor = results["_sideloading"]["cursors"]["partners"]
+        data = self.get(reverse("productrelationpaginated-sideload-next"), {**query, "sideload_cursor": cursor})
+        self.assertEqual({"partners": [{"name": "Partner4"}]}, data)
+
+        # the cursor is bound to the query parameters of the request
+        response = self.client.get(
+            path=reverse("productrelationpaginated-sideload-next"),
+            data={"sideload_cursor": cursor},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.json())
+        self.assertEqual({"sideload_cursor": ["Invalid cursor."]}, response.json())
+
+    def test_last_page_without_cursor(self):
+        results = self.get(
+            reverse("productrelationpaginated-detail", args=[self.product1.id]), {"sideload": "partners"}
+        )
+        self.assertEqual(["Partner1", "Partner2"], [p["name"] for p in results["partners"]])
+
+        # the next page is limited to the partners of the primary object of the cursor
+        data = self.get(
+            reverse("productrelationpaginated-sideload-next"),
+            {"sideload_cursor": results["_sideloading"]["cursors"]["partners"]},
+        )
+        self.assertEqual({"partners": [{"name": "Partner4"}]}, data)
+
+    def test_prefetched_relation_pages(self):
+        data = self.get(reverse("categoryrelationpaginated-list"), {"sideload": "products"})
+        self.assertEqual(["Product1", "Product2", "Product3"], [p["name"] for p in data["products"]])
+        data = self.get(
+            reverse("categoryrelationpaginated-sideload-next"),
+            {"sideload_cursor": data["_sideloading"]["cursors"]["products"]},
+        )
+        self.assertEqual(["Product4"], [p["name"] for p in data["products"]])
+        self.assertNotIn("_sideloading", data)
+
+    def test_cursor_scope(self):
+        results = self.get(reverse("productrelationpaginated-list"), {"sideload": "partners"})["results"]
+        with patch.object(RelationPaginatedProductViewSet, "get_sideloading_cursor_scope", return_value=("user", 2)):
+            response = self.client.get(
+                path=reverse("productrelationpaginated-sideload-next"),
+                data={"sideload_cursor": results["_sideloading"]["cursors"]["partners"]},
+                **self.DEFAULT_HEADERS,
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.json())
+        self.assertEqual({"sideload_cursor": ["Invalid cursor."]}, response.json())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            path=reverse("productrelationpaginated-sideload-next"),
+            data={"sideload_cursor": "invalid"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.json())
+        self.assertEqual({"sideload_cursor": ["Invalid cursor."]}, response.json())
+
+        # cursors are signed per view
+        results = self.get(reverse("productrelationpaginated-list"), {"sideload": "partners"})["results"]
+        response = self.client.get(
+            path=reverse("categoryrelationpaginated-sideload-next"),
+            data={"sideload_cursor": results["_sideloading"]["cursors"]["partners"]},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.json())
+        self.assertEqual({"sideload_cursor": ["Invalid cursor."]}, response.json())
+
+    def test_object_permissions(self):
+        results = self.get(
+            reverse("productrelationpaginated-detail", args=[self.product1.id]), {"sideload": "partners"}
+        )
+        with patch.object(
+            RelationPaginatedProductViewSet, "check_object_permissions", side_effect=PermissionDenied
+        ) as check_object_permissions:
+            response = self.client.get(
+                path=reverse("productrelationpaginated-sideload-next"),
+                data={"sideload_cursor": results["_sideloading"]["cursors"]["partners"]},
+                **self.DEFAULT_HEADERS,
+            )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, response.json())
+        self.assertEqual(self.product1, check_object_permissions.call_args[0][1])
+
+    def test_action_without_paginated_relations(self):
+        self.assertIn("sideload_next", [a.__name__ for a in RelationPaginatedProductViewSet.get_extra_actions()])
+        self.assertNotIn("sideload_next", [a.__name__ for a in PaginatedProductViewSet.get_extra_actions()])
+        self.assertNotIn("sideload_next", [a.__name__ for a in CategoryViewSet.get_extra_actions()])
+        # the serializer class is picked per request
+        self.assertIn("sideload_next", [a.__name__ for a in ProductViewSet.get_extra_actions()])
+        # the mixin is defined after the DRF views
+        with self.assertRaises(NoReverseMatch):
+            reverse("productwrongmixinorder-sideload-next")
@@ -0,0 +1,198 @@
+import datetime
+import decimal
+import importlib.util
+import io
+import json
+import uuid
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from drf_sideloading import renderers
+from drf_sideloading.parsers import SideloadingCBORParser, SideloadingMessagePackParser
+from drf_sideloading.renderers import SideloadingCBORRenderer, SideloadingJSONRenderer, SideloadingMessagePackRenderer
+from drf_sideloading.serializers import JSONFragment
+from tests.test_products_api import BaseTestCase
+from tests.viewsets import PaginatedProductViewSet
+
+
+class SideloadingJSONRendererTestCase(SimpleTestCase):
+    data = ReturnDict(
+        {
+            "products": [
+                {
+                    "id": 1,
+                    "price": decimal.Decimal("1.10"),
+                    "created_at": datetime.datetime(2020, 1, 1, 12, 30, 1, 123456, tzinfo=datetime.timezone.utc),
+                    "uuid": uuid.UUID(int=5),
+                    "label": _("Product"),
+                    "name": "Tõode",
+                }
+            ],
+            "categories": [],
+        },
+        serializer=None,
+    )
+
+    def test_render_matches_json_renderer(self):
+        self.assertEqual(JSONRenderer().render(self.data), SideloadingJSONRenderer().render(self.data))
+
+    def test_render_line_separators(self):
+        data = {"name": "line\u2028paragraph\u2029"}
+        self.assertEqual(b'{"name":"line\\u2028paragraph\\u2029"}', SideloadingJSONRenderer().render(data))
+        self.assertEqual(JSONRenderer().render(data), SideloadingJSONRenderer().render(data))
+
+    def test_render_none(self):
+        self.assertEqual(b"", SideloadingJSONRenderer().render(None))
+
+    @skipUnless(importlib.util.find_spec("orjson"), "orjson is not installed")
+    def test_use_orjson(self):
+        renderer = SideloadingJSONRenderer()
+        self.assertTrue(renderer.use_orjson("application/json"))
+        self.assertFalse(renderer.use_orjson("application/json; indent=4"))
+
+    def test_render_without_orjson(self):
+        with mock.patch.object(renderers, "orjson", None):
+            renderer = SideloadingJSONRenderer()
+            self.assertFalse(renderer.use_orjson("application/json"))
+            self.assertEqual(JSONRenderer().render(self.data), renderer.render(self.data))
+
+    def test_render_fragments(self):
+        data = {"products": [{"id": 1}], "categories": JSONFragment(b'[{"id":1,"name":"Cached"}]')}
+        data["partners"] = [JSONFragment(b'{"id":1,"name":"Cached"}'), {"id": 2, "name": "Partner2"}]
+        expected = (
+            b'{"products":[{"id":1}],"categories":[{"id":1,"name":"Cached"}],'
+            b'"partners":[{"id":1,"name":"Cached"},{"id":2,"name":"Partner2"}]}'
+        )
+        self.assertEqual(expected, SideloadingJSONRenderer().render(data))
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(expected, SideloadingJSONRenderer().render(data))
+
+    def test_render_indented(self):
+        self.assertEqual(
+            JSONRenderer().render(self.data, "application/json; indent=4"),
+            SideloadingJSONRenderer().render(self.data, "application/json; indent=4"),
+        )
+
+
+@skipUnless(importlib.util.find_spec("msgpack"), "msgpack is not installed")
+class SideloadingMessagePackRendererTestCase(SimpleTestCase):
+    def test_render_and_parse(self):
+        content = SideloadingMessagePackRenderer().render(SideloadingJSONRendererTestCase.data)
+        data = SideloadingMessagePackParser().parse(io.BytesIO(content))
+        self.assertEqual(json.loads(JSONRenderer().render(SideloadingJSONRendererTestCase.data)), data)
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            SideloadingMessagePackParser().parse(io.BytesIO(b"\xc1"))
+
+
+@skipUnless(importlib.util.find_spec("cbor2"), "cbor2 is not installed")
+class SideloadingCBORRendererTestCase(SimpleTestCase):
+    def test_render_and_parse(self):
+        data = {"partners": [{"id": i, "name": "Partner", "category": "Category"} for i in range(10)]}
+        content = SideloadingCBORRenderer().render(data)
+        self.assertEqual(data, SideloadingCBORParser().parse(io.BytesIO(content)))
+        # repeated strings are referenced
+        self.assertEqual(1, content.count(b"Partner"))
+        self.assertEqual(1, content.count(b"category"))
+
+    def test_render_json_types(self):
+        content = SideloadingCBORRenderer().render({"price": decimal.Decimal("1.10"), "label": _("Product")})
+        self.assertEqual(
+            {"price": decimal.Decimal("1.10"), "label": "Product"}, SideloadingCBORParser().parse(io.BytesIO(content))
+        )
+
+
+class SideloadingJSONRendererApiTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(SideloadingJSONRendererApiTestCase, cls).setUpClass()
+        PaginatedProductViewSet.renderer_classes = [SideloadingJSONRenderer, JSONRenderer]
+
+        def get_sideloading_fragments(self, relation, objects):
+            if relation == "categories":
+                return b'[{"id":1,"name":"Cached category"}]'
+            return {obj.pk: b'{"id":%d,"name":"Cached"}' % obj.pk for obj in objects if obj.name == "Supplier2"}
+
+        PaginatedProductViewSet.get_sideloading_fragments = get_sideloading_fragments
+
+    @classmethod
+    def tearDownClass(cls):
+        del PaginatedProductViewSet.renderer_classes
+        del PaginatedProductViewSet.get_sideloading_fragments
+        super(SideloadingJSONRendererApiTestCase, cls).tearDownClass()
+
+    def test_sideloading_response(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"), data={"sideload": "categories"}, **self.DEFAULT_HEADERS
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.accepted_renderer, SideloadingJSONRenderer)
+        self.assertListEqual(["products", "categories"], list(response.json()["results"].keys()))
+
+    def test_sideloading_response_with_fragments(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "categories,main_suppliers"},
+            **self.DEFAULT_HEADERS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()["results"]
+        self.assertEqual([{"id": 1, "name": "Cached category"}], results["categories"])
+        self.assertEqual(
+            {"Supplier1", "Cached", "Supplier3"}, {supplier["name"] for supplier in results["main_suppliers"]}
+        )
+
+    def test_sideloading_response_indented_and_without_fragment_support(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "categories,main_suppliers"},
+            HTTP_ACCEPT="application/json; indent=2",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([{"id": 1, "name": "Cached category"}], response.json()["results"]["categories"])
+        # the fragments are only added for renderers supporting them
+        with mock.patch.object(SideloadingJSONRenderer, "supports_json_fragments", False):
+            response = self.client.get(
+                path=reverse("productpaginated-list"),
+                data={"sideload": "categories,main_suppliers"},
+                **self.DEFAULT_HEADERS,
+            )
+        results = response.json()["results"]
+        self.assertEqual([{"name": "Category"}], results["categories"])
+        self.assertEqual(
+            {"Supplier1", "Supplier2", "Supplier3"}, {supplier["name"] for supplier in results["main_suppliers"]}
+        )
+
+
+@skipUnless(importlib.util.find_spec("msgpack"), "msgpack is not installed")
+class SideloadingMessagePackRendererApiTestCase(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(SideloadingMessagePackRendererApiTestCase, cls).setUpClass()
+        PaginatedProductViewSet.renderer_classes = [JSONRenderer, SideloadingMessagePackRenderer]
+
+    @classmethod
+    def tearDownClass(cls):
+        del PaginatedProductViewSet.renderer_classes
+        super(SideloadingMessagePackRendererApiTestCase, cls).tearDownClass()
+
+    def test_sideloading_response(self):
+        response = self.client.get(
+            path=reverse("productpaginated-list"),
+            data={"sideload": "categories"},
+            HTTP_ACCEPT="application/msgpack",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual("application/msgpack", response["Content-Type"])
+        data = SideloadingMessagePackParser().parse(io.BytesIO(response.content))
+        self.assertEqual(["products", "categories"], list(data["results"].keys()))
+        # primary keys are native integers
+        self.assertEqual(self.category.id, data["results"]["products"][0]["category"])
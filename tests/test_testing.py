@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.urls import reverse
+
+from drf_sideloading.testing import SNAPSHOT_UPDATE_ENV, SideloadingQueriesMixin, get_sideloading_combinations
+from tests.test_products_api import BaseTestCase
+from tests.viewsets import PaginatedCategoryViewSet, PaginatedProductViewSet
+
+
+class SideloadingCombinationsTestCase(BaseTestCase):
+    def test_combinations(self):
+        self.assertListEqual(
+            [
+                "products",
+                "suppliers",
+                "partners",
+                "products,suppliers",
+                "products,partners",
+                "suppliers,partners",
+                "products,suppliers,partners",
+            ],
+            get_sideloading_combinations(PaginatedCategoryViewSet),
+        )
+
+    def test_multi_source_combinations(self):
+        combinations = get_sideloading_combinations(PaginatedProductViewSet, max_relations=1)
+        self.assertListEqual(
+            [
+                "categories",
+                "main_suppliers",
+                "backup_suppliers",
+                "partners",
+                "combined_suppliers",
+                "combined_suppliers[suppliers]",
+                "combined_suppliers[backup_supplier]",
+                "metadata",
+            ],
+            combinations,
+        )
+        self.assertEqual(127, len(get_sideloading_combinations(PaginatedProductViewSet)))
+
+
+class CategorySideloadQueriesTestCase(SideloadingQueriesMixin, BaseTestCase):
+    def test_query_param_name(self):
+        with patch.object(PaginatedCategoryViewSet, "sideloading_query_param_name", "include"):
+            self.assertSideloadingQueries(
+                PaginatedCategoryViewSet,
+                reverse("categorypaginated-list"),
+                "categorypaginated-list",
+                **self.DEFAULT_HEADERS,
+            )
+
+    def test_snapshot(self):
+        self.assertSideloadingQueries(
+            PaginatedCategoryViewSet,
+            reverse("categorypaginated-list"),
+            "categorypaginated-list",
+            **self.DEFAULT_HEADERS,
+        )
+
+    def test_snapshot_written(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with patch.object(self, "sideloading_snapshot_dir", directory):
+                # missing snapshots fail unless the snapshots are updated
+                with self.assertRaisesRegex(AssertionError, "snapshot.json is missing"):
+                    self.assertSideloadingQueries(
+                        PaginatedCategoryViewSet, reverse("categorypaginated-list"), "snapshot", **self.DEFAULT_HEADERS
+                    )
+                with patch.dict(os.environ, {SNAPSHOT_UPDATE_ENV: "1"}):
+                    self.assertSideloadingQueries(
+                        PaginatedCategoryViewSet, reverse("categorypaginated-list"), "snapshot", **self.DEFAULT_HEADERS
+                    )
+                with open(os.path.join(directory, "snapshot.json")) as f:
+                    snapshot = json.load(f)
+                self.assertEqual(7, len(snapshot))
+                self.assertEqual(4, snapshot["partners"]["queries"])
+                self.assertIn("IN (...)", snapshot["partners"]["sql"][2])
+
+                # added queries fail with the changed counts and a diff
+                snapshot["partners"]["queries"] = 3
+                snapshot["partners"]["sql"].pop()
+                with open(os.path.join(directory, "snapshot.json"), "w") as f:
+                    json.dump(snapshot, f)
+                with self.assertRaisesRegex(
+                    AssertionError, r"(?s)Query counts:\n  partners: 3 -> 4\n.*\+ +\"SELECT \("
+                ):
+                    self.assertSideloadingQueries(
+                        PaginatedCategoryViewSet, reverse("categorypaginated-list"), "snapshot", **self.DEFAULT_HEADERS
+                    )
+
+                with patch.dict(os.environ, {SNAPSHOT_UPDATE_ENV: "1"}):
+                    self.assertSideloadingQueries(
+                        PaginatedCategoryViewSet, reverse("categorypaginated-list"), "snapshot", **self.DEFAULT_HEADERS
+                    )
+                self.assertSideloadingQueries(
+                    PaginatedCategoryViewSet, reverse("categorypaginated-list"), "snapshot", **self.DEFAULT_HEADERS
+                )
@@ -11,6 +11,14 @@ router.register(
 )
 router.register(r"productretreiveonly", viewsets.RetreiveOnlyProductViewSet, basename="productretreiveonly")
 router.register(r"category", viewsets.CategoryViewSet)
+router.register(r"productpaginated", viewsets.PaginatedProductViewSet, basename="productpaginated")
+router.register(r"categorypaginated", viewsets.PaginatedCategoryViewSet, basename="categorypaginated")
+router.register(
+    r"productrelationpaginated", viewsets.RelationPaginatedProductViewSet, basename="productrelationpaginated"
+)
+router.register(
+    r"categoryrelationpaginated", viewsets.RelationPaginatedCategoryViewSet, basename="categoryrelationpaginated"
+)
 router.register(r"supplier", viewsets.SupplierViewSet)
 router.register(r"partner", viewsets.PartnerViewSet)
 
@@ -1,5 +1,6 @@
 from rest_framework import viewsets, filters, versioning
 from rest_framework.mixins import RetrieveModelMixin, ListModelMixin
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.viewsets import GenericViewSet
 
 from drf_sideloading.mixins import SideloadableRelationsMixin
@@ -13,6 +14,8 @@ from tests.serializers import (
     ProductSideloadableSerializer,
     CategorySideloadableSerializer,
     NewProductSideloadableSerializer,
+    RelationPaginatedProductSideloadableSerializer,
+    RelationPaginatedCategorySideloadableSerializer,
 )
 
 
@@ -76,3 +79,36 @@ class SupplierViewSet(viewsets.ModelViewSet):
 class PartnerViewSet(viewsets.ModelViewSet):
     queryset = Partner.objects.all()
     serializer_class = PartnerSerializer
+
+
+class ProductPagination(PageNumberPagination):
+    page_size = 3
+
+
+class PaginatedProductViewSet(SideloadableRelationsMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.order_by("id")
+    serializer_class = ProductSerializer
+    sideloading_serializer_class = ProductSideloadableSerializer
+    pagination_class = ProductPagination
+
+
+class PaginatedCategoryViewSet(SideloadableRelationsMixin, viewsets.ModelViewSet):
+    queryset = Category.objects.order_by("id")
+    serializer_class = CategorySerializer
+    sideloading_serializer_class = CategorySideloadableSerializer
+    pagination_class = ProductPagination
+
+
+class RelationPaginatedProductViewSet(SideloadableRelationsMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.order_by("id")
+    serializer_class = ProductSerializer
+    sideloading_serializer_class = RelationPaginatedProductSideloadableSerializer
+    pagination_class = ProductPagination
+    filter_backends = [filters.SearchFilter]
+    search_fields = ["name"]
+
+
+class RelationPaginatedCategoryViewSet(SideloadableRelationsMixin, viewsets.ModelViewSet):
+    queryset = Category.objects.order_by("id")
+    serializer_class = CategorySerializer
+    sideloading_serializer_class = RelationPaginatedCategorySideloadableSerializer